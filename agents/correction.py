@@ -2,34 +2,26 @@
 Agent 2: Correction
 深度批改與錯誤分析
 """
-import google.generativeai as genai
 import streamlit as st
 import traceback
-from typing import Optional
+from typing import Iterable, Optional, Tuple
 
 from config.settings import Config
+from services import prompt_cache
+from services.result_model import Corrections, TranscriptionItem, dumps
+from utils.cancellation import CancelToken
 
 
-def process(transcription_json: str, debug_mode: bool = False) -> Optional[str]:
-    """
-    Agent 2: Analyzes the text and provides corrections.
-
-    Args:
-        transcription_json: JSON string from Agent 1
-        debug_mode: Show detailed error messages
+# Bump when the prompt changes: identical inputs under another version are not coalesced
+PROMPT_VERSION = "2"
 
-    Returns:
-        JSON string or None if error occurs
-    """
-    model = genai.GenerativeModel(Config.GEMINI_MODEL)
-
-    prompt = f"""
+# Static prefix of every request (cached by services.prompt_cache)
+INSTRUCTIONS = """
     你是一位專業的英文批改老師。請務必使用繁體中文。
 
     **核心原則：Standard 標準答案是優質的參考範本，但 User 的正確寫法也應該被認可。只有真實錯誤才需要修正。**
 
-    輸入資料 (JSON):
-    {transcription_json}
+    輸入資料 (JSON) 附在本指示之後。
 
     任務：
     針對每一題，參考 Standard 標準答案，檢視 User 的寫作，區分「真實錯誤」與「可接受的差異」，並給予專業的批改建議。
@@ -58,14 +50,14 @@ def process(transcription_json: str, debug_mode: bool = False) -> Optional[str]:
     請直接輸出一個純 JSON Array，不要有任何 Markdown 標記（如 **, ##, 【】等）。
     格式如下：
     [
-        {{
+        {
             "id": "1.1",
             "user": "User's original text",
             "correction": "修正後的版本（僅在有真實錯誤時修改，否則保持原文）",
             "feedback": [
                 "批改意見（區分錯誤與建議）"
             ]
-        }},
+        },
         ...
     ]
 
@@ -109,19 +101,69 @@ def process(transcription_json: str, debug_mode: bool = False) -> Optional[str]:
     **再次提醒：只修正真實錯誤，不要強制對齊 Standard 的所有用詞選擇。User 的正確寫法應該被認可。**
     """
 
+INPUT_LABEL = "輸入資料 (JSON):\n"
+
+
+def generate(items: Iterable[TranscriptionItem], cancel: Optional[CancelToken] = None) -> Corrections:
+    """
+    Agent 2: Analyzes the text and provides corrections.
+
+    Args:
+        items: Transcribed items from Agent 1
+        cancel: Checked before the call and between streamed chunks
+
+    Returns:
+        Parsed corrections
+
+    Raises:
+        Cancelled: If the token is cancelled
+        ResultError: If the answer holds no JSON list
+        Exception: Any error from the Gemini API
+    """
+    return generate_with_usage(items, Config.GEMINI_MODEL, cancel)[0]
+
+
+def generate_with_usage(
+    items: Iterable[TranscriptionItem],
+    model_name: str,
+    cancel: Optional[CancelToken] = None,
+    strict: bool = False
+) -> Tuple[Corrections, dict]:
+    """
+    Agent 2 on a given model, with the call's token usage
+
+    Args:
+        items: Transcribed items (all of them or a subset)
+        model_name: Gemini model to call
+        cancel: Checked before the call and between streamed chunks
+        strict: Drop items that fail schema validation instead of coercing them
+
+    Returns:
+        (parsed corrections, {"input_tokens", "cached_tokens", "output_tokens"})
+
+    Raises:
+        Cancelled: If the token is cancelled
+        ResultError: If the answer holds no JSON list
+        Exception: Any error from the Gemini API
+    """
+    transcription_json = dumps([item.to_dict() for item in items])
+    text, usage = prompt_cache.generate(model_name, [INSTRUCTIONS], [INPUT_LABEL + transcription_json], cancel)
+    return Corrections.parse(text, strict), usage
+
+
+def process(items: Iterable[TranscriptionItem], debug_mode: bool = False) -> Optional[Corrections]:
+    """
+    Run Agent 2 and show errors in the page
+
+    Args:
+        items: Transcribed items from Agent 1
+        debug_mode: Show detailed error messages
+
+    Returns:
+        Parsed corrections or None if error occurs
+    """
     try:
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-
-        # Clean up markdown code blocks if present
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-
-        return text.strip()
+        return generate(items)
 
     except Exception as e:
         st.error(f"Agent 2 Error: {type(e).__name__}: {str(e)}")
@@ -2,30 +2,22 @@
 Agent 1: Transcription
 手寫辨識與標準答案對齊
 """
-import google.generativeai as genai
 import streamlit as st
 import traceback
 from typing import List, Optional
 from PIL import Image
 
 from config.settings import Config
+from services import prompt_cache
+from services.result_model import Transcription
+from utils.cancellation import CancelToken
 
 
-def process(user_images: List[Image.Image], answer_image: Image.Image, debug_mode: bool = False) -> Optional[str]:
-    """
-    Agent 1: Digitizes handwriting and aligns it with the standard answer.
+# Bump when the prompt changes: identical inputs under another version are not coalesced
+PROMPT_VERSION = "2"
 
-    Args:
-        user_images: List of user handwriting images
-        answer_image: Standard answer image
-        debug_mode: Show detailed error messages
-
-    Returns:
-        JSON string or None if error occurs
-    """
-    model = genai.GenerativeModel(Config.GEMINI_MODEL)
-
-    prompt = """
+# Static prefix of every request (cached by services.prompt_cache)
+INSTRUCTIONS = """
     你是一個專業的文字辨識與對齊助理。
     任務：
     1. 讀取「使用者手寫英文翻譯練習」的圖片（可能有多張）。
@@ -54,25 +46,62 @@ def process(user_images: List[Image.Image], answer_image: Image.Image, debug_mod
     - 題號請依照圖片上的標示（如 1.1, 1.2, 2.1 等）。
     """
 
-    # Combine content: Prompt + User Images + Answer Image
-    content = [prompt]
-    for img in user_images:
-        content.append(img)
-    content.append(answer_image)
+# Images follow the instructions: answer key first, so it can be cached with them
+ANSWER_LABEL = "標準答案圖片："
+USER_LABEL = "使用者手寫圖片："
+
+
+def generate(
+    user_images: List[Image.Image],
+    answer_image: Image.Image,
+    cancel: Optional[CancelToken] = None
+) -> Transcription:
+    """
+    Agent 1: Digitizes handwriting and aligns it with the standard answer.
 
+    Args:
+        user_images: List of user handwriting images
+        answer_image: Standard answer image
+        cancel: Checked before the call and between streamed chunks
+
+    Returns:
+        Parsed transcription
+
+    Raises:
+        Cancelled: If the token is cancelled
+        ResultError: If the answer holds no JSON list
+        Exception: Any error from the Gemini API
+    """
+    if Config.PROMPT_CACHE_ANSWER_IMAGE:
+        # The answer key is shared by a whole class: cache it with the instructions
+        prefix = [INSTRUCTIONS, ANSWER_LABEL, answer_image]
+        contents = [USER_LABEL, *user_images]
+    else:
+        prefix = [INSTRUCTIONS]
+        contents = [ANSWER_LABEL, answer_image, USER_LABEL, *user_images]
+
+    text, _ = prompt_cache.generate(Config.GEMINI_MODEL, prefix, contents, cancel)
+    return Transcription.parse(text)
+
+
+def process(
+    user_images: List[Image.Image],
+    answer_image: Image.Image,
+    debug_mode: bool = False
+) -> Optional[Transcription]:
+    """
+    Run Agent 1 and show errors in the page
+
+    Args:
+        user_images: List of user handwriting images
+        answer_image: Standard answer image
+        debug_mode: Show detailed error messages
+
+    Returns:
+        Parsed transcription or None if error occurs
+    """
     try:
-        response = model.generate_content(content)
-        text = response.text.strip()
-
-        # Clean up markdown code blocks if present
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-
-        return text.strip()
+        return generate(user_images, answer_image)
 
     except Exception as e:
         st.error(f"Agent 1 Error: {type(e).__name__}: {str(e)}")
@@ -2,20 +2,133 @@
 Handwriting Translation Correction System
 AI 驅動的手寫翻譯批改系統
 """
+import traceback
+
 import streamlit as st
-import json
 
 # Import modules
-from config.settings import Config, configure_gemini_api
+from config.settings import Config
 from services.database import DatabaseService
+from services.jobs import get_client_id, get_job_runner, get_session_id
+from services.model_provider import using_api_key
+from services.result_model import Corrections, Transcription
+from services.warmup import get_warmup_timings, start_warmup
 from ui.theme import apply_custom_theme, render_header
 from ui.components import (
     render_file_upload_section,
     render_sidebar_settings,
     render_correction_results,
-    render_history_page
+    render_transcription_editor,
+    render_history_page,
+    render_job_list,
+    render_memory_usage,
+    render_coalescing_stats,
+    render_tier_stats,
+    render_prompt_cache_stats,
+    render_file_handle_stats,
+    render_repair_stats,
+    render_stats_dashboard,
+    release_uploads
 )
-from agents import transcription, correction
+
+
+def regrade_report(db, api_key, record_id, transcription, corrections, edited, debug_mode=False):
+    """
+    Re-grade the items a user edited and update the stored record in place
+
+    Args:
+        db: Database service
+        api_key: Gemini API key from the sidebar
+        record_id: Record the report was saved as (None if it was not saved)
+        transcription: Transcription the report was graded from
+        corrections: Current corrections of the report
+        edited: Transcription returned by the editor
+        debug_mode: Show detailed error messages
+
+    Returns:
+        (transcription, corrections) after the re-grade, None if nothing changed or it failed
+    """
+    from services.pipeline import regrade
+
+    if not api_key and Config.MODEL_PROVIDER != "stub":
+        st.error("API Key Required")
+        return None
+
+    try:
+        with st.spinner("Re-grading changed items..."), using_api_key(api_key):
+            merged, changed = regrade(transcription, edited, corrections)
+    except Exception as e:
+        st.error(f"Agent 2 Error: {type(e).__name__}: {str(e)}")
+        if debug_mode:
+            st.code(traceback.format_exc(), language='python')
+        return None
+
+    if not changed:
+        st.info("No items were changed")
+        return None
+    if record_id is not None and not db.update_correction(record_id, merged, edited):
+        return None
+    st.toast(f"Re-graded {len(changed)} item(s)")
+    return edited, merged
+
+
+def render_report(db, api_key, record_id, transcription, corrections, key, debug_mode=False):
+    """
+    Render a report with its transcription editor
+
+    Returns:
+        (transcription, corrections) after a re-grade, None otherwise
+    """
+    render_correction_results(transcription, corrections, key=key)
+    edited = render_transcription_editor(transcription, key=key)
+    if edited is None:
+        return None
+    return regrade_report(db, api_key, record_id, transcription, corrections, edited, debug_mode)
+
+
+@st.fragment
+def render_job_report(db, runner, api_key, job_id, debug_mode=False):
+    """
+    Report of a finished job
+
+    Runs as a fragment: opening the editor, editing and re-grading rerun
+    only the report. The job is re-read on every run, so after a re-grade
+    the fragment rerun shows the updated result.
+    """
+    job = runner.store.get(job_id)
+    if not job or not job['correction']:
+        return
+    try:
+        transcription = Transcription.coerce(job['transcription'])
+        corrections = Corrections.coerce(job['correction'])
+    except ValueError as e:
+        st.error(f"Parsing Error: {e}")
+        return
+    updated = render_report(db, api_key, job['record_id'], transcription, corrections, f"job_{job['id']}", debug_mode)
+    if updated:
+        runner.store.update(job['id'], transcription=updated[0].to_json(), correction=updated[1].to_json())
+        st.rerun(scope="fragment")
+
+
+@st.fragment
+def render_restored_record(db, api_key, record_id, debug_mode=False):
+    """
+    Report of a record restored from history
+
+    Runs as a fragment, like render_job_report; the record is read from the
+    local store on every run rather than kept in the session.
+    """
+    record = db.get_record(record_id)
+    if not record:
+        return
+    try:
+        transcription = Transcription.coerce(record.get('transcriptions'))
+        corrections = Corrections.coerce(record.get('corrections'))
+    except ValueError as e:
+        st.error(f"Parsing Error: {e}")
+        return
+    if render_report(db, api_key, record['id'], transcription, corrections, "report", debug_mode):
+        st.rerun(scope="fragment")
 
 
 def main():
@@ -32,114 +145,109 @@ def main():
     apply_custom_theme()
     render_header()
 
+    # Sidebar settings
+    api_key, debug_mode = render_sidebar_settings()
+
+    # The upload page is painted before storage is touched (cold start)
+    upload_page = not (
+        st.session_state.get('show_dashboard', False)
+        or st.session_state.get('show_history', False)
+        or st.session_state.get('restored_record_id') is not None
+        or st.session_state.get('job_report_id')
+    )
+    if upload_page:
+        user_pages, answer_page = render_file_upload_section()
+
     # Initialize database service
     db = DatabaseService()
 
-    # Sidebar settings
-    api_key, debug_mode = render_sidebar_settings()
-    if api_key:
-        configure_gemini_api(api_key)
+    # Background jobs of this browser tab (survive reruns, refreshes and disconnects)
+    runner = get_job_runner(Config.JOB_DB_PATH, Config.JOB_DIR, Config.JOB_WORKERS, Config.JOB_ABANDON_SECONDS)
+    client_id = get_client_id()
+    runner.heartbeat(client_id, get_session_id())
 
     # Sidebar history info
     db.render_sidebar_info()
 
+    # SDK imports and connections warm up while the user is choosing files
+    start_warmup(api_key)
+    if debug_mode:
+        st.sidebar.caption(f"Warm-up: {get_warmup_timings()}")
+        render_memory_usage()
+        render_coalescing_stats(runner)
+        render_tier_stats()
+        render_prompt_cache_stats()
+        render_file_handle_stats()
+        render_repair_stats()
+
+    # Check if user wants to view the statistics dashboard
+    if st.session_state.get('show_dashboard', False):
+        render_stats_dashboard(db)
+        return
+
     # Check if user wants to view history
     if st.session_state.get('show_history', False):
-        # Show history page
-        history_records = db.get_all_history()
-        render_history_page(history_records)
+        # Show one timeline page (a search query reads from the index instead)
+        searching = bool(st.session_state.get('history_search', '').strip())
+        page_size = Config.HISTORY_PAGE_SIZE
+        offset = st.session_state.get('history_page', 0) * page_size
+        history_records = [] if searching else db.get_history_page(limit=page_size, offset=offset)
+        render_history_page(history_records, db)
+        return
+
+    # Check if there's a finished job report to display
+    if st.session_state.get('job_report_id'):
+        job = runner.store.get(st.session_state.job_report_id)
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.info(f"Report: {(job or {}).get('label') or 'Worksheet'}")
+        with col2:
+            if st.button("Back", use_container_width=True):
+                st.session_state.job_report_id = None
+                st.rerun()
+
+        if job:
+            render_job_report(db, runner, api_key, job['id'], debug_mode)
         return
 
     # Check if there's a restored record to display
-    if st.session_state.get('restored_corrections'):
+    if st.session_state.get('restored_record_id') is not None:
         # Show info and clear button
         col1, col2 = st.columns([3, 1])
         with col1:
             st.info("Displaying restored record from history")
         with col2:
             if st.button("Clear", use_container_width=True):
-                st.session_state.restored_transcriptions = None
-                st.session_state.restored_corrections = None
+                st.session_state.restored_record_id = None
                 st.rerun()
 
-        # Display restored results
-        render_correction_results(
-            st.session_state.get('restored_transcriptions'),
-            st.session_state.restored_corrections
-        )
+        # Display restored results (read from the local store, not kept in the session)
+        render_restored_record(db, api_key, st.session_state.restored_record_id, debug_mode)
         return
 
-    # File upload section
-    user_images, answer_image = render_file_upload_section()
-
-    # Analysis button
+    # Analysis button: queue a background job, the list below tracks it
     if st.button("INITIALIZE ANALYSIS", use_container_width=True):
-        if not api_key:
+        if not api_key and Config.MODEL_PROVIDER != "stub":
             st.error("API Key Required")
             return
 
-        if not user_images or not answer_image:
+        if not user_pages or not answer_page:
             st.error("Files Missing")
             return
 
-        # Run three-stage AI pipeline
-        run_analysis_pipeline(user_images, answer_image, debug_mode, db)
-
-
-def run_analysis_pipeline(user_images, answer_image, debug_mode, db):
-    """
-    Execute three-stage AI analysis pipeline
-
-    Args:
-        user_images: List of user handwriting images
-        answer_image: Standard answer image
-        debug_mode: Show detailed debugging info
-        db: Database service instance
-    """
-
-    # --- Stage 1: Transcription ---
-    with st.status("Processing Transcription...", expanded=True) as status:
-        transcription_result = transcription.process(user_images, answer_image, debug_mode)
-
-        if transcription_result:
-            try:
-                transcription_data = json.loads(transcription_result)
-                st.write(f"Identified {len(transcription_data)} items")
-            except json.JSONDecodeError:
-                st.write("Transcription complete")
-
-            status.update(label="Transcription Complete", state="complete", expanded=False)
-        else:
-            status.update(label="Transcription Failed", state="error")
+        try:
+            runner.submit(
+                client_id, user_pages, answer_page, label=st.session_state.get('upload_label'), api_key=api_key
+            )
+        except Exception as e:
+            st.error(f"Failed to queue the analysis: {e}")
             return
 
-    # --- Stage 2: Correction ---
-    with st.status("Analyzing & Correcting...", expanded=True) as status:
-        correction_result = correction.process(transcription_result, debug_mode)
-
-        if correction_result:
-            try:
-                correction_data = json.loads(correction_result)
-                st.write(f"Corrected {len(correction_data)} items")
-            except json.JSONDecodeError:
-                st.write("Correction complete")
+        # Inputs were copied to the job, release this session's pages and uploads
+        release_uploads()
+        st.rerun()
 
-            status.update(label="Correction Complete", state="complete", expanded=False)
-        else:
-            status.update(label="Correction Failed", state="error")
-            return
-
-    # --- Save to Database ---
-    if db.is_connected():
-        try:
-            transcription_data = json.loads(transcription_result)
-            correction_data = json.loads(correction_result)
-            db.save_correction(correction_data, transcription_data)
-        except Exception:
-            pass  # Silent fail for elegance
-
-    # --- Display Results ---
-    render_correction_results(transcription_result, correction_result)
+    render_job_list(runner, client_id, debug_mode)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,260 @@
+"""
+Render Benchmark
+歷史頁與批改報告的渲染效能基準測試（Streamlit AppTest）
+
+Runs app.py headlessly against a local SQLite history seeded with synthetic
+records and measures, per view and size: script execution time, number of
+elements, emitted bytes (serialized element protos) and peak Python memory.
+Results are compared against benchmarks/baseline.json.
+
+Usage:
+    python -m benchmarks.render_benchmark
+    python -m benchmarks.render_benchmark --sizes 10 100 --views archive
+    python -m benchmarks.render_benchmark --update-baseline
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_PATH = ROOT / "app.py"
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+VIEWS = ("archive", "report")
+DEFAULT_SIZES = (10, 100, 1000)
+
+# Allowed growth over the baseline before a metric counts as a regression.
+# Element counts and bytes are deterministic; time and memory depend on the machine.
+TOLERANCES = {
+    "elements": 0.05,
+    "bytes": 0.05,
+    "seconds": 0.50,
+    "peak_mb": 0.25,
+}
+
+# Absolute slack so small, noisy measurements do not flap
+MIN_SLACK = {
+    "seconds": 0.1,
+    "peak_mb": 1.0,
+}
+
+# Deterministic metrics that may not shrink below the baseline by more than
+# their tolerance either: a large improvement means the baseline is stale
+# and would let the old behaviour back in unnoticed
+IMPROVEMENT_CHECKED = ("elements", "bytes")
+
+
+def _prepare_environment(data_dir: str):
+    """Point the app at a throwaway SQLite store before config is imported"""
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = str(Path(data_dir) / "history.db")
+    os.environ.pop("GOOGLE_API_KEY", None)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    os.chdir(ROOT)
+
+    # Seeding and session setup run outside a script run ("bare mode") and warn about it
+    from streamlit.runtime.scriptrunner_utils import script_run_context
+    logging.getLogger(script_run_context.__name__).addFilter(
+        lambda record: "missing ScriptRunContext" not in record.getMessage()
+    )
+
+
+def seed_history(path: str, num_records: int, items_per_record: int = 30) -> None:
+    """
+    Fill a SQLite history file with synthetic records
+
+    Args:
+        path: SQLite file to create
+        num_records: Number of records to insert
+        items_per_record: Corrected items per record
+    """
+    from benchmarks.synthetic import make_history
+    from config.settings import Config
+    from services.database import DatabaseService
+
+    Config.STORAGE_BACKEND = "sqlite"
+    Config.SQLITE_PATH = path
+    db = DatabaseService()
+
+    for idx, (corrections, transcriptions) in enumerate(make_history(num_records, items_per_record), start=1):
+        db.save_correction(corrections, transcriptions)
+        # Every other record carries a user-given name, like a real archive
+        if idx % 2:
+            db.backend.rename(idx, f"Homework #{idx}")
+
+
+def _walk(node):
+    """Yield the leaf elements below an AppTest tree node"""
+    children = getattr(node, "children", None)
+    if children:
+        for child in children.values():
+            yield from _walk(child)
+    elif getattr(node, "proto", None) is not None:
+        yield node
+
+
+def _build_app(view: str, size: int):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(APP_PATH), default_timeout=600)
+    if view == "archive":
+        at.session_state["show_history"] = True
+    else:
+        at.session_state["restored_record_id"] = 1
+    return at
+
+
+def measure(view: str, size: int, repeat: int = 5) -> dict:
+    """
+    Measure one view at one size
+
+    Args:
+        view: "archive" (first timeline page of a `size`-record history) or "report" (`size` corrected items)
+        size: Number of records or items
+        repeat: Timed runs (the median is reported)
+
+    Returns:
+        Dict with seconds, elements, bytes and peak_mb
+
+    Raises:
+        RuntimeError: If the script raised an exception
+    """
+    # Warm-up run: module imports and cached resources are not part of a rerun
+    at = _build_app(view, size)
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"{view}/{size}: {at.exception[0].message}")
+
+    from services.warmup import wait_for_warmup
+    wait_for_warmup()
+
+    elements = list(_walk(at.main))
+    emitted = sum(element.proto.ByteSize() for element in elements)
+
+    timings = []
+    for _ in range(repeat):
+        at = _build_app(view, size)
+        start = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - start)
+
+    # Traced separately: tracemalloc slows the script down
+    at = _build_app(view, size)
+    tracemalloc.start()
+    try:
+        at.run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": round(statistics.median(timings), 4),
+        "elements": len(elements),
+        "bytes": emitted,
+        "peak_mb": round(peak / (1024 * 1024), 2),
+    }
+
+
+def run_benchmark(views, sizes, repeat: int = 5) -> dict:
+    """
+    Measure every view at every size
+
+    Returns:
+        Nested dict {view: {size: metrics}} (sizes as strings, JSON friendly)
+    """
+    results = {view: {} for view in views}
+    with tempfile.TemporaryDirectory(prefix="render-bench-") as data_dir:
+        _prepare_environment(data_dir)
+
+        for size in sizes:
+            for view in views:
+                # Archive: `size` records; report: one restored record of `size` items
+                path = str(Path(data_dir) / f"{view}_{size}.db")
+                if view == "archive":
+                    seed_history(path, size)
+                else:
+                    seed_history(path, 1, items_per_record=size)
+
+                results[view][str(size)] = measure(view, size, repeat)
+                print(f"  {view:<8} {size:>5}  {_format(results[view][str(size)])}", file=sys.stderr)
+
+    return results
+
+
+def _format(metrics: dict) -> str:
+    return (
+        f"{metrics['seconds'] * 1000:9.1f} ms  {metrics['elements']:6d} elements  "
+        f"{metrics['bytes'] / 1024:9.1f} KB  {metrics['peak_mb']:7.2f} MB peak"
+    )
+
+
+def compare(results: dict, baseline: dict) -> list:
+    """
+    Compare results against the baseline
+
+    Returns:
+        List of regression messages, and of stale-baseline messages for
+        deterministic metrics that improved beyond tolerance (empty if
+        everything is within tolerance)
+    """
+    regressions = []
+    for view, sizes in results.items():
+        for size, metrics in sizes.items():
+            reference = baseline.get(view, {}).get(size)
+            if not reference:
+                continue
+            for metric, tolerance in TOLERANCES.items():
+                limit = max(reference[metric] * (1 + tolerance), reference[metric] + MIN_SLACK.get(metric, 0))
+                if metrics[metric] > limit:
+                    regressions.append(
+                        f"{view}/{size} {metric}: {metrics[metric]} > {reference[metric]} (+{tolerance:.0%})"
+                    )
+                elif metric in IMPROVEMENT_CHECKED and metrics[metric] < reference[metric] * (1 - tolerance):
+                    regressions.append(
+                        f"{view}/{size} {metric}: {metrics[metric]} < {reference[metric]} (-{tolerance:.0%}), "
+                        f"stale baseline: run with --update-baseline"
+                    )
+    return regressions
+
+
+def main(argv=None) -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark archive and report rendering")
+    parser.add_argument("--views", nargs="+", choices=VIEWS, default=list(VIEWS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per measurement")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.views, args.sizes, args.repeat)
+
+    if args.update_baseline:
+        Path(args.baseline).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not Path(args.baseline).exists():
+        print("No baseline found; run with --update-baseline first.", file=sys.stderr)
+        return 1
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    regressions = compare(results, baseline)
+    for message in regressions:
+        print(f"REGRESSION {message}", file=sys.stderr)
+    if not regressions:
+        print("All measurements within baseline tolerance", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
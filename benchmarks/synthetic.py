@@ -0,0 +1,85 @@
+"""
+Synthetic History
+效能測試用的模擬批改記錄（固定亂數種子，可重現）
+"""
+import random
+
+
+# Feedback points in the register of the correction prompt (lengths match real output)
+FEEDBACK_POINTS = [
+    "User 寫作 'the economic of Greece' 有文法錯誤（economic 為形容詞，不能接 of），應改為 'the economy of Greece' 或 'economically dependent'。",
+    "User 使用 'trip blogs' 也是正確的，Standard 使用 'travel blogs online' 更為常見。如欲更貼近標準答案，可考慮此用法。",
+    "User 拼字錯誤 'develope' 應為 'develop'（必須修正）。",
+    "User 使用 'have more recognition of' 文法正確但較不自然，Standard 使用 'know more about' 更為口語化，建議參考。",
+    "User 時態錯誤 'has became' 應為 'has become'（現在完成式需用過去分詞）。",
+    "User 介系詞使用錯誤 'depend in' 應為 'depend on'。",
+    "User 的句型與用詞正確，表達清楚。",
+]
+
+STANDARD_SENTENCES = [
+    "Many young people rely on travel blogs online to plan their trips abroad.",
+    "The economy of Greece is heavily dependent on tourism and shipping.",
+    "One fifth of jobs may be replaced by artificial intelligence in the next decade.",
+    "Learning a foreign language helps us overcome the language barrier.",
+    "Since the pandemic broke out, more and more people have started working from home.",
+    "It is widely believed that reading for pleasure improves students' writing skills.",
+]
+
+# Common slips introduced into the user's sentence
+USER_SLIPS = [
+    ("the", "a"),
+    ("on", "in"),
+    ("have", "has"),
+    ("economy", "economic"),
+    ("people", "peoples"),
+]
+
+# A typical worksheet: sections of five sub-questions
+ITEMS_PER_RECORD = 30
+
+
+def make_report(num_items: int, seed: int = 0) -> tuple:
+    """
+    Build one synthetic correction result
+
+    Args:
+        num_items: Number of corrected items
+        seed: Random seed
+
+    Returns:
+        Tuple of (correction_data, transcription_data)
+    """
+    rng = random.Random(seed)
+    corrections, transcriptions = [], []
+
+    for idx in range(num_items):
+        question_id = f"{idx // 5 + 1}.{idx % 5 + 1}"
+        standard = rng.choice(STANDARD_SENTENCES)
+        old, new = rng.choice(USER_SLIPS)
+        user = standard.replace(old, new, 1)
+
+        transcriptions.append({"id": question_id, "user": user, "standard": standard})
+        corrections.append({
+            "id": question_id,
+            "user": user,
+            "correction": standard,
+            "feedback": rng.sample(FEEDBACK_POINTS, rng.randint(1, 3))
+        })
+
+    return corrections, transcriptions
+
+
+def make_history(num_records: int, items_per_record: int = ITEMS_PER_RECORD, seed: int = 0):
+    """
+    Yield synthetic history entries
+
+    Args:
+        num_records: Number of records
+        items_per_record: Corrected items per record
+        seed: Base random seed
+
+    Yields:
+        Tuples of (correction_data, transcription_data)
+    """
+    for idx in range(num_records):
+        yield make_report(items_per_record, seed + idx)
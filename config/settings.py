@@ -4,12 +4,51 @@ Configuration Management
 """
 import os
 from dotenv import load_dotenv
-import streamlit as st
 
 # Load environment variables
 load_dotenv()
 
 
+def _setting(name: str, default=None):
+    """Read a setting from the environment, then Streamlit secrets (missing secrets file is fine)"""
+    value = os.getenv(name)
+    if value:
+        return value
+    try:
+        import streamlit as st
+        return st.secrets.get(name, default)
+    except Exception:
+        return default
+
+
+def _flag(value) -> bool:
+    return str(value).lower() in ("1", "true", "yes")
+
+
+class _Setting:
+    """
+    Config attribute resolved on first access
+
+    Parsing secrets.toml costs ~0.4 s, so nothing is read at import time. The
+    resolved value replaces the descriptor on the class (assigning the
+    attribute directly still works as an override).
+    """
+
+    def __init__(self, default=None, convert=None):
+        self.default = default
+        self.convert = convert
+
+    def __set_name__(self, owner, attr):
+        self.attr = attr
+
+    def __get__(self, instance, owner):
+        value = _setting(self.attr, self.default)
+        if self.convert is not None:
+            value = self.convert(value)
+        setattr(owner, self.attr, value)
+        return value
+
+
 class Config:
     """Application configuration from environment variables"""
 
@@ -17,27 +56,87 @@ class Config:
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     GEMINI_MODEL = "gemini-3-pro-preview"
 
+    # Model tiering: short, nearly correct items are corrected by the fast model
+    GEMINI_FAST_MODEL = "gemini-2.5-flash"
+    MODEL_TIERING = _Setting("true", _flag)
+    TIER_MAX_WORDS = 30
+    TIER_MAX_EDIT_RATIO = 0.4
+    # USD per million tokens (input, output), for the cost report only
+    MODEL_PRICES = {
+        "gemini-3-pro-preview": (2.00, 12.00),
+        "gemini-2.5-flash": (0.30, 2.50),
+    }
+    # Cached input tokens are billed at this share of the input price
+    CACHED_INPUT_PRICE_RATIO = 0.25
+
+    # "gemini", or "stub" for offline runs (canned answers, no API key needed)
+    MODEL_PROVIDER = _Setting("gemini", str.lower)
+
+    # Context caching of the static prompt prefixes (and reused answer-key images)
+    PROMPT_CACHE = _Setting("true", _flag)
+    PROMPT_CACHE_TTL_SECONDS = 1800
+    PROMPT_CACHE_ANSWER_IMAGE = True
+
+    # Page images uploaded once through the file API and referenced by content hash
+    FILE_UPLOADS = _Setting("true", _flag)
+    FILE_INDEX_PATH = _Setting("data/file_index.json")
+
     # Supabase Configuration
-    SUPABASE_URL = os.getenv("SUPABASE_URL") or st.secrets.get("SUPABASE_URL")
-    SUPABASE_KEY = os.getenv("SUPABASE_KEY") or st.secrets.get("SUPABASE_KEY")
+    SUPABASE_URL = _Setting()
+    SUPABASE_KEY = _Setting()
 
-    # Streamlit Page Config
-    PAGE_TITLE = "Handwriting Correction"
-    PAGE_ICON = None
-    LAYOUT = "wide"
+    # Storage Backend: "supabase" (cloud) or "sqlite" (local file)
+    STORAGE_BACKEND = _Setting("supabase", str.lower)
+    SQLITE_PATH = _Setting("data/correction_history.db")
 
+    # Compress large corrections payloads (Supabase indexes their text from the corrections_text column)
+    PAYLOAD_COMPRESSION = _Setting("false", _flag)
+    PAYLOAD_COMPRESS_MIN_BYTES = 4096
 
-def configure_gemini_api(api_key: str = None):
-    """
-    Configure Google Gemini API
+    # Local mirror of a remote history table (ignored for the sqlite backend)
+    HISTORY_MIRROR = _Setting("true", _flag)
+    HISTORY_MIRROR_PATH = _Setting("data/history_mirror.db")
+    HISTORY_MIRROR_SYNC_SECONDS = 5.0
+    # Full id comparison with the remote (rows committed out of id order, remote deletes)
+    HISTORY_MIRROR_RECONCILE_SECONDS = 300.0
 
-    Args:
-        api_key: Optional API key override
-    """
-    import google.generativeai as genai
+    # History Archive
+    HISTORY_PAGE_SIZE = 20
+
+    # Encoded upload pages kept in memory per session before spilling to disk
+    SESSION_MEMORY_BUDGET_MB = 32
+    # PDF pages are written to the session's disk cache as rasterized; raw
+    # stores uncompressed pixels (about 10x the disk, no PNG decode on open)
+    PAGE_STORE_RAW = _Setting("false", _flag)
 
-    key = api_key or Config.GOOGLE_API_KEY
-    if key:
-        genai.configure(api_key=key)
-        return True
-    return False
+    # Upload pages left out of the request: blank pages (share of ink pixels
+    # below PAGE_BLANK_INK_RATIO) and rescans of an earlier page. Pages whose
+    # 256-bit hashes differ in at most PAGE_DUPLICATE_CANDIDATE_BITS are
+    # compared region by region before one is dropped.
+    PAGE_ANALYSIS = _Setting("true", _flag)
+    PAGE_BLANK_INK_RATIO = 0.0005
+    PAGE_DUPLICATE_CANDIDATE_BITS = 96
+
+    # PDF pages are rasterized at PDF_DPI, or with PDF_ADAPTIVE_DPI at the
+    # lowest DPI (PDF_MIN_DPI..PDF_MAX_DPI) where a line of text is
+    # PDF_TEXT_LINE_PX tall, measured on a PDF_PREVIEW_DPI preview
+    PDF_DPI = 200
+    PDF_ADAPTIVE_DPI = _Setting("true", _flag)
+    PDF_PREVIEW_DPI = 72
+    PDF_MIN_DPI = 100
+    PDF_MAX_DPI = 300
+    PDF_TEXT_LINE_PX = 24
+
+    # Background correction jobs (shared worker pool)
+    JOB_WORKERS = 2
+    JOB_DB_PATH = _Setting("data/jobs.db")
+    JOB_DIR = _Setting("data/jobs")
+    JOB_POLL_SECONDS = 2.0
+    JOB_LIST_LIMIT = 10
+    # Jobs whose client has had no open tab this long are cancelled (covers refreshes and reconnects)
+    JOB_ABANDON_SECONDS = 60.0
+
+    # Streamlit Page Config
+    PAGE_TITLE = "Handwriting Correction"
+    PAGE_ICON = None
+    LAYOUT = "wide"
@@ -1,68 +1,249 @@
 """
 Database Service
-Supabase 雲端儲存管理
+歷史記錄儲存管理（Supabase 雲端 / SQLite 本地）
 """
 import streamlit as st
-from supabase import create_client, Client
 from datetime import datetime, timezone
 from typing import Optional
-import json
 
 from config.settings import Config
+from services.error_stats import build_stat_increments, diff_stat_increments, record_day
+from services.history_mirror import HistoryMirror, get_history_mirror
+from services.payload_codec import (
+    build_answer_key,
+    decode_record,
+    encode_history_payload,
+    referenced_answer_key
+)
+from services.result_model import ItemList
+from services.storage import StorageBackend, create_backend
+
+
+def _storage_location(kind: str) -> Optional[str]:
+    """Target of a storage backend, used to key the shared instance"""
+    return Config.SQLITE_PATH if kind == "sqlite" else Config.SUPABASE_URL
+
+
+@st.cache_resource(show_spinner=False)
+def get_storage_backend(kind: str, location: Optional[str]) -> Optional[StorageBackend]:
+    """
+    Shared backend per storage target, reused across reruns and sessions
+
+    Keeps the Supabase client (and its pooled TLS connection) alive instead of
+    building a new one on every rerun.
+
+    Args:
+        kind: "supabase" or "sqlite"
+        location: SQLite path or Supabase URL (cache key only)
+    """
+    return create_backend(kind)
+
+
+def _plain(data):
+    """Stored form of a result: typed results become plain item dicts, lists pass through"""
+    return data.to_list() if isinstance(data, ItemList) else data
+
+
+def _open_view(view: str):
+    """Sidebar callback: switch views before the rerun starts rendering"""
+    st.session_state.show_history = view == "history"
+    st.session_state.show_dashboard = view == "dashboard"
 
 
 class DatabaseService:
-    """Supabase database connection and operations"""
+    """History storage connection and operations"""
 
     def __init__(self):
-        """Initialize Supabase client"""
-        self.client: Optional[Client] = None
+        """Initialize the configured storage backend"""
+        self.backend: Optional[StorageBackend] = None
+        self.mirror: Optional[HistoryMirror] = None
         self._connect()
 
     def _connect(self):
-        """Establish connection to Supabase"""
-        if Config.SUPABASE_URL and Config.SUPABASE_KEY:
+        """Establish connection to the storage backend selected in Config"""
+        try:
+            self.backend = get_storage_backend(Config.STORAGE_BACKEND, _storage_location(Config.STORAGE_BACKEND))
+        except Exception as e:
+            st.error(f"Storage Connection Error ({Config.STORAGE_BACKEND}): {e}")
+            self.backend = None
+
+        # Remote backends are read through an incrementally synced local mirror
+        if self.backend is not None and Config.HISTORY_MIRROR and Config.STORAGE_BACKEND != "sqlite":
             try:
-                self.client = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+                self.mirror = get_history_mirror(
+                    Config.HISTORY_MIRROR_PATH,
+                    Config.HISTORY_MIRROR_SYNC_SECONDS,
+                    Config.HISTORY_MIRROR_RECONCILE_SECONDS,
+                    _storage_location(Config.STORAGE_BACKEND),
+                    self.backend
+                )
             except Exception as e:
-                st.error(f"Supabase Connection Error: {e}")
-                self.client = None
+                st.warning(f"History mirror unavailable: {e}")
+                self.mirror = None
+
+    def _reader(self) -> StorageBackend:
+        """Backend used for reads: the local mirror (after a delta sync) or the backend itself"""
+        if self.mirror is None:
+            return self.backend
+
+        try:
+            self.mirror.sync()
+        except Exception as e:
+            st.toast(f"History sync failed, showing local copy: {e}")
+        return self.mirror.store
+
+    def _push_to_mirror(self) -> None:
+        """Pull a committed write into the mirror right away (best effort: the next read retries)"""
+        if self.mirror is None:
+            return
+        try:
+            self.mirror.sync(force=True)
+        except Exception:
+            pass  # A lagging mirror must not turn a committed write into a failure
+
+    def _load_answer_keys(self, keys: set) -> dict:
+        """Fetch answer keys, reading the mirror first and caching remote hits into it"""
+        keys = [key for key in keys if key]
+        if not keys:
+            return {}
+
+        found = self._reader().get_answer_keys(keys)
+        missing = [key for key in keys if key not in found]
+        if missing and self.mirror is not None:
+            fetched = self.backend.get_answer_keys(missing)
+            for key, standards in fetched.items():
+                self.mirror.store.save_answer_key(key, standards)
+            found.update(fetched)
+        return found
+
+    def _decode_records(self, records: list) -> list:
+        """Restore the original payload structure of stored records"""
+        answer_keys = self._load_answer_keys({referenced_answer_key(record) for record in records})
+        return [decode_record(record, answer_keys) for record in records]
 
     def is_connected(self) -> bool:
         """Check if database is connected"""
-        return self.client is not None
+        return self.backend is not None
 
     def save_correction(
         self,
-        correction_data: list,
-        transcription_data: Optional[list] = None
-    ) -> bool:
+        correction_data,
+        transcription_data=None
+    ) -> Optional[int]:
         """
         Save correction result to history
 
         Args:
-            correction_data: Agent 2 output (Correction JSON data as list)
-            transcription_data: Agent 1 output (Transcription JSON data as list, optional)
+            correction_data: Agent 2 output (Corrections or list of item dicts)
+            transcription_data: Agent 1 output (Transcription or list of item dicts, optional)
 
         Returns:
-            True if successful, False otherwise
+            ID of the new record, None if saving failed
         """
         if not self.is_connected():
-            return False
+            return None
+        correction_data, transcription_data = _plain(correction_data), _plain(transcription_data)
 
         try:
+            # Standard answers are stored once per answer key and referenced by hash
+            answer_key, standards = build_answer_key(transcription_data)
+            if answer_key is not None:
+                try:
+                    self.backend.save_answer_key(answer_key, standards)
+                except Exception:
+                    answer_key = None  # No answer_keys table: keep standards inline
+
             history_entry = {
                 "timestamp": datetime.now(timezone.utc).isoformat(),
-                "corrections": correction_data,
-                "transcriptions": transcription_data
+                **encode_history_payload(
+                    correction_data,
+                    transcription_data,
+                    answer_key,
+                    compress=Config.PAYLOAD_COMPRESSION,
+                    min_bytes=Config.PAYLOAD_COMPRESS_MIN_BYTES
+                )
             }
-            self.client.table("correction_history").insert(history_entry).execute()
-            return True
+            record_id = self.backend.insert(history_entry)
 
         except Exception:
             # Silent fail for elegance
+            return None
+
+        self._push_to_mirror()
+
+        # Aggregates are best effort: a missing stats table must not fail the save
+        try:
+            self.backend.increment_stats(
+                build_stat_increments(record_id, correction_data, record_day(history_entry))
+            )
+        except Exception:
+            pass
+        return record_id
+
+    def update_correction(
+        self,
+        record_id: int,
+        correction_data,
+        transcription_data=None
+    ) -> bool:
+        """
+        Overwrite the results of an existing record (after a re-grade)
+
+        The record keeps its id, name and creation time; its error statistics
+        are adjusted by the difference between the old and new corrections.
+
+        Args:
+            record_id: The ID of the record to update
+            correction_data: Agent 2 output (Corrections or list of item dicts)
+            transcription_data: Agent 1 output (Transcription or list of item dicts, optional)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not self.is_connected():
+            return False
+        correction_data, transcription_data = _plain(correction_data), _plain(transcription_data)
+
+        try:
+            stored = self.backend.get(record_id)
+            if stored is None:
+                st.error(f"Record #{record_id} no longer exists")
+                return False
+            previous = self._decode_records([stored])[0]
+
+            answer_key, standards = build_answer_key(transcription_data)
+            if answer_key is not None:
+                try:
+                    self.backend.save_answer_key(answer_key, standards)
+                except Exception:
+                    answer_key = None  # No answer_keys table: keep standards inline
+
+            self.backend.update_payload(record_id, encode_history_payload(
+                correction_data,
+                transcription_data,
+                answer_key,
+                compress=Config.PAYLOAD_COMPRESSION,
+                min_bytes=Config.PAYLOAD_COMPRESS_MIN_BYTES
+            ))
+
+        except Exception as e:
+            st.error(f"Failed to update record: {e}")
             return False
 
+        self._push_to_mirror()
+
+        # Aggregates are best effort, as in save_correction
+        try:
+            day = record_day(previous)
+            name = previous.get('name')
+            self.backend.increment_stats(diff_stat_increments(
+                build_stat_increments(record_id, previous.get('corrections'), day, name),
+                build_stat_increments(record_id, correction_data, day, name)
+            ))
+        except Exception:
+            pass
+        return True
+
     def get_history_count(self) -> int:
         """
         Get total number of corrections in history
@@ -74,8 +255,7 @@ class DatabaseService:
             return 0
 
         try:
-            response = self.client.table("correction_history").select("id", count="exact").execute()
-            return response.count if hasattr(response, 'count') else 0
+            return self._reader().count()
 
         except Exception:
             return 0
@@ -84,6 +264,19 @@ class DatabaseService:
         """
         Get all correction history records
 
+        Returns:
+            List of history records, empty list if error
+        """
+        return self.get_history_page(limit=None)
+
+    def get_history_page(self, limit: Optional[int] = 20, offset: int = 0) -> list:
+        """
+        Get one page of correction history records (newest first)
+
+        Args:
+            limit: Page size, None for all remaining records
+            offset: Number of records to skip
+
         Returns:
             List of history records, empty list if error
         """
@@ -91,13 +284,105 @@ class DatabaseService:
             return []
 
         try:
-            response = self.client.table("correction_history").select("*").order("created_at", desc=True).execute()
-            return response.data if response.data else []
+            return self._decode_records(self._reader().list(limit=limit, offset=offset))
 
         except Exception as e:
             st.error(f"Failed to load history: {e}")
             return []
 
+    def iter_history(self, chunk_size: int = 500):
+        """
+        Iterate over all records oldest first, one decoded chunk at a time
+
+        Pages by id keyset, so memory stays bounded by `chunk_size` no matter
+        how large the history is.
+
+        Args:
+            chunk_size: Records fetched per query
+
+        Yields:
+            Lists of decoded history records
+        """
+        if not self.is_connected():
+            return
+
+        reader = self._reader()
+        last_id = 0
+        while True:
+            records = reader.list_since(last_id, limit=chunk_size)
+            if not records:
+                return
+            last_id = records[-1]["id"]
+            yield self._decode_records(records)
+            if len(records) < chunk_size:
+                return
+
+    def get_record(self, record_id: int) -> Optional[dict]:
+        """
+        Get a single correction record by id
+
+        Args:
+            record_id: The ID of the record
+
+        Returns:
+            Record dict, None if missing or error
+        """
+        if not self.is_connected():
+            return None
+
+        try:
+            record = self._reader().get(record_id)
+            return self._decode_records([record])[0] if record else None
+
+        except Exception as e:
+            st.error(f"Failed to load record: {e}")
+            return None
+
+    def search_history(self, query: str, limit: int = 20, offset: int = 0) -> tuple:
+        """
+        Search history through the backend's full-text index
+
+        Args:
+            query: Search terms (names, user text, corrections, feedback)
+            limit: Page size
+            offset: Number of matches to skip
+
+        Returns:
+            Tuple of (ranked records, total match count), ([], 0) if error
+        """
+        if not self.is_connected() or not query.strip():
+            return [], 0
+
+        try:
+            records, total = self._reader().search(query.strip(), limit=limit, offset=offset)
+            return self._decode_records(records), total
+
+        except Exception as e:
+            st.error(f"Search failed: {e}")
+            return [], 0
+
+    def get_stats(self, dimension: str, order_by: str = "items", limit: Optional[int] = None) -> list:
+        """
+        Get incrementally maintained error statistics (never scans the history)
+
+        Args:
+            dimension: "category", "question", "day" or "record"
+            order_by: "items", "errors" or "key"
+            limit: Maximum number of rows
+
+        Returns:
+            List of {dimension, key, label, items, errors} rows, empty list if error
+        """
+        if not self.is_connected():
+            return []
+
+        try:
+            return self.backend.get_stats(dimension, order_by=order_by, limit=limit)
+
+        except Exception as e:
+            st.error(f"Failed to load statistics: {e}")
+            return []
+
     def update_record_name(self, record_id: int, new_name: str) -> bool:
         """
         Update the name of a correction record
@@ -113,18 +398,25 @@ class DatabaseService:
             return False
             
         try:
-            self.client.table("correction_history").update({"name": new_name}).eq("id", record_id).execute()
-            return True
+            self.backend.rename(record_id, new_name)
+            if self.mirror is not None:
+                self.mirror.store.rename(record_id, new_name)
         except Exception as e:
             st.error(f"Failed to update record name: {e}")
             return False
 
+        try:
+            self.backend.set_stat_label("record", str(record_id), new_name)
+        except Exception:
+            pass
+        return True
+
     def render_sidebar_info(self):
         """Render database info in sidebar"""
         st.sidebar.markdown("### History")
 
         if not self.is_connected():
-            st.sidebar.info("Supabase not configured.")
+            st.sidebar.info("Storage not configured.")
             return
 
         # Display history count
@@ -134,6 +426,6 @@ class DatabaseService:
             unsafe_allow_html=True
         )
 
-        # View history button (placeholder)
-        if st.sidebar.button("View Archive", use_container_width=True):
-            st.session_state.show_history = True
+        # Callbacks, so the view is already switched when the page body renders
+        st.sidebar.button("View Archive", use_container_width=True, on_click=_open_view, args=("history",))
+        st.sidebar.button("Error Dashboard", use_container_width=True, on_click=_open_view, args=("dashboard",))
@@ -0,0 +1,204 @@
+"""
+Error Statistics
+批改錯誤統計（每次儲存時增量更新）
+
+Usage:
+    python -m services.error_stats --rebuild
+"""
+import argparse
+import sys
+from collections import defaultdict
+from typing import Optional
+
+
+# Aggregate dimensions kept in the stats store
+DIMENSIONS = ("category", "question", "day", "record")
+
+# Feedback keyword rules, checked in order; an item can fall into several categories
+ERROR_CATEGORIES = [
+    ("spelling", ("拼字", "拼寫", "spelling")),
+    ("tense", ("時態", "tense")),
+    ("agreement", ("主詞動詞", "主謂一致", "agreement")),
+    ("preposition", ("介系詞", "介詞", "preposition")),
+    ("article", ("冠詞", "article")),
+    ("number", ("單複數", "複數", "單數", "plural")),
+    ("word_form", ("詞性", "形容詞", "副詞")),
+    ("collocation", ("搭配", "collocation")),
+    ("word_choice", ("用詞", "用字", "word choice")),
+    ("grammar", ("文法", "語法", "grammar")),
+]
+
+# Suggestion wording from the correction prompt ("Can Improve")
+SUGGESTION_KEYWORDS = ("建議", "可考慮", "更為常見", "更自然", "更道地", "更精確", "參考")
+
+CATEGORY_LABELS = {
+    "spelling": "Spelling",
+    "tense": "Tense",
+    "agreement": "Subject-Verb Agreement",
+    "preposition": "Preposition",
+    "article": "Article",
+    "number": "Singular / Plural",
+    "word_form": "Word Form",
+    "collocation": "Collocation",
+    "word_choice": "Word Choice",
+    "grammar": "Grammar (Other)",
+    "other": "Other Error",
+    "suggestion": "Style Suggestion",
+}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(str(text or "").split()).lower()
+
+
+def classify_item(item: dict) -> tuple:
+    """
+    Classify one corrected item
+
+    Args:
+        item: Agent 2 item ({id, user, correction, feedback})
+
+    Returns:
+        Tuple of (is_error, list of category keys)
+    """
+    feedback = item.get('feedback') or []
+    text = " ".join(str(point) for point in (feedback if isinstance(feedback, list) else [feedback]))
+    lowered = text.lower()
+
+    is_error = _normalize(item.get('correction')) != _normalize(item.get('user'))
+    categories = [
+        category for category, keywords in ERROR_CATEGORIES
+        if any(keyword in lowered for keyword in keywords)
+    ]
+
+    if is_error and not categories:
+        categories.append("other")
+    if not is_error:
+        # Correction kept the user's text: anything mentioned is advice, not an error
+        categories = ["suggestion"] if any(keyword in text for keyword in SUGGESTION_KEYWORDS) else []
+    return is_error, categories
+
+
+def record_day(record: dict) -> str:
+    """
+    UTC date a record is counted under (YYYY-MM-DD)
+
+    Taken from the `timestamp` the app writes at save time, so saving and
+    later re-grades agree; created_at only for records without one.
+    """
+    return str(record.get('timestamp') or record.get('created_at') or '')[:10]
+
+
+def build_stat_increments(
+    record_id,
+    corrections: Optional[list],
+    day: str,
+    record_label: Optional[str] = None
+) -> list:
+    """
+    Compute the counter increments contributed by one saved record
+
+    Args:
+        record_id: ID of the saved record (None: no per-record counters)
+        corrections: Agent 2 output list
+        day: UTC date of the record (YYYY-MM-DD)
+        record_label: Display name of the record, if any
+
+    Returns:
+        List of {dimension, key, label, items, errors} increments
+    """
+    counters = defaultdict(lambda: [0, 0])
+
+    for item in corrections or []:
+        if not isinstance(item, dict):
+            continue
+        is_error, categories = classify_item(item)
+        keys = [("question", str(item.get('id', ''))), ("day", day)]
+        if record_id is not None:
+            keys.append(("record", str(record_id)))
+        keys.extend(("category", category) for category in categories)
+        for key in keys:
+            counters[key][0] += 1
+            counters[key][1] += int(is_error)
+
+    labels = {("record", str(record_id)): record_label}
+    labels.update({("category", key): label for key, label in CATEGORY_LABELS.items()})
+
+    return [
+        {
+            "dimension": dimension,
+            "key": key,
+            "label": labels.get((dimension, key)),
+            "items": items,
+            "errors": errors
+        }
+        for (dimension, key), (items, errors) in counters.items()
+    ]
+
+
+def diff_stat_increments(before: list, after: list) -> list:
+    """
+    Increments that turn one record's old counters into its new ones
+
+    Args:
+        before: build_stat_increments of the record as it was stored
+        after: build_stat_increments of the updated record
+
+    Returns:
+        List of {dimension, key, label, items, errors} increments (possibly negative)
+    """
+    rows = {}
+    for sign, increments in ((-1, before), (1, after)):
+        for row in increments:
+            entry = rows.setdefault((row["dimension"], row["key"]), {**row, "items": 0, "errors": 0})
+            entry["items"] += sign * row["items"]
+            entry["errors"] += sign * row["errors"]
+    return [row for row in rows.values() if row["items"] or row["errors"]]
+
+
+def rebuild_stats(db) -> int:
+    """
+    Recompute all aggregates from the full history (one-time backfill)
+
+    Args:
+        db: Database service instance
+
+    Returns:
+        Number of records processed
+    """
+    db.backend.reset_stats()
+    total = 0
+    for records in db.iter_history():
+        increments = []
+        for record in records:
+            increments.extend(build_stat_increments(
+                record['id'], record.get('corrections'), record_day(record), record.get('name')
+            ))
+        db.backend.increment_stats(increments)
+        total += len(records)
+    return total
+
+
+def main(argv=None) -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Maintain correction error statistics")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute aggregates from all history records")
+    args = parser.parse_args(argv)
+
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+
+    from services.database import DatabaseService
+
+    db = DatabaseService()
+    if not db.is_connected():
+        print("Storage not configured.", file=sys.stderr)
+        return 1
+
+    print(f"Rebuilt statistics from {rebuild_stats(db)} records", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
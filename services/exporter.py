@@ -0,0 +1,172 @@
+"""
+History Exporter
+歷史記錄串流匯出（CSV / JSONL / Parquet）
+
+Usage:
+    python -m services.exporter --format csv --output history.csv
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from typing import BinaryIO, Iterator
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_SUPPORT = True
+except ImportError:
+    PARQUET_SUPPORT = False
+
+
+# One row per corrected item
+EXPORT_COLUMNS = [
+    "record_id",
+    "record_name",
+    "created_at",
+    "question_id",
+    "user",
+    "correction",
+    "standard",
+    "feedback"
+]
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet")
+}
+
+
+def is_parquet_supported() -> bool:
+    """Check if Parquet export is supported"""
+    return PARQUET_SUPPORT
+
+
+def flatten_record(record: dict) -> Iterator[dict]:
+    """
+    Flatten one history record into one row per corrected item
+
+    Args:
+        record: Decoded history record
+
+    Yields:
+        Row dicts with EXPORT_COLUMNS keys
+    """
+    standard_by_id = {
+        item.get('id'): item.get('standard', '')
+        for item in record.get('transcriptions') or [] if isinstance(item, dict)
+    }
+
+    for item in record.get('corrections') or []:
+        if not isinstance(item, dict):
+            continue
+        feedback = item.get('feedback', '')
+        yield {
+            "record_id": record.get('id'),
+            "record_name": record.get('name') or '',
+            "created_at": record.get('created_at') or record.get('timestamp') or '',
+            "question_id": item.get('id', ''),
+            "user": item.get('user', ''),
+            "correction": item.get('correction', ''),
+            "standard": standard_by_id.get(item.get('id'), ''),
+            "feedback": "\n".join(feedback) if isinstance(feedback, list) else str(feedback or '')
+        }
+
+
+def iter_export_rows(db, chunk_size: int = 100) -> Iterator[list]:
+    """
+    Stream flattened rows from the history, one chunk of records at a time
+
+    Args:
+        db: Database service instance
+        chunk_size: Records fetched per query
+
+    Yields:
+        Lists of row dicts
+    """
+    for records in db.iter_history(chunk_size=chunk_size):
+        yield [row for record in records for row in flatten_record(record)]
+
+
+def export_history(db, output: BinaryIO, fmt: str = "csv", chunk_size: int = 100) -> int:
+    """
+    Write the whole history to a binary stream with constant memory
+
+    Args:
+        db: Database service instance
+        output: Writable binary file object
+        fmt: "csv", "jsonl" or "parquet"
+        chunk_size: Records fetched per query
+
+    Returns:
+        Number of rows written
+
+    Raises:
+        ValueError: If the format is unknown
+        RuntimeError: If Parquet is requested but pyarrow is not installed
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if fmt == "parquet" and not PARQUET_SUPPORT:
+        raise RuntimeError("pyarrow is not installed")
+
+    total = 0
+
+    if fmt == "csv":
+        # utf-8-sig so Excel opens the Chinese feedback correctly
+        text = io.TextIOWrapper(output, encoding="utf-8-sig", newline="", write_through=True)
+        writer = csv.DictWriter(text, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for rows in iter_export_rows(db, chunk_size):
+            writer.writerows(rows)
+            total += len(rows)
+        text.detach()
+
+    elif fmt == "jsonl":
+        for rows in iter_export_rows(db, chunk_size):
+            output.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8"))
+            total += len(rows)
+
+    else:
+        schema = pa.schema([
+            ("record_id", pa.int64()),
+            *[(column, pa.string()) for column in EXPORT_COLUMNS[1:]]
+        ])
+        with pq.ParquetWriter(output, schema, compression="zstd") as writer:
+            for rows in iter_export_rows(db, chunk_size):
+                if rows:
+                    writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                    total += len(rows)
+
+    return total
+
+
+def main(argv=None) -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Export correction history")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--output", "-o", default="-", help="Output file ('-' for stdout)")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Records fetched per query")
+    args = parser.parse_args(argv)
+
+    from services.database import DatabaseService
+
+    db = DatabaseService()
+    if not db.is_connected():
+        print("Storage not configured.", file=sys.stderr)
+        return 1
+
+    if args.output == "-":
+        total = export_history(db, sys.stdout.buffer, args.format, args.chunk_size)
+    else:
+        with open(args.output, "wb") as output:
+            total = export_history(db, output, args.format, args.chunk_size)
+
+    print(f"Exported {total} rows", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
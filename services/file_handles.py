@@ -0,0 +1,195 @@
+"""
+File Handles
+頁面圖片只上傳一次：以內容雜湊對應模型端檔案，之後的呼叫與重試直接引用
+"""
+import io
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from config.settings import Config
+from services.model_provider import FileHandle, ModelProvider, api_key_scope, get_provider
+from utils.page_cache import CONTENT_HASH
+
+
+class FileIndex:
+    """
+    Uploaded page images by content hash, persisted to a local JSON file
+
+    Only images decoded from page bytes (tagged with CONTENT_HASH) are
+    uploaded; others stay inline. A handle is reused until expiry_margin
+    before the provider deletes the file, then the image is uploaded again.
+    If an upload fails the image is sent inline, and uploads pause for
+    retry_seconds. Files belong to the API key that uploaded them, so the
+    index covers one key (scope) and is persisted under provider:scope.
+    """
+
+    def __init__(
+        self,
+        provider: ModelProvider,
+        path: Optional[str],
+        expiry_margin: float = 3600.0,
+        retry_seconds: float = 60.0,
+        scope: str = ""
+    ):
+        self.provider = provider
+        self.path = path
+        self.scope = scope
+        self.expiry_margin = expiry_margin
+        self.retry_seconds = retry_seconds
+        self._paused_until = 0.0
+        self._handles: Dict[str, FileHandle] = {}
+        self._lock = threading.Lock()
+        self._upload_locks: Dict[str, threading.Lock] = {}
+        self._stats = {"uploads": 0, "reused": 0, "expired": 0, "missing": 0, "inline": 0,
+                       "uploaded_bytes": 0, "reused_bytes": 0}
+        self._load()
+
+    @property
+    def _section(self) -> str:
+        """Key of this index's entries in the JSON file"""
+        return f"{self.provider.name}:{self.scope}"
+
+    def _load(self) -> None:
+        """Read the handles of this provider and key that are still valid"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f).get(self._section, [])
+        except (OSError, ValueError):
+            return  # Silent fail for elegance: start with an empty index
+        now = time.time()
+        for entry in entries:
+            try:
+                handle = FileHandle.from_dict(entry)
+            except (KeyError, TypeError):
+                continue
+            if handle.expires_at - self.expiry_margin > now:
+                self._handles[handle.content_hash] = handle
+
+    def _save(self) -> None:
+        """Write the index atomically (other providers' and keys' entries are kept)"""
+        if not self.path:
+            return
+        try:
+            data = {}
+            if os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+            with self._lock:
+                now = time.time()
+                data[self._section] = [
+                    handle.to_dict() for handle in self._handles.values() if handle.expires_at > now
+                ]
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except (OSError, ValueError):
+            pass  # Silent fail for elegance: the index is only an optimization
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def _upload_lock(self, content_hash: str) -> threading.Lock:
+        with self._lock:
+            return self._upload_locks.setdefault(content_hash, threading.Lock())
+
+    def handle_for(self, image: Image.Image) -> Optional[FileHandle]:
+        """
+        Live handle for a page image, uploading it on first use
+
+        Returns:
+            The handle, or None to send the image inline
+        """
+        content_hash = image.info.get(CONTENT_HASH)
+        if not content_hash:
+            return None
+
+        with self._upload_lock(content_hash):
+            with self._lock:
+                handle = self._handles.get(content_hash)
+            if handle is not None:
+                if handle.expires_at - self.expiry_margin > time.time():
+                    self._count("reused")
+                    self._count("reused_bytes", handle.size_bytes)
+                    return handle
+                self._count("expired")
+
+            if time.time() < self._paused_until:
+                self._count("inline")
+                return None
+
+            # Decoded pixels only: re-encode (the key stays the original bytes' hash)
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", compress_level=1)
+            data = buffer.getvalue()
+            try:
+                handle = self.provider.upload_file(data, "image/png", content_hash)
+            except Exception:
+                self._paused_until = time.time() + self.retry_seconds
+                self._count("inline")
+                return None
+
+            with self._lock:
+                self._handles[content_hash] = handle
+            self._count("uploads")
+            self._count("uploaded_bytes", len(data))
+        self._save()
+        return handle
+
+    def attach(self, parts: list) -> list:
+        """Replace page images with file handles where possible"""
+        return [
+            (self.handle_for(part) or part) if isinstance(part, Image.Image) else part
+            for part in parts
+        ]
+
+    def forget(self, names: List[str]) -> None:
+        """Drop handles the provider no longer has (the next call uploads again)"""
+        with self._lock:
+            for content_hash in [key for key, handle in self._handles.items() if handle.name in names]:
+                del self._handles[content_hash]
+            self._stats["missing"] += len(names)
+        self._save()
+
+    def stats(self) -> dict:
+        """
+        Upload counters since the process started
+
+        Returns:
+            Dict with uploads, reused, expired (re-uploaded after expiry),
+            missing (deleted early), inline (upload failed), uploaded_bytes,
+            reused_bytes (uploads avoided) and live handles
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["live"] = len(self._handles)
+        return stats
+
+
+_indexes: Dict[str, FileIndex] = {}
+_index_lock = threading.Lock()
+
+
+def get_file_index() -> FileIndex:
+    """Process-wide file index of the current provider and the API key of this context (the job's)"""
+    provider = get_provider()
+    scope = api_key_scope()
+    with _index_lock:
+        index = _indexes.get(scope)
+        if index is None or index.provider is not provider:
+            index = FileIndex(
+                provider,
+                Config.FILE_INDEX_PATH if provider.persistent_files else None,
+                scope=scope
+            )
+            _indexes[scope] = index
+        return index
@@ -0,0 +1,194 @@
+"""
+History Mirror
+遠端歷史記錄的本地 SQLite 鏡像（增量同步）
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import streamlit as st
+
+from services.sqlite_backend import SQLiteBackend
+from services.storage import StorageBackend
+
+
+# Rows pulled per remote request while catching up
+SYNC_BATCH_SIZE = 500
+
+# Ids listed per remote request while reconciling
+ID_BATCH_SIZE = 1000
+
+# Initial modification watermark (modified_at is NULL until a row is updated)
+EPOCH = "1970-01-01T00:00:00+00:00"
+
+# modified_at is set when the updating transaction starts, so an update can
+# commit after a later one: modifications this recent are read again
+MODIFIED_OVERLAP_SECONDS = 120.0
+
+
+def _all_ids(backend: StorageBackend) -> set:
+    """Every record id of a backend, listed in batches"""
+    ids = set()
+    after_id = 0
+    while True:
+        batch = backend.list_ids(after_id, limit=ID_BATCH_SIZE)
+        ids.update(batch)
+        if len(batch) < ID_BATCH_SIZE:
+            return ids
+        after_id = batch[-1]
+
+
+def _overlap_start(modified_at: str) -> Optional[str]:
+    """Start of the re-read window if the watermark is within it, else None"""
+    window_start = datetime.now(timezone.utc) - timedelta(seconds=MODIFIED_OVERLAP_SECONDS)
+    try:
+        watermark = datetime.fromisoformat(modified_at)
+    except ValueError:
+        return None
+    if watermark.tzinfo is None:
+        watermark = watermark.replace(tzinfo=timezone.utc)
+    if watermark <= window_start:
+        return None
+    return window_start.isoformat(timespec='milliseconds')
+
+
+class HistoryMirror:
+    """
+    Local copy of a remote `correction_history` table
+
+    New rows are pulled by id watermark, renames and other updates by a
+    (modified_at, id) keyset watermark whose last MODIFIED_OVERLAP_SECONDS
+    are read again. modified_at is only set on update, so a freshly inserted
+    row is transferred once. Both watermarks live in the mirror file's meta
+    table, so a restart only fetches the delta.
+
+    Postgres ids can commit out of order, and rows can be deleted remotely,
+    so every reconcile_interval the ids of both sides are compared: rows the
+    id scan skipped are fetched and rows gone from the remote are removed.
+    The file remembers which remote it mirrors and starts over for another.
+    """
+
+    def __init__(
+        self,
+        remote: StorageBackend,
+        path: str,
+        sync_interval: float = 5.0,
+        reconcile_interval: float = 300.0,
+        location: Optional[str] = None
+    ):
+        self.remote = remote
+        self.store = SQLiteBackend(path)
+        self.sync_interval = sync_interval
+        self.reconcile_interval = reconcile_interval
+        self._last_sync = 0.0
+        # A restart reconciles on its first sync
+        self._last_reconcile = None
+        self._sync_lock = threading.Lock()
+        if location is not None and self.store.get_meta("remote") != location:
+            self._reset(location)
+
+    def _reset(self, location: str) -> None:
+        """Drop rows mirrored from another remote and restart the watermarks"""
+        self.store.delete(sorted(_all_ids(self.store)))
+        self.store.set_meta({
+            "remote": location,
+            "last_id": 0,
+            "last_modified_at": EPOCH,
+            "last_modified_id": 0
+        })
+
+    def _reconcile(self) -> int:
+        """Fetch rows the id scan skipped and remove rows deleted remotely"""
+        remote_ids = _all_ids(self.remote)
+        local_ids = _all_ids(self.store)
+
+        deleted = sorted(local_ids - remote_ids)
+        if deleted:
+            self.store.delete(deleted)
+
+        missing = [self.remote.get(record_id) for record_id in sorted(remote_ids - local_ids)]
+        missing = [row for row in missing if row is not None]
+        if missing:
+            self.store.upsert(missing)
+        return len(deleted) + len(missing)
+
+    def sync(self, force: bool = False) -> int:
+        """
+        Pull rows created or modified since the last sync
+
+        Args:
+            force: Ignore the minimum interval between syncs
+
+        Returns:
+            Number of rows pulled from (or removed after) the remote backend
+        """
+        if not force and time.monotonic() - self._last_sync < self.sync_interval:
+            return 0
+
+        with self._sync_lock:
+            last_id = int(self.store.get_meta("last_id") or 0)
+            modified_at = self.store.get_meta("last_modified_at") or EPOCH
+            modified_id = int(self.store.get_meta("last_modified_id") or 0)
+            pulled = 0
+
+            # 1. New rows
+            while True:
+                rows = self.remote.list_since(last_id, limit=SYNC_BATCH_SIZE)
+                if not rows:
+                    break
+                self.store.upsert(rows)
+                pulled += len(rows)
+                last_id = max(row["id"] for row in rows)
+                if len(rows) < SYNC_BATCH_SIZE:
+                    break
+
+            # 2. Renames / updates of rows we already have (recent ones read again)
+            start = _overlap_start(modified_at)
+            scan_at, scan_id = (start, 0) if start is not None else (modified_at, modified_id)
+            while True:
+                rows = self.remote.list_modified_since(scan_at, scan_id, limit=SYNC_BATCH_SIZE)
+                if not rows:
+                    break
+                self.store.upsert(rows)
+                pulled += len(rows)
+                scan_at, scan_id = rows[-1]["modified_at"], rows[-1]["id"]
+                if (scan_at, scan_id) > (modified_at, modified_id):
+                    modified_at, modified_id = scan_at, scan_id
+                if len(rows) < SYNC_BATCH_SIZE:
+                    break
+
+            # 3. Late commits and deletes
+            now = time.monotonic()
+            if self._last_reconcile is None or now - self._last_reconcile >= self.reconcile_interval:
+                pulled += self._reconcile()
+                self._last_reconcile = now
+
+            self.store.set_meta({
+                "last_id": last_id,
+                "last_modified_at": modified_at,
+                "last_modified_id": modified_id
+            })
+            self._last_sync = time.monotonic()
+            return pulled
+
+
+@st.cache_resource(show_spinner=False)
+def get_history_mirror(
+    path: str,
+    sync_interval: float,
+    reconcile_interval: float,
+    location: Optional[str],
+    _remote: StorageBackend
+) -> HistoryMirror:
+    """
+    Shared mirror per file and remote, reused across reruns and sessions
+
+    Args:
+        path: Mirror SQLite file
+        sync_interval: Minimum seconds between delta queries
+        reconcile_interval: Seconds between full id comparisons
+        location: Remote the mirror copies (e.g. the Supabase URL)
+        _remote: Remote backend (not part of the cache key)
+    """
+    return HistoryMirror(_remote, path, sync_interval, reconcile_interval, location)
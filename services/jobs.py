@@ -0,0 +1,483 @@
+"""
+Job Runner
+背景批改工作（重新整理、斷線或切換頁面後仍可取回結果）
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import streamlit as st
+from PIL import Image
+
+from services.model_provider import api_key_scope, using_api_key
+from services.sqlite_backend import utc_now
+from utils.cancellation import Cancelled, CancelToken
+from utils.page_cache import Page
+
+
+# Job lifecycle
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    label TEXT,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    error TEXT,
+    error_detail TEXT,
+    transcription TEXT,
+    correction TEXT,
+    record_id INTEGER,
+    input_key TEXT,
+    leader_id TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_owner_created ON jobs (owner, created_at);
+"""
+
+JOB_COLUMNS = (
+    "label", "status", "stage", "progress", "message", "error", "error_detail",
+    "transcription", "correction", "record_id"
+)
+
+JOINED_MESSAGE = "Joined existing job"
+
+
+class JobStore:
+    """Job state and results in a local SQLite file (survives reruns and restarts)"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._ensure_coalescing_columns()
+
+    def _ensure_coalescing_columns(self):
+        """Add input_key / leader_id to job files created before coalescing existed"""
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        with self.conn:
+            for name in ("input_key", "leader_id"):
+                if name not in columns:
+                    self.conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} TEXT")
+
+    def create(
+        self,
+        job_id: str,
+        owner: str,
+        label: Optional[str] = None,
+        input_key: Optional[str] = None,
+        leader_id: Optional[str] = None
+    ) -> None:
+        now = utc_now()
+        message = f"{JOINED_MESSAGE} {leader_id}" if leader_id else None
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (id, owner, label, status, message, created_at, updated_at, input_key, leader_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, owner, label, QUEUED, message, now, now, input_key, leader_id)
+            )
+
+    def update(self, job_id: str, **fields) -> None:
+        """Set job columns (names from JOB_COLUMNS)"""
+        self.update_many([job_id], **fields)
+
+    def update_many(self, job_ids: List[str], **fields) -> None:
+        """Set the same job columns on several jobs in one transaction"""
+        unknown = set(fields) - set(JOB_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        now = utc_now()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                [(*fields.values(), now, job_id) for job_id in job_ids]
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_for_owner(self, owner: str, limit: int = 10) -> list:
+        """Most recent jobs of one client, newest first (results not included)"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, owner, label, status, stage, progress, message, created_at, updated_at, "
+                "error, error_detail, record_id, leader_id FROM jobs WHERE owner = ? ORDER BY created_at DESC LIMIT ?",
+                (owner, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def fail_interrupted(self) -> int:
+        """Mark jobs left active by a previous server process as failed"""
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                f"UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                f"WHERE status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})",
+                (FAILED, "Interrupted by a server restart", utc_now(), *ACTIVE_STATUSES)
+            )
+        return cursor.rowcount
+
+
+class JobRunner:
+    """
+    Worker pool shared by all sessions
+
+    Inputs are written to a per-job directory at submission, so the
+    submitting session can release its pages immediately; the directory is
+    removed when the job ends. Progress and results go to the JobStore, which
+    the UI polls.
+
+    Submissions are coalesced while in flight: identical inputs (same page
+    bytes, same pipeline version, same API key) join the running job
+    instead of starting a second pipeline. Joined jobs get their own row,
+    mirror the leader's progress and receive its result.
+
+    Each flight keeps the submitter's API key, and every model call of its
+    pipeline is made with that key (workers are shared by all sessions).
+
+    Each flight has a CancelToken passed down to the model calls. A job is
+    cancelled by its user or when its client has had no open tab for
+    abandon_seconds; the pipeline itself stops once no job is left on it.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        workdir: str,
+        max_workers: int,
+        pipeline: Callable,
+        version: str = "",
+        abandon_seconds: Optional[float] = None
+    ):
+        self.store = store
+        self.workdir = workdir
+        self.pipeline = pipeline
+        self.version = version
+        self.abandon_seconds = abandon_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        # input_key -> {"leader", "owners": {owner: job_id}, "jobs": [job_id, ...], "token", "future", "dir", "api_key"}
+        self._in_flight = {}
+        # owner -> {"sessions": {session_id, ...}, "alive": monotonic time an open tab was last seen}
+        self._clients = {}
+        self._stats = {"submitted": 0, "started": 0, "joined": 0, "repeated": 0, "cancelled": 0}
+        os.makedirs(workdir, exist_ok=True)
+        self.store.fail_interrupted()
+        if abandon_seconds:
+            threading.Thread(target=self._watch_clients, name="job-reaper", daemon=True).start()
+
+    def input_key(self, user_pages: List[Page], answer_page: Page, api_key: Optional[str] = None) -> str:
+        """Content hash of one submission's pages, the pipeline version and the API key scope"""
+        digest = hashlib.sha256(self.version.encode("utf-8"))
+        # Only submissions billed to the same key share a run
+        digest.update(api_key_scope(api_key).encode("ascii"))
+        for page in (*user_pages, answer_page):
+            # Length prefix: page boundaries are part of the key
+            digest.update(page.nbytes.to_bytes(8, "big"))
+            digest.update(page.content_hash().encode("ascii"))
+        return digest.hexdigest()
+
+    def submit(
+        self,
+        owner: str,
+        user_pages: List[Page],
+        answer_page: Page,
+        label: Optional[str] = None,
+        api_key: Optional[str] = None
+    ) -> str:
+        """
+        Queue one worksheet, or join an identical one already in flight
+
+        Args:
+            owner: Client id the job belongs to
+            user_pages: User handwriting pages
+            answer_page: Standard answer page
+            label: Display name of the job
+            api_key: Model API key of the submitter (kept in memory only; None: Config.GOOGLE_API_KEY)
+
+        Returns:
+            The job id (an owner resubmitting a running worksheet gets its existing job back)
+        """
+        key = self.input_key(user_pages, answer_page, api_key)
+        job_id = uuid.uuid4().hex[:12]
+
+        with self._lock:
+            self._stats["submitted"] += 1
+            flight = self._in_flight.get(key)
+            if flight is not None and not flight["token"].cancelled:
+                if owner in flight["owners"]:
+                    self._stats["repeated"] += 1
+                    return flight["owners"][owner]
+                self.store.create(job_id, owner, label, input_key=key, leader_id=flight["leader"])
+                flight["owners"][owner] = job_id
+                flight["jobs"].append(job_id)
+                self._stats["joined"] += 1
+                return job_id
+
+            # A cancelled flight still winding down is replaced; its worker only cleans up
+            job_dir = os.path.join(self.workdir, job_id)
+            self.store.create(job_id, owner, label, input_key=key)
+            flight = {
+                "leader": job_id,
+                "owners": {owner: job_id},
+                "jobs": [job_id],
+                "token": CancelToken(),
+                "future": None,
+                "dir": job_dir,
+                "api_key": api_key,
+            }
+            self._in_flight[key] = flight
+            self._stats["started"] += 1
+
+        try:
+            os.makedirs(job_dir)
+            # Page files are copied one at a time, without reading them into memory
+            user_paths = []
+            for idx, page in enumerate(user_pages):
+                path = os.path.join(job_dir, f"user-{idx:03d}.page")
+                page.copy_to(path)
+                user_paths.append(path)
+            answer_path = os.path.join(job_dir, "answer.page")
+            answer_page.copy_to(answer_path)
+        except Exception as e:
+            # The flight never runs: fail it and every job that joined it meanwhile
+            self.store.update_many(
+                self._close(key, flight),
+                status=FAILED,
+                error=f"{type(e).__name__}: {e}",
+                error_detail=traceback.format_exc()
+            )
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        future = self._executor.submit(self._run, key, flight, user_paths, answer_path)
+        with self._lock:
+            flight["future"] = future
+            cancelled_early = flight["token"].cancelled
+        if cancelled_early:
+            self._drop_unstarted(key, flight)
+        return job_id
+
+    def cancel(self, job_id: str, reason: str = "Cancelled") -> bool:
+        """
+        Cancel one job
+
+        The job's row is marked cancelled at once. Its pipeline is stopped at
+        the next checkpoint only if no other job shares it; a queued pipeline
+        never starts and frees its slot immediately.
+
+        Args:
+            job_id: Job to cancel
+            reason: Message shown on the job
+
+        Returns:
+            False if the job had already ended
+        """
+        with self._lock:
+            for key, flight in self._in_flight.items():
+                if job_id in flight["jobs"]:
+                    break
+            else:
+                return False
+            flight["jobs"].remove(job_id)
+            flight["owners"] = {owner: jid for owner, jid in flight["owners"].items() if jid != job_id}
+            abandoned = not flight["jobs"]
+            if abandoned:
+                flight["token"].cancel(reason)
+            self._stats["cancelled"] += 1
+
+        self.store.update(job_id, status=CANCELLED, message=reason)
+        if abandoned:
+            self._drop_unstarted(key, flight)
+        return True
+
+    def _drop_unstarted(self, key: str, flight: dict) -> None:
+        """Remove a cancelled flight whose worker never started"""
+        if flight["future"] is not None and flight["future"].cancel():
+            self._close(key, flight)
+            shutil.rmtree(flight["dir"], ignore_errors=True)
+
+    def heartbeat(self, owner: str, session_id: Optional[str]) -> None:
+        """Record that a client has an open tab (called on every page run)"""
+        with self._lock:
+            client = self._clients.setdefault(owner, {"sessions": set(), "alive": 0.0})
+            if session_id:
+                client["sessions"].add(session_id)
+            client["alive"] = time.monotonic()
+
+    def _abandoned_jobs(self) -> List[str]:
+        """Active jobs whose client has had no connected session for abandon_seconds"""
+        now = time.monotonic()
+        abandoned = []
+        with self._lock:
+            owners = {owner: job_id for flight in self._in_flight.values() for owner, job_id in flight["owners"].items()}
+            for owner, job_id in owners.items():
+                client = self._clients.get(owner)
+                if client is None:
+                    # No heartbeat yet: start the clock now
+                    client = self._clients[owner] = {"sessions": set(), "alive": now}
+                client["sessions"] = {sid for sid in client["sessions"] if _session_active(sid)}
+                if client["sessions"]:
+                    client["alive"] = now
+                elif now - client["alive"] > self.abandon_seconds:
+                    abandoned.append(job_id)
+            # Forget clients without jobs or tabs
+            for owner in [owner for owner, client in self._clients.items() if owner not in owners and not client["sessions"]]:
+                if now - self._clients[owner]["alive"] > self.abandon_seconds:
+                    del self._clients[owner]
+        return abandoned
+
+    def _watch_clients(self) -> None:
+        interval = max(1.0, self.abandon_seconds / 4)
+        while True:
+            time.sleep(interval)
+            try:
+                for job_id in self._abandoned_jobs():
+                    self.cancel(job_id, "Cancelled: the tab was closed")
+            except Exception:
+                pass  # Silent fail for elegance: retried on the next tick
+
+    def coalescing_stats(self) -> dict:
+        """
+        Submission counters since the runner started
+
+        Returns:
+            Dict with submitted, started (pipelines run), joined (other
+            clients sharing a run), repeated (same client resubmitting),
+            cancelled, saved (pipelines not run) and in_flight
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._in_flight)
+        stats["saved"] = stats["joined"] + stats["repeated"]
+        return stats
+
+    def _close(self, key: str, flight: dict) -> List[str]:
+        """End a flight (later submissions start a new run); returns the jobs still attached"""
+        with self._lock:
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+            return list(flight["jobs"])
+
+    def _run(self, key: str, flight: dict, user_paths: List[str], answer_path: str) -> None:
+        token = flight["token"]
+        leader_id = flight["leader"]
+
+        def progress(stage: str, fraction: float, message: str = ""):
+            token.raise_if_cancelled()
+            with self._lock:
+                job_ids = list(flight["jobs"])
+            if leader_id in job_ids:
+                self.store.update(leader_id, status=RUNNING, stage=stage, progress=fraction, message=message)
+            followers = [job_id for job_id in job_ids if job_id != leader_id]
+            if followers:
+                self.store.update_many(
+                    followers, status=RUNNING, stage=stage, progress=fraction,
+                    message=f"{JOINED_MESSAGE} {leader_id}: {message}"
+                )
+
+        try:
+            progress("loading", 0.05, "Loading pages")
+            user_images = [_load_image(path) for path in user_paths]
+            answer_image = _load_image(answer_path)
+
+            with using_api_key(flight["api_key"]):
+                result = self.pipeline(user_images, answer_image, progress, token)
+            self.store.update_many(
+                self._close(key, flight),
+                status=DONE,
+                stage=DONE,
+                progress=1.0,
+                message="Correction complete",
+                transcription=result["transcription"].to_json(),
+                correction=result["correction"].to_json(),
+                record_id=result.get("record_id")
+            )
+        except Cancelled:
+            # Every job was already marked cancelled
+            self._close(key, flight)
+        except Exception as e:
+            self.store.update_many(
+                self._close(key, flight),
+                status=FAILED,
+                error=f"{type(e).__name__}: {e}",
+                error_detail=traceback.format_exc()
+            )
+        finally:
+            shutil.rmtree(flight["dir"], ignore_errors=True)
+
+
+def _load_image(path: str) -> Image.Image:
+    # Uncompressed pages are memory-mapped rather than read
+    return Page(path=path).open()
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_runner(db_path: str, workdir: str, max_workers: int, abandon_seconds: Optional[float] = None) -> JobRunner:
+    """
+    Shared job runner per store, reused across reruns and sessions
+
+    Args:
+        db_path: Job store SQLite file
+        workdir: Directory for queued job inputs
+        max_workers: Concurrent pipelines
+        abandon_seconds: Cancel jobs whose client has no open tab for this long (None: never)
+    """
+    from services.pipeline import pipeline_version, run_pipeline
+
+    return JobRunner(
+        JobStore(db_path), workdir, max_workers, run_pipeline,
+        version=pipeline_version(), abandon_seconds=abandon_seconds
+    )
+
+
+def _session_active(session_id: str) -> bool:
+    """Whether a Streamlit session is still connected (True outside a server runtime)"""
+    from streamlit.runtime import Runtime
+
+    if not Runtime.exists():
+        return True
+    return Runtime.instance().is_active_session(session_id)
+
+
+def get_session_id() -> Optional[str]:
+    """Id of the Streamlit session running this script (None outside a script run)"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
+
+
+def get_client_id() -> str:
+    """
+    Stable id of this browser tab, kept in the URL (?client=...)
+
+    Survives refreshes and reconnects, so a client finds its jobs again.
+    """
+    client = st.query_params.get("client")
+    if not client:
+        client = uuid.uuid4().hex
+        st.query_params["client"] = client
+    return client
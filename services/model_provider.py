@@ -0,0 +1,512 @@
+"""
+Model Provider
+模型呼叫抽象層（Gemini 與離線測試用 stub）
+"""
+import hashlib
+import io
+import json
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from typing import Any, Callable, List, Optional, Tuple
+
+from PIL import Image
+
+from utils.cancellation import CancelToken, checkpoint, stream_text
+
+
+# Tokens Gemini bills per image tile: images up to 384px per side are one tile,
+# larger ones are cut into 768px tiles
+IMAGE_TOKENS = 258
+IMAGE_SMALL_SIDE = 384
+IMAGE_TILE_SIDE = 768
+
+# Files uploaded to the Gemini file API are deleted after 48 hours
+FILE_TTL_SECONDS = 48 * 3600
+
+# API key of the model calls made in this context (set per job, per session action)
+_call_api_key: ContextVar[Optional[str]] = ContextVar("call_api_key", default=None)
+
+
+@contextmanager
+def using_api_key(api_key: Optional[str]):
+    """
+    Make the model calls in this block use one API key
+
+    Jobs run on shared worker threads, so the key travels with the job
+    rather than being a process-wide setting. Threads started inside the
+    block must run in a copy of the context (contextvars.copy_context).
+
+    Args:
+        api_key: Key of the submitting user (None: Config.GOOGLE_API_KEY)
+    """
+    token = _call_api_key.set(api_key or None)
+    try:
+        yield
+    finally:
+        _call_api_key.reset(token)
+
+
+def current_api_key() -> Optional[str]:
+    """API key of the model calls in this context, falling back to Config.GOOGLE_API_KEY"""
+    from config.settings import Config
+
+    return _call_api_key.get() or Config.GOOGLE_API_KEY or None
+
+
+def api_key_scope(api_key: Optional[str] = None) -> str:
+    """
+    Short hash of an API key (default: the key of this context)
+
+    Model-side files and caches belong to the key that created them, and
+    work is billed to it, so anything shared between calls is kept per scope.
+
+    Returns:
+        First 16 hex digits of the key's SHA-256, "" without a key
+    """
+    key = api_key or current_api_key()
+    if not key:
+        return ""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+
+class CacheMissing(Exception):
+    """The cached content referenced by a call no longer exists (expired or deleted)"""
+
+
+class FileMissing(Exception):
+    """Uploaded files referenced by a call no longer exist (expired or deleted)"""
+
+    def __init__(self, names: List[str]):
+        super().__init__(", ".join(names))
+        self.names = names
+
+
+class FileHandle:
+    """Page image uploaded once through the provider's file API, referenced by later calls"""
+
+    __slots__ = ("name", "uri", "mime_type", "content_hash", "expires_at", "size_bytes")
+
+    def __init__(self, name: str, uri: str, mime_type: str, content_hash: str, expires_at: float, size_bytes: int = 0):
+        self.name = name
+        self.uri = uri
+        self.mime_type = mime_type
+        # SHA-256 of the page's encoded bytes (utils.page_cache.CONTENT_HASH)
+        self.content_hash = content_hash
+        # time.time() at which the provider deletes the file
+        self.expires_at = expires_at
+        self.size_bytes = size_bytes
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FileHandle":
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+
+class CacheHandle:
+    """Cached prompt prefix registered with a provider"""
+
+    __slots__ = ("name", "model", "expires_at", "tokens", "ref")
+
+    def __init__(self, name: str, model: str, expires_at: float, tokens: int = 0, ref: Any = None):
+        self.name = name
+        self.model = model
+        # time.time() at which the provider drops the cache
+        self.expires_at = expires_at
+        self.tokens = tokens
+        # Provider object (Gemini CachedContent) or stored contents (stub)
+        self.ref = ref
+
+
+class ModelProvider(ABC):
+    """
+    Generative model interface used by the agents
+
+    Contents are lists of parts: strings, PIL images and FileHandles. Usage dicts have
+    input_tokens (including cached ones), cached_tokens and output_tokens
+    (including thinking tokens). Providers raise on failure.
+    """
+
+    name = "provider"
+    # Whether uploaded files outlive this process (worth indexing on disk)
+    persistent_files = True
+
+    @abstractmethod
+    def generate(
+        self,
+        model_name: str,
+        contents: list,
+        cache: Optional[CacheHandle] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> Tuple[str, dict]:
+        """
+        Run one request, after the cached prefix if given
+
+        Raises:
+            CacheMissing: If the cache has expired on the provider
+            FileMissing: If a referenced file has expired on the provider
+            Cancelled: If the token is cancelled
+        """
+
+    @abstractmethod
+    def create_cache(self, model_name: str, contents: list, ttl_seconds: float) -> CacheHandle:
+        """
+        Register a prompt prefix for later calls to one model
+
+        Raises:
+            FileMissing: If a referenced file has expired on the provider
+        """
+
+    @abstractmethod
+    def refresh_cache(self, cache: CacheHandle, ttl_seconds: float) -> CacheHandle:
+        """
+        Extend a cache's lifetime
+
+        Raises:
+            CacheMissing: If the cache has already expired
+        """
+
+    @abstractmethod
+    def upload_file(self, data: bytes, mime_type: str, content_hash: str) -> FileHandle:
+        """Store encoded image bytes with the provider for later calls"""
+
+    def connect(self, model_name: str) -> None:
+        """Open the connection for the current API key ahead of the first call (warm-up)"""
+
+
+def _file_names(contents: list) -> List[str]:
+    return [part.name for part in contents if isinstance(part, FileHandle)]
+
+
+def _usage(metadata) -> dict:
+    """Usage dict from a Gemini usage_metadata (thinking tokens are billed as output)"""
+    return {
+        "input_tokens": getattr(metadata, "prompt_token_count", 0) or 0,
+        "cached_tokens": getattr(metadata, "cached_content_token_count", 0) or 0,
+        "output_tokens": (getattr(metadata, "candidates_token_count", 0) or 0)
+        + (getattr(metadata, "thoughts_token_count", 0) or 0),
+    }
+
+
+class GeminiProvider(ModelProvider):
+    """
+    google.generativeai, with one set of SDK clients per API key
+
+    genai.configure sets a single process-wide key, which every job would
+    share; instead each call uses the clients of current_api_key().
+    """
+
+    name = "gemini"
+
+    def __init__(self):
+        self._managers = {}
+        self._lock = threading.Lock()
+
+    def _client(self, service: str):
+        """SDK client of one service ("generative", "cache", "file") for the current API key"""
+        from google.generativeai.client import _ClientManager
+
+        key = current_api_key()
+        with self._lock:
+            manager = self._managers.get(key)
+            if manager is None:
+                manager = self._managers[key] = _ClientManager()
+                manager.configure(api_key=key)
+            return manager.get_default_client(service)
+
+    def _model(self, model_name: str, cache: Optional[CacheHandle] = None):
+        import google.generativeai as genai  # Deferred: pre-imported by services.warmup
+
+        if cache is not None:
+            model = genai.GenerativeModel.from_cached_content(cached_content=cache.ref)
+        else:
+            model = genai.GenerativeModel(model_name)
+        model._client = self._client("generative")
+        return model
+
+    @staticmethod
+    def _parts(contents: list) -> list:
+        """Replace FileHandles with file_data parts"""
+        from google.generativeai import protos
+
+        return [
+            protos.Part(file_data=protos.FileData(mime_type=part.mime_type, file_uri=part.uri))
+            if isinstance(part, FileHandle) else part
+            for part in contents
+        ]
+
+    def connect(self, model_name):
+        # A free token count opens the generative client's channel
+        self._model(model_name).count_tokens("ping")
+
+    def generate(self, model_name, contents, cache=None, cancel=None):
+        from google.api_core import exceptions
+
+        model = self._model(model_name, cache)
+        checkpoint(cancel)
+        try:
+            response = model.generate_content(self._parts(contents), stream=True)
+        except (exceptions.NotFound, exceptions.PermissionDenied) as e:
+            # Both are reported as "not found or no permission"; the message names the resource
+            if cache is not None and "cachedcontent" in str(e).lower().replace(" ", ""):
+                raise CacheMissing(cache.name) from e
+            if _file_names(contents):
+                raise FileMissing(_file_names(contents)) from e
+            if cache is not None:
+                raise CacheMissing(cache.name) from e
+            raise
+        text = stream_text(response, cancel)
+        return text, _usage(getattr(response, "usage_metadata", None))
+
+    def create_cache(self, model_name, contents, ttl_seconds):
+        from google.api_core import exceptions
+        from google.generativeai import caching
+
+        # CachedContent.create always uses the process-wide client
+        request = caching.CachedContent._prepare_create_request(
+            model=model_name,
+            display_name="correction-prompt-prefix",
+            contents=self._parts(contents),
+            ttl=timedelta(seconds=ttl_seconds)
+        )
+        try:
+            cached = caching.CachedContent._from_obj(self._client("cache").create_cached_content(request))
+        except (exceptions.NotFound, exceptions.PermissionDenied) as e:
+            if _file_names(contents):
+                raise FileMissing(_file_names(contents)) from e
+            raise
+        return CacheHandle(
+            name=cached.name,
+            model=model_name,
+            expires_at=time.time() + ttl_seconds,
+            tokens=getattr(cached.usage_metadata, "total_token_count", 0) or 0,
+            ref=cached
+        )
+
+    def refresh_cache(self, cache, ttl_seconds):
+        from google.api_core import exceptions
+        from google.generativeai import protos
+        from google.protobuf import field_mask_pb2
+
+        request = protos.UpdateCachedContentRequest(
+            cached_content=protos.CachedContent(name=cache.name, ttl=timedelta(seconds=ttl_seconds)),
+            update_mask=field_mask_pb2.FieldMask(paths=["ttl"])
+        )
+        try:
+            self._client("cache").update_cached_content(request)
+        except (exceptions.NotFound, exceptions.PermissionDenied) as e:
+            raise CacheMissing(cache.name) from e
+        cache.expires_at = time.time() + ttl_seconds
+        return cache
+
+    def upload_file(self, data, mime_type, content_hash):
+        from google.generativeai.types import file_types
+
+        # genai.upload_file always uses the process-wide client
+        uploaded = file_types.File(self._client("file").create_file(
+            io.BytesIO(data), mime_type=mime_type, display_name=content_hash[:16]
+        ))
+        expiration = getattr(uploaded, "expiration_time", None)
+        return FileHandle(
+            name=uploaded.name,
+            uri=uploaded.uri,
+            mime_type=uploaded.mime_type or mime_type,
+            content_hash=content_hash,
+            expires_at=expiration.timestamp() if expiration else time.time() + FILE_TTL_SECONDS,
+            size_bytes=len(data)
+        )
+
+
+def count_tokens(contents: list) -> int:
+    """Rough token count of text and image parts (stub accounting)"""
+    total = 0
+    for part in contents:
+        if isinstance(part, Image.Image):
+            width, height = part.size
+            if width <= IMAGE_SMALL_SIDE and height <= IMAGE_SMALL_SIDE:
+                total += IMAGE_TOKENS
+            else:
+                total += IMAGE_TOKENS * math.ceil(width / IMAGE_TILE_SIDE) * math.ceil(height / IMAGE_TILE_SIDE)
+        else:
+            total += max(1, len(str(part)) // 4)
+    return total
+
+
+def stub_responder(model_name: str, contents: list) -> str:
+    """
+    Offline answers shaped like the agents' output
+
+    Requests with images get one transcribed item per image after the
+    first (the answer key); text requests carrying a JSON item list get each
+    item back unchanged as its own correction.
+    """
+    images = [part for part in contents if isinstance(part, Image.Image)]
+    if images:
+        return json.dumps([
+            {"id": f"1.{idx}", "user": f"Stub transcription {idx}", "standard": f"Stub standard {idx}"}
+            for idx in range(1, max(2, len(images)))
+        ])
+
+    for part in reversed(contents):
+        text = str(part)
+        start = text.find("[")
+        if start < 0:
+            continue
+        try:
+            items = json.loads(text[start:text.rfind("]") + 1])
+        except json.JSONDecodeError:
+            continue
+        if isinstance(items, list):
+            return json.dumps([
+                {"id": item.get("id"), "user": item.get("user"), "correction": item.get("user"), "feedback": []}
+                for item in items if isinstance(item, dict)
+            ], ensure_ascii=False)
+    return "[]"
+
+
+class StubProvider(ModelProvider):
+    """
+    Local provider for offline runs and benchmarks
+
+    Counts tokens approximately, keeps caches and uploaded files in memory
+    with real expiry and simulates latency proportional to the uncached
+    input. Every call is recorded in `calls`.
+    """
+
+    name = "stub"
+    persistent_files = False
+
+    def __init__(
+        self,
+        responder: Callable[[str, list], str] = stub_responder,
+        seconds_per_1k_input: float = 0.0,
+        seconds_per_call: float = 0.0,
+        file_ttl_seconds: float = FILE_TTL_SECONDS
+    ):
+        self.responder = responder
+        self.file_ttl_seconds = file_ttl_seconds
+        self.seconds_per_1k_input = seconds_per_1k_input
+        self.seconds_per_call = seconds_per_call
+        self.caches = {}
+        self.files = {}
+        self.calls: List[dict] = []
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _open_files(self, contents: list) -> list:
+        """Replace FileHandles with their images, as the provider would"""
+        now = time.time()
+        with self._lock:
+            missing = [
+                part.name for part in contents
+                if isinstance(part, FileHandle) and (part.name not in self.files or self.files[part.name][1] <= now)
+            ]
+            if missing:
+                raise FileMissing(missing)
+            return [
+                Image.open(io.BytesIO(self.files[part.name][0])) if isinstance(part, FileHandle) else part
+                for part in contents
+            ]
+
+    def generate(self, model_name, contents, cache=None, cancel=None):
+        checkpoint(cancel)
+        contents = self._open_files(contents)
+        cached_tokens = 0
+        prefix = []
+        if cache is not None:
+            with self._lock:
+                stored = self.caches.get(cache.name)
+            if stored is None or stored.expires_at <= time.time():
+                raise CacheMissing(cache.name)
+            cached_tokens = stored.tokens
+            prefix = stored.ref
+
+        fresh_tokens = count_tokens(contents)
+        time.sleep(self.seconds_per_call + self.seconds_per_1k_input * fresh_tokens / 1000)
+        checkpoint(cancel)
+
+        text = self.responder(model_name, [*prefix, *contents])
+        usage = {
+            "input_tokens": cached_tokens + fresh_tokens,
+            "cached_tokens": cached_tokens,
+            "output_tokens": count_tokens([text]),
+        }
+        with self._lock:
+            self.calls.append({"model": model_name, "cache": cache.name if cache else None, "usage": usage})
+        return text, usage
+
+    def create_cache(self, model_name, contents, ttl_seconds):
+        contents = self._open_files(contents)
+        with self._lock:
+            self._next_id += 1
+            handle = CacheHandle(
+                name=f"cachedContents/stub-{self._next_id}",
+                model=model_name,
+                expires_at=time.time() + ttl_seconds,
+                tokens=count_tokens(contents),
+                ref=list(contents)
+            )
+            self.caches[handle.name] = handle
+        return handle
+
+    def refresh_cache(self, cache, ttl_seconds):
+        with self._lock:
+            stored = self.caches.get(cache.name)
+            if stored is None or stored.expires_at <= time.time():
+                raise CacheMissing(cache.name)
+            stored.expires_at = cache.expires_at = time.time() + ttl_seconds
+        return cache
+
+    def upload_file(self, data, mime_type, content_hash):
+        with self._lock:
+            self._next_id += 1
+            name = f"files/stub-{self._next_id}"
+            expires_at = time.time() + self.file_ttl_seconds
+            self.files[name] = (data, expires_at)
+        return FileHandle(name, f"stub://{name}", mime_type, content_hash, expires_at, len(data))
+
+
+def create_provider(kind: str) -> ModelProvider:
+    """
+    Build the provider selected by Config.MODEL_PROVIDER
+
+    Args:
+        kind: "gemini" or "stub"
+
+    Raises:
+        ValueError: If the provider kind is unknown
+    """
+    if kind == "gemini":
+        return GeminiProvider()
+    if kind == "stub":
+        return StubProvider()
+    raise ValueError(f"Unknown model provider: {kind}")
+
+
+_provider: Optional[ModelProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> ModelProvider:
+    """Process-wide provider (agents run in job threads, outside any session)"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            from config.settings import Config
+
+            _provider = create_provider(Config.MODEL_PROVIDER)
+        return _provider
+
+
+def set_provider(provider: Optional[ModelProvider]) -> None:
+    """Replace the process-wide provider (benchmarks and offline runs); None rebuilds it from Config"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,222 @@
+"""
+Model Router
+批改分級：簡單題目交給快速模型，困難或驗證失敗的題目升級到 Pro 模型
+"""
+import contextvars
+import difflib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from agents import correction
+from config.settings import Config
+from services.result_model import CorrectionItem, Corrections, Transcription, TranscriptionItem, record_regeneration
+from utils.cancellation import Cancelled, CancelToken
+
+
+FAST = "fast"
+PRO = "pro"
+
+# Handwriting Agent 1 could not read: explicit markers, replacement or non-latin characters
+_UNCLEAR = re.compile(r"\[\?\]|\(\?\)|\?\?|_{3,}|\ufffd|[^\x00-\x7f\u2013\u2014\u2018\u2019\u201c\u201d]")
+
+
+def edit_ratio(user: str, standard: str) -> float:
+    """Share of the text that differs from the standard answer (0 identical, 1 unrelated)"""
+    return 1.0 - difflib.SequenceMatcher(None, user.lower().split(), standard.lower().split()).ratio()
+
+
+def classify_item(item: TranscriptionItem) -> Tuple[str, str]:
+    """
+    Pick the model tier for one transcribed item
+
+    Agent 1 does not report a confidence score, so an unclear transcription
+    is recognized by its markers instead.
+
+    Args:
+        item: Transcribed item from Agent 1
+
+    Returns:
+        (FAST or PRO, reason)
+    """
+    user, standard = item.user, item.standard
+
+    if not user.strip():
+        return PRO, "empty"
+    if _UNCLEAR.search(user):
+        return PRO, "unclear"
+    if len(user.split()) > Config.TIER_MAX_WORDS:
+        return PRO, "long"
+    if edit_ratio(user, standard) > Config.TIER_MAX_EDIT_RATIO:
+        return PRO, "divergent"
+    return FAST, "simple"
+
+
+class TierStats:
+    """Calls, latency, token cost and escalations per tier since the process started"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers = {
+            tier: {"items": 0, "calls": 0, "failures": 0, "seconds": 0.0, "cost": 0.0, "escalated": 0}
+            for tier in (FAST, PRO)
+        }
+
+    def record_call(self, tier: str, model_name: str, items: int, seconds: float, usage: Optional[dict]) -> None:
+        input_price, output_price = Config.MODEL_PRICES.get(model_name, (0.0, 0.0))
+        with self._lock:
+            stats = self._tiers[tier]
+            stats["items"] += items
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            if usage is None:
+                stats["failures"] += 1
+            else:
+                cached = usage.get("cached_tokens", 0)
+                billed_input = usage["input_tokens"] - cached + cached * Config.CACHED_INPUT_PRICE_RATIO
+                stats["cost"] += (billed_input * input_price + usage["output_tokens"] * output_price) / 1e6
+
+    def record_escalation(self, items: int) -> None:
+        with self._lock:
+            self._tiers[FAST]["escalated"] += items
+
+    def snapshot(self) -> dict:
+        """
+        Per-tier report
+
+        Returns:
+            {tier: {items, calls, failures, avg_seconds, cost, escalated, escalation_rate}};
+            escalation_rate is the share of fast-tier items redone on the pro model
+        """
+        with self._lock:
+            report = {}
+            for tier, stats in self._tiers.items():
+                entry = dict(stats)
+                entry["avg_seconds"] = stats["seconds"] / stats["calls"] if stats["calls"] else 0.0
+                entry["escalation_rate"] = stats["escalated"] / stats["items"] if stats["items"] else 0.0
+                del entry["seconds"]
+                report[tier] = entry
+            return report
+
+
+_stats = TierStats()
+
+
+def get_tier_stats() -> dict:
+    """Per-tier report of this process (TierStats.snapshot)"""
+    return _stats.snapshot()
+
+
+def _call(tier: str, items: List[TranscriptionItem], cancel: Optional[CancelToken]) -> Dict[str, CorrectionItem]:
+    """
+    Correct items on one tier's model
+
+    Returns:
+        Corrections of the sent ids by id: fast-tier items must pass schema
+        validation, while the pro tier, being the last resort, keeps every
+        item it answered
+
+    Raises:
+        Cancelled: If the token is cancelled
+        Exception: Pro model errors, or a pro answer that is not a JSON list
+    """
+    model_name = Config.GEMINI_FAST_MODEL if tier == FAST else Config.GEMINI_MODEL
+    started = time.perf_counter()
+    try:
+        result, usage = correction.generate_with_usage(items, model_name, cancel, strict=tier == FAST)
+    except Cancelled:
+        raise
+    except Exception:
+        _stats.record_call(tier, model_name, len(items), time.perf_counter() - started, None)
+        if tier == PRO:
+            raise
+        return {}  # The fast tier's failures are escalated
+    _stats.record_call(tier, model_name, len(items), time.perf_counter() - started, usage)
+
+    expected = {item.id for item in items}
+    return {item.id: item for item in result if item.id in expected}
+
+
+def route_items(items: List[TranscriptionItem]) -> Tuple[List[TranscriptionItem], List[TranscriptionItem]]:
+    """Split transcribed items into (fast, pro) lists"""
+    fast, pro = [], []
+    for item in items:
+        (fast if classify_item(item)[0] == FAST else pro).append(item)
+    return fast, pro
+
+
+def _regenerate(items: List[TranscriptionItem], cancel: Optional[CancelToken]) -> Dict[str, CorrectionItem]:
+    """
+    Ask the pro model once more for items missing from an answer
+
+    An answer that was truncated or salvaged item by item lacks some ids;
+    only those are sent again. A failed retry leaves them missing.
+    """
+    try:
+        recovered = _call(PRO, items, cancel)
+    except Cancelled:
+        raise
+    except Exception:
+        recovered = {}
+    record_regeneration(len(items), len(recovered))
+    return recovered
+
+
+def correct(transcription: Transcription, cancel: Optional[CancelToken] = None) -> Corrections:
+    """
+    Run Agent 2 with model tiering
+
+    Simple items go to the fast model and the rest to the pro model, in
+    parallel. Fast-tier items whose output fails validation are redone on the
+    pro model. Without tiering Agent 2 runs once on the pro model as before.
+    Items still missing from the answers (e.g. a truncated JSON tail) are
+    requested once more on their own.
+
+    Args:
+        transcription: Agent 1 output
+        cancel: Passed to every model call
+
+    Returns:
+        Corrections in transcription order
+
+    Raises:
+        Cancelled: If the token is cancelled
+        Exception: Any error from the pro model
+    """
+    if not Config.MODEL_TIERING:
+        answer = correction.generate(transcription, cancel)
+        missing = [item for item in transcription if answer.get(item.id) is None]
+        if not missing:
+            return answer
+        results = {item.id: item for item in answer}
+        results.update(_regenerate(missing, cancel))
+        known = set(transcription.ids())
+        # Ids the model renamed stay at the end, as it answered them
+        return Corrections([
+            *(results[item.id] for item in transcription if item.id in results),
+            *(item for item in answer if item.id not in known)
+        ])
+
+    fast_items, pro_items = route_items(transcription.items)
+    results = {}
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="tier") as pool:
+        # Each tier runs in a copy of this context, so its calls use the job's API key
+        fast_future = pool.submit(contextvars.copy_context().run, _call, FAST, fast_items, cancel) if fast_items else None
+        pro_future = pool.submit(contextvars.copy_context().run, _call, PRO, pro_items, cancel) if pro_items else None
+        if fast_future is not None:
+            results.update(fast_future.result())
+        if pro_future is not None:
+            results.update(pro_future.result())
+
+    escalated = [item for item in fast_items if item.id not in results]
+    if escalated:
+        _stats.record_escalation(len(escalated))
+        results.update(_call(PRO, escalated, cancel))
+
+    missing = [item for item in transcription if item.id not in results]
+    if missing:
+        results.update(_regenerate(missing, cancel))
+
+    return Corrections(results[item.id] for item in transcription if item.id in results)
@@ -0,0 +1,239 @@
+"""
+Payload Codec
+批改記錄的精簡儲存格式（去重 + 選擇性壓縮）
+"""
+import base64
+import hashlib
+import json
+import zlib
+from typing import Optional
+
+
+# Compact transcription format version
+COMPACT_VERSION = 1
+
+# Marker of a compressed corrections payload
+COMPRESSION_CODEC = "zlib+b64"
+
+
+def _canonical_json(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def build_answer_key(transcription_data: Optional[list]) -> tuple:
+    """
+    Extract the standard answers of a transcription as a content-addressed answer key
+
+    Args:
+        transcription_data: Agent 1 output list ({id, user, standard})
+
+    Returns:
+        Tuple of (answer key hash, standards list of {id, standard}), (None, None) if empty
+    """
+    if not transcription_data:
+        return None, None
+
+    standards = [
+        {"id": item.get("id"), "standard": item.get("standard", "")}
+        for item in transcription_data if isinstance(item, dict)
+    ]
+    if not standards:
+        return None, None
+
+    digest = hashlib.sha256(_canonical_json(standards).encode("utf-8")).hexdigest()
+    return digest[:32], standards
+
+
+def encode_corrections(correction_data: Optional[list], compress: bool = False, min_bytes: int = 4096):
+    """
+    Encode Agent 2 output for storage, compressing it when large enough to pay off
+
+    Args:
+        correction_data: Agent 2 output list ({id, user, correction, feedback})
+        compress: Whether compression is allowed
+        min_bytes: Minimum serialized size before compressing
+
+    Returns:
+        The original list, or {"codec", "data"} holding the compressed JSON
+    """
+    if not compress or not correction_data:
+        return correction_data
+
+    raw = json.dumps(correction_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(raw) < min_bytes:
+        return correction_data
+
+    packed = base64.b64encode(zlib.compress(raw, 9)).decode("ascii")
+    if len(packed) >= len(raw):
+        return correction_data
+    return {"codec": COMPRESSION_CODEC, "data": packed}
+
+
+def decode_corrections(stored) -> Optional[list]:
+    """Inverse of encode_corrections; plain lists pass through unchanged"""
+    if isinstance(stored, dict) and stored.get("codec") == COMPRESSION_CODEC:
+        return json.loads(zlib.decompress(base64.b64decode(stored["data"])).decode("utf-8"))
+    return stored
+
+
+def corrections_search_text(stored) -> str:
+    """
+    User, correction and feedback text of a stored corrections value
+
+    Compressed payloads are opaque to database-side indexes, so their text
+    is supplied alongside them (Supabase `corrections_text`).
+    """
+    parts = []
+    for item in decode_corrections(stored) or []:
+        if not isinstance(item, dict):
+            continue
+        feedback = item.get("feedback") or []
+        parts.extend(str(item.get(key) or "") for key in ("user", "correction"))
+        parts.extend(str(point) for point in (feedback if isinstance(feedback, list) else [feedback]))
+    return " ".join(part for part in parts if part)
+
+
+def encode_transcriptions(
+    transcription_data: Optional[list],
+    correction_data: Optional[list],
+    answer_key: Optional[str] = None
+):
+    """
+    Encode Agent 1 output without repeating data stored elsewhere
+
+    `user` is dropped when it equals the correction item's `user`, and the
+    standard answers are dropped when an answer key reference is available.
+
+    Args:
+        transcription_data: Agent 1 output list ({id, user, standard})
+        correction_data: Agent 2 output list (source of `user`)
+        answer_key: Hash of the stored answer key, None to keep standards inline
+
+    Returns:
+        Compact dict {"v", "answer_key", "items"}, or the input if it is empty
+    """
+    if not transcription_data:
+        return transcription_data
+
+    user_by_id = {
+        item.get("id"): item.get("user")
+        for item in correction_data or [] if isinstance(item, dict)
+    }
+
+    items = []
+    for item in transcription_data:
+        if not isinstance(item, dict):
+            continue
+        compact = {key: value for key, value in item.items() if key not in ("user", "standard")}
+        if item.get("user") != user_by_id.get(item.get("id")):
+            compact["user"] = item.get("user", "")
+        if answer_key is None:
+            compact["standard"] = item.get("standard", "")
+        items.append(compact)
+
+    return {"v": COMPACT_VERSION, "answer_key": answer_key, "items": items}
+
+
+def is_compact_transcriptions(stored) -> bool:
+    """Check if a stored transcriptions value uses the compact format"""
+    return isinstance(stored, dict) and "items" in stored and "v" in stored
+
+
+def decode_transcriptions(stored, correction_data: Optional[list], standards: Optional[list]) -> Optional[list]:
+    """
+    Inverse of encode_transcriptions; legacy lists pass through unchanged
+
+    Args:
+        stored: Stored transcriptions value
+        correction_data: Decoded Agent 2 output (source of `user`)
+        standards: Answer key standards list referenced by the record, if any
+
+    Returns:
+        Agent 1 output list ({id, user, standard})
+    """
+    if not is_compact_transcriptions(stored):
+        return stored
+
+    user_by_id = {
+        item.get("id"): item.get("user", "")
+        for item in correction_data or [] if isinstance(item, dict)
+    }
+
+    # Standards by question id, in order (ids repeated on a page are matched in turn)
+    standards_by_id = {}
+    for entry in standards or []:
+        if isinstance(entry, dict):
+            standards_by_id.setdefault(entry.get("id"), []).append(entry.get("standard", ""))
+
+    result = []
+    for compact in stored["items"]:
+        question_id = compact.get("id")
+        if "standard" in compact:
+            standard = compact["standard"]
+        elif standards_by_id.get(question_id):
+            standard = standards_by_id[question_id].pop(0)
+        else:
+            standard = ""
+        item = {
+            "id": question_id,
+            "user": compact["user"] if "user" in compact else user_by_id.get(question_id, ""),
+            "standard": standard
+        }
+        item.update((key, value) for key, value in compact.items() if key not in item)
+        result.append(item)
+    return result
+
+
+def encode_history_payload(
+    correction_data: Optional[list],
+    transcription_data: Optional[list],
+    answer_key: Optional[str],
+    compress: bool = False,
+    min_bytes: int = 4096
+) -> dict:
+    """
+    Build the stored `corrections` / `transcriptions` columns of a record
+
+    Args:
+        correction_data: Agent 2 output list
+        transcription_data: Agent 1 output list
+        answer_key: Hash of the already stored answer key (None keeps standards inline)
+        compress: Whether large corrections may be compressed
+        min_bytes: Minimum size before compressing
+
+    Returns:
+        Dict with "corrections" and "transcriptions" keys
+    """
+    return {
+        "corrections": encode_corrections(correction_data, compress, min_bytes),
+        "transcriptions": encode_transcriptions(transcription_data, correction_data, answer_key)
+    }
+
+
+def referenced_answer_key(record: dict) -> Optional[str]:
+    """Return the answer key hash referenced by a stored record, if any"""
+    stored = record.get("transcriptions")
+    if is_compact_transcriptions(stored):
+        return stored.get("answer_key")
+    return None
+
+
+def decode_record(record: dict, answer_keys: dict) -> dict:
+    """
+    Restore the original corrections / transcriptions structure of a stored record
+
+    Args:
+        record: Record as returned by a storage backend
+        answer_keys: Mapping of answer key hash to standards list
+
+    Returns:
+        The same record dict with decoded payload columns
+    """
+    corrections = decode_corrections(record.get("corrections"))
+    record["corrections"] = corrections
+    record["transcriptions"] = decode_transcriptions(
+        record.get("transcriptions"),
+        corrections,
+        answer_keys.get(referenced_answer_key(record))
+    )
+    return record
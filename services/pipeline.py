@@ -0,0 +1,130 @@
+"""
+Correction Pipeline
+三階段批改流程（辨識 → 批改 → 儲存），不依賴 Streamlit 頁面
+"""
+from typing import Callable, List, Optional, Tuple
+
+from PIL import Image
+
+from agents import correction, transcription
+from config.settings import Config
+from services import model_router
+from services.result_model import Corrections, Transcription, TranscriptionItem
+from utils.cancellation import CancelToken, checkpoint
+
+
+# progress(stage, fraction, message)
+ProgressCallback = Callable[[str, float, str], None]
+
+
+def pipeline_version() -> str:
+    """Prompts and models the pipeline runs with (part of the job coalescing key)"""
+    tiers = (
+        f"{Config.GEMINI_FAST_MODEL}<={Config.TIER_MAX_WORDS}w/{Config.TIER_MAX_EDIT_RATIO}"
+        if Config.MODEL_TIERING else "untiered"
+    )
+    return f"t{transcription.PROMPT_VERSION}/c{correction.PROMPT_VERSION}/{Config.GEMINI_MODEL}/{tiers}"
+
+
+def _describe_items(transcription: Transcription) -> str:
+    """Progress message after transcription: item count and model tiers"""
+    if not Config.MODEL_TIERING:
+        return f"Identified {len(transcription)} items"
+    fast, pro = model_router.route_items(transcription.items)
+    return f"Identified {len(transcription)} items ({len(fast)} fast, {len(pro)} pro)"
+
+
+def run_pipeline(
+    user_images: List[Image.Image],
+    answer_image: Image.Image,
+    progress: Optional[ProgressCallback] = None,
+    cancel: Optional[CancelToken] = None
+) -> dict:
+    """
+    Transcribe, correct and save one worksheet
+
+    Args:
+        user_images: User handwriting pages
+        answer_image: Standard answer page
+        progress: Called when a stage starts
+        cancel: Stops the run at the next checkpoint (nothing is saved)
+
+    Returns:
+        Dict with the parsed "transcription" and "correction" and the saved "record_id"
+
+    Raises:
+        Cancelled: If the token is cancelled before saving
+        Exception: Any agent error (saving failures are silent)
+    """
+    report = progress or (lambda stage, fraction, message: None)
+
+    # --- Stage 1: Transcription ---
+    report("transcribing", 0.1, "Processing Transcription...")
+    transcription_result = transcription.generate(user_images, answer_image, cancel)
+
+    # --- Stage 2: Correction ---
+    report("correcting", 0.5, _describe_items(transcription_result))
+    correction_result = model_router.correct(transcription_result, cancel)
+
+    # --- Stage 3: Save to Database ---
+    checkpoint(cancel)
+    report("saving", 0.9, "Saving to history")
+    record_id = None
+    try:
+        from services.database import DatabaseService
+
+        db = DatabaseService()
+        if db.is_connected():
+            record_id = db.save_correction(correction_result, transcription_result)
+    except Exception:
+        pass  # Silent fail for elegance
+
+    return {
+        "transcription": transcription_result,
+        "correction": correction_result,
+        "record_id": record_id
+    }
+
+
+def changed_items(previous: Transcription, edited: Transcription) -> List[TranscriptionItem]:
+    """Edited items whose user or standard text differs from the previous transcription"""
+    changed = []
+    for item in edited:
+        before = previous.get(item.id)
+        if before is None or (item.user, item.standard) != (before.user, before.standard):
+            changed.append(item)
+    return changed
+
+
+def regrade(
+    previous: Transcription,
+    edited: Transcription,
+    corrections: Corrections,
+    cancel: Optional[CancelToken] = None
+) -> Tuple[Corrections, List[str]]:
+    """
+    Correct only the items a user edited and merge them into an existing report
+
+    Args:
+        previous: Transcription the report was graded from
+        edited: The same items with corrected user / standard text
+        corrections: Existing Agent 2 output
+        cancel: Passed to every model call
+
+    Returns:
+        (merged corrections in transcription order, ids that were re-graded)
+
+    Raises:
+        Exception: Any Agent 2 error (the existing report is left unchanged)
+    """
+    changed = changed_items(previous, edited)
+    if not changed:
+        return corrections, []
+
+    regraded = model_router.correct(Transcription(changed), cancel)
+    order = edited.ids()
+    merged = [regraded.get(item_id) or corrections.get(item_id) for item_id in order]
+    # Corrections without a transcribed item (older records) stay at the end
+    known = set(order)
+    merged.extend(item for item in corrections if item.id not in known)
+    return Corrections(item for item in merged if item is not None), [item.id for item in changed]
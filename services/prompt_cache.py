@@ -0,0 +1,246 @@
+"""
+Prompt Cache
+固定提示詞前綴（與重複使用的標準答案圖片）的模型端快取
+"""
+import hashlib
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+from config.settings import Config
+from services.model_provider import (
+    CacheHandle,
+    CacheMissing,
+    FileHandle,
+    FileMissing,
+    ModelProvider,
+    api_key_scope,
+    get_provider
+)
+from utils.cancellation import CancelToken
+from utils.page_cache import CONTENT_HASH
+
+
+def prefix_key(model_name: str, prefix: list) -> str:
+    """
+    Content hash of a model's prompt prefix
+
+    Images decoded from page bytes, and their uploaded file handles, carry
+    the bytes' hash (utils.page_cache); other images are hashed by their pixels.
+    """
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    for part in prefix:
+        if isinstance(part, FileHandle):
+            digest.update(f"image:{part.content_hash}".encode("utf-8"))
+        elif isinstance(part, Image.Image):
+            content_hash = part.info.get(CONTENT_HASH)
+            if content_hash:
+                digest.update(f"image:{content_hash}".encode("utf-8"))
+            else:
+                digest.update(f"pixels:{part.mode}:{part.size}:".encode("utf-8"))
+                digest.update(part.tobytes())
+        else:
+            digest.update(b"text:" + str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PromptCache:
+    """
+    Cached prefixes registered with the provider, by prefix hash
+
+    The first call with a prefix registers it for ttl_seconds; later calls
+    only send their own parts. A cache used within refresh_margin of its
+    expiry gets its TTL extended, and one that has already expired on the
+    provider is registered again and the call retried. Prefixes the provider
+    refuses to cache (e.g. below the model's minimum size) are sent inline
+    until ttl_seconds have passed. Caches belong to the API key that
+    created them, so the entries cover one key (scope).
+    """
+
+    def __init__(self, provider: ModelProvider, ttl_seconds: float, refresh_margin: float = 60.0, scope: str = ""):
+        self.provider = provider
+        self.scope = scope
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self._entries: Dict[str, CacheHandle] = {}
+        self._refused: Dict[str, float] = {}
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "cached_calls": 0, "created": 0, "refreshed": 0, "recreated": 0, "refused": 0,
+            "input_tokens": 0, "cached_tokens": 0, "cached_seconds": 0.0, "inline_seconds": 0.0,
+            "inline_calls": 0,
+        }
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _handle(self, model_name: str, key: str, prefix: list) -> Optional[CacheHandle]:
+        """Live cache for a prefix, registering or refreshing it as needed; None to send it inline"""
+        now = time.time()
+        with self._key_lock(key):
+            with self._lock:
+                if self._refused.get(key, 0) > now:
+                    return None
+                handle = self._entries.get(key)
+
+            if handle is not None and handle.expires_at - now < self.refresh_margin:
+                try:
+                    handle = self.provider.refresh_cache(handle, self.ttl_seconds)
+                    self._count("refreshed")
+                except CacheMissing:
+                    handle = None
+                    self._count("recreated")
+                except Exception:
+                    pass  # Still usable until it expires
+
+            if handle is None:
+                try:
+                    handle = self.provider.create_cache(model_name, prefix, self.ttl_seconds)
+                    self._count("created")
+                except FileMissing:
+                    raise  # Not the prefix's fault: the caller uploads the files again
+                except Exception:
+                    with self._lock:
+                        self._refused[key] = now + self.ttl_seconds
+                        self._entries.pop(key, None)
+                    self._count("refused")
+                    return None
+
+            with self._lock:
+                self._entries[key] = handle
+                # Forget caches the provider has dropped
+                for stale in [k for k, h in self._entries.items() if h.expires_at <= now]:
+                    del self._entries[stale]
+            return handle
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def generate(
+        self,
+        model_name: str,
+        prefix: list,
+        contents: list,
+        cancel: Optional[CancelToken] = None
+    ) -> Tuple[str, dict]:
+        """
+        Call the model with a cached prefix followed by per-call contents
+
+        Args:
+            model_name: Model to call (caches are per model)
+            prefix: Static leading parts
+            contents: Parts that follow the prefix
+            cancel: Cancellation token of the job
+
+        Returns:
+            (response text, usage dict)
+        """
+        key = prefix_key(model_name, prefix)
+        started = time.perf_counter()
+        handle = self._handle(model_name, key, prefix)
+        if handle is not None:
+            try:
+                text, usage = self.provider.generate(model_name, contents, cache=handle, cancel=cancel)
+            except CacheMissing:
+                self._forget(key)
+                self._count("recreated")
+                handle = self._handle(model_name, key, prefix)
+                if handle is not None:
+                    text, usage = self.provider.generate(model_name, contents, cache=handle, cancel=cancel)
+        if handle is None:
+            text, usage = self.provider.generate(model_name, [*prefix, *contents], cancel=cancel)
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["input_tokens"] += usage.get("input_tokens", 0)
+            self._stats["cached_tokens"] += usage.get("cached_tokens", 0)
+            if handle is not None:
+                self._stats["cached_calls"] += 1
+                self._stats["cached_seconds"] += elapsed
+            else:
+                self._stats["inline_calls"] += 1
+                self._stats["inline_seconds"] += elapsed
+        return text, usage
+
+    def stats(self) -> dict:
+        """
+        Cache usage since the process started
+
+        Returns:
+            Dict with calls, cached_calls, created, refreshed, recreated,
+            refused, input_tokens, cached_tokens, token_savings (share of
+            input served from caches), live (registered caches), and the
+            average latency of cached and inline calls
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["live"] = len(self._entries)
+        stats["token_savings"] = stats["cached_tokens"] / stats["input_tokens"] if stats["input_tokens"] else 0.0
+        cached_seconds, inline_seconds = stats.pop("cached_seconds"), stats.pop("inline_seconds")
+        stats["cached_avg_seconds"] = cached_seconds / stats["cached_calls"] if stats["cached_calls"] else 0.0
+        stats["inline_avg_seconds"] = inline_seconds / stats["inline_calls"] if stats["inline_calls"] else 0.0
+        return stats
+
+
+_caches: Dict[str, PromptCache] = {}
+_cache_lock = threading.Lock()
+
+
+def get_prompt_cache() -> PromptCache:
+    """Process-wide prompt cache of the current provider and the API key of this context (the job's)"""
+    provider = get_provider()
+    scope = api_key_scope()
+    with _cache_lock:
+        cache = _caches.get(scope)
+        if cache is None or cache.provider is not provider:
+            cache = PromptCache(provider, Config.PROMPT_CACHE_TTL_SECONDS, scope=scope)
+            _caches[scope] = cache
+        return cache
+
+
+def generate(
+    model_name: str,
+    prefix: list,
+    contents: list,
+    cancel: Optional[CancelToken] = None
+) -> Tuple[str, dict]:
+    """
+    Call the model, through the prompt cache when Config.PROMPT_CACHE is on
+
+    With Config.FILE_UPLOADS, page images are sent as uploaded file handles
+    (services.file_handles). If the provider has lost a file, it is uploaded
+    again and the call retried once, then the images are sent inline.
+
+    Args:
+        model_name: Model to call
+        prefix: Static leading parts (cacheable)
+        contents: Parts that follow the prefix
+
+    Returns:
+        (response text, usage dict)
+    """
+    from services.file_handles import get_file_index
+
+    files = get_file_index() if Config.FILE_UPLOADS else None
+    for attempt in range(3):
+        use_files = files is not None and attempt < 2
+        call_prefix = files.attach(prefix) if use_files else prefix
+        call_contents = files.attach(contents) if use_files else contents
+        try:
+            if Config.PROMPT_CACHE:
+                return get_prompt_cache().generate(model_name, call_prefix, call_contents, cancel)
+            return get_provider().generate(model_name, [*call_prefix, *call_contents], cancel=cancel)
+        except FileMissing as e:
+            if not use_files:
+                raise
+            files.forget(e.names)
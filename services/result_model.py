@@ -0,0 +1,440 @@
+"""
+Result Model
+辨識與批改結果的型別模型：模型輸出只解析一次，之後在流程、資料庫與畫面間直接傳遞
+"""
+import json
+import re
+import threading
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+    ORJSON_SUPPORT = True
+except ImportError:
+    ORJSON_SUPPORT = False
+
+
+# Opening fence of a Markdown code block (```json, ```JSON, ```)
+_FENCE = re.compile(r"^```[A-Za-z]*\s*|\s*```$")
+
+# Comma before a closing bracket (not valid JSON, common in model output)
+_TRAILING_COMMA = re.compile(r",(\s*[\]}])")
+
+# End of an array element: a closing brace followed by the next object or the end of the array
+_ITEM_END = re.compile(r"\}\s*(?:,\s*(?=\{)|(?=\]))")
+
+
+class ResultError(ValueError):
+    """Model output that is not a JSON list of items"""
+
+
+def loads(text: str):
+    """Parse JSON with orjson when installed"""
+    if ORJSON_SUPPORT:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError as e:
+            raise json.JSONDecodeError(str(e), text, 0) from None
+    return json.loads(text)
+
+
+def dumps(data) -> str:
+    """Serialize JSON (non-ASCII kept as is) with orjson when installed"""
+    if ORJSON_SUPPORT:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False)
+
+
+class RepairStats:
+    """How often model output needed repair, since the process started"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {
+            "parsed": 0, "repaired": 0, "salvaged": 0, "salvaged_items": 0, "dropped_items": 0,
+            "regenerated_items": 0, "recovered_items": 0,
+        }
+
+    def record(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self) -> dict:
+        """
+        Repair counters
+
+        Returns:
+            Dict with parsed (answers that were valid JSON), repaired (valid
+            after removing comments and trailing commas), salvaged (answers
+            read item by item), salvaged_items, dropped_items (fragments that
+            could not be read), regenerated_items (ids asked for again) and
+            recovered_items (of those, answered the second time)
+        """
+        with self._lock:
+            return dict(self._counts)
+
+
+_repair_stats = RepairStats()
+
+
+def get_repair_stats() -> dict:
+    """Repair counters of this process (RepairStats.snapshot)"""
+    return _repair_stats.snapshot()
+
+
+def record_regeneration(requested: int, recovered: int) -> None:
+    """Count ids re-requested after a partial answer, and how many came back"""
+    _repair_stats.record("regenerated_items", requested)
+    _repair_stats.record("recovered_items", recovered)
+
+
+def _strip_comments(text: str) -> str:
+    """Remove // and /* */ comments outside JSON strings"""
+    out = []
+    i, n, in_string = 0, len(text), False
+    while i < n:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if ch == "\\" and i + 1 < n:
+                out.append(text[i + 1])
+                i += 1
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _escape_inner_quotes(chunk: str) -> str:
+    """
+    Escape quotes that cannot end a JSON string
+
+    A quote ends a string only if it is followed by `:`, `}`, `]`, the end
+    of the text, or a comma and the start of another value; any other quote
+    inside a string (e.g. quoted words in feedback) is escaped. Raw newlines
+    inside strings are escaped as well.
+    """
+    out = []
+    in_string = False
+    i, n = 0, len(chunk)
+    while i < n:
+        ch = chunk[i]
+        if in_string and ch == "\\" and i + 1 < n:
+            out.append(chunk[i:i + 2])
+            i += 2
+            continue
+        if ch == '"':
+            if not in_string:
+                in_string = True
+            else:
+                rest = chunk[i + 1:].lstrip()
+                next_value = rest[1:].lstrip()[:1]
+                closes = not rest or rest[0] in ":}]" or (rest[0] == "," and next_value in ('"', "{", "["))
+                if closes:
+                    in_string = False
+                else:
+                    out.append('\\"')
+                    i += 1
+                    continue
+        elif in_string and ch == "\n":
+            out.append("\\n")
+            i += 1
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _salvage(text: str, start: int) -> Tuple[list, int]:
+    """
+    Read the elements of a malformed or truncated array one by one
+
+    Elements that do not decode are retried with inner quotes escaped;
+    what still fails, and an unfinished last element, is dropped.
+
+    Returns:
+        (decoded elements, number of dropped fragments)
+    """
+    decoder = json.JSONDecoder()
+    items, dropped = [], 0
+    pos, n = start + 1, len(text)
+    while pos < n:
+        while pos < n and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= n or text[pos] == "]":
+            break
+        try:
+            item, pos = decoder.raw_decode(text, pos)
+            items.append(item)
+            continue
+        except json.JSONDecodeError:
+            pass
+        if text[pos] != "{":
+            # Stray text between elements: resume at the next object
+            next_object = text.find("{", pos)
+            if next_object < 0:
+                break
+            pos = next_object
+            continue
+        end = _ITEM_END.search(text, pos)
+        if end is None:
+            dropped += 1  # Truncated tail
+            break
+        try:
+            items.append(json.loads(_escape_inner_quotes(text[pos:end.start() + 1])))
+        except json.JSONDecodeError:
+            dropped += 1
+        pos = end.end()
+    return items, dropped
+
+
+def parse_items(text: str) -> list:
+    """
+    Parse the JSON array in a model answer, repairing it where possible
+
+    Strips Markdown code fences and ignores text before the array and
+    anything after its closing bracket (model chatter after the JSON).
+    Answers that still do not parse are repaired locally: comments and
+    trailing commas are removed, and failing that every complete item is
+    salvaged one by one (unescaped quotes fixed, a truncated tail dropped).
+    Callers that know the expected ids ask again for the missing ones.
+
+    Args:
+        text: Raw model answer
+
+    Returns:
+        The parsed (or salvaged) list
+
+    Raises:
+        ResultError: If the answer holds no JSON array, or nothing in it could be read
+    """
+    text = _FENCE.sub("", (text or "").strip())
+    try:
+        data = loads(text)
+    except json.JSONDecodeError:
+        data = None
+    else:
+        if not isinstance(data, list):
+            raise ResultError(f"Model output is a JSON {type(data).__name__}, not a list")
+        _repair_stats.record("parsed")
+        return data
+
+    start = text.find("[")
+    if start < 0:
+        raise ResultError(f"No JSON list in model output: {text[:200]}")
+
+    # Valid array followed by chatter
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text, start)
+        _repair_stats.record("parsed")
+        return data
+    except json.JSONDecodeError:
+        pass
+
+    cleaned = _TRAILING_COMMA.sub(r"\1", _strip_comments(text[start:]))
+    try:
+        data, _ = json.JSONDecoder().raw_decode(cleaned)
+        _repair_stats.record("repaired")
+        return data
+    except json.JSONDecodeError:
+        pass
+
+    items, dropped = _salvage(cleaned, 0)
+    if not items:
+        # The array did not parse, so an empty salvage is a truncated answer, not an empty list
+        raise ResultError(f"Malformed JSON list in model output: {text[:200]}")
+    _repair_stats.record("salvaged")
+    _repair_stats.record("salvaged_items", len(items))
+    _repair_stats.record("dropped_items", dropped)
+    return items
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value)
+
+
+class TranscriptionItem:
+    """One Agent 1 item: what the student wrote and the standard answer"""
+
+    __slots__ = ("id", "user", "standard")
+
+    def __init__(self, id: str, user: str = "", standard: str = ""):
+        self.id = id
+        self.user = user
+        self.standard = standard
+
+    @classmethod
+    def from_dict(cls, data: dict, strict: bool = True) -> "TranscriptionItem":
+        """
+        Build an item from parsed JSON
+
+        Raises:
+            ResultError: In strict mode, if the id is missing or a text field is not a string
+        """
+        if strict:
+            if data.get("id") is None:
+                raise ResultError("Transcription item without id")
+            for field in ("user", "standard"):
+                if not isinstance(data.get(field, ""), str):
+                    raise ResultError(f"Transcription item {data['id']}: {field} is not a string")
+        return cls(_text(data.get("id")), _text(data.get("user")), _text(data.get("standard")))
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "user": self.user, "standard": self.standard}
+
+
+class CorrectionItem:
+    """One Agent 2 item: the corrected text and feedback points"""
+
+    __slots__ = ("id", "user", "correction", "feedback")
+
+    def __init__(self, id: str, user: str = "", correction: str = "", feedback: Optional[List[str]] = None):
+        self.id = id
+        self.user = user
+        self.correction = correction
+        self.feedback = feedback or []
+
+    @classmethod
+    def from_dict(cls, data: dict, strict: bool = True) -> "CorrectionItem":
+        """
+        Build an item from parsed JSON (a single feedback string becomes a one-point list)
+
+        Raises:
+            ResultError: In strict mode, if the id is missing, correction is
+                not a string or feedback is not a list of strings
+        """
+        feedback = data.get("feedback")
+        if strict:
+            if data.get("id") is None:
+                raise ResultError("Correction item without id")
+            if not isinstance(data.get("correction"), str):
+                raise ResultError(f"Correction item {data['id']}: correction is not a string")
+            if not isinstance(feedback, list) or not all(isinstance(point, str) for point in feedback):
+                raise ResultError(f"Correction item {data['id']}: feedback is not a list of strings")
+        if feedback is None or feedback == "":
+            feedback = []
+        elif not isinstance(feedback, list):
+            feedback = [feedback]
+        return cls(
+            _text(data.get("id")),
+            _text(data.get("user")),
+            _text(data.get("correction")),
+            [_text(point) for point in feedback]
+        )
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "user": self.user, "correction": self.correction, "feedback": list(self.feedback)}
+
+
+class ItemList:
+    """Ordered items of one result with lookup by id"""
+
+    __slots__ = ("items", "rejected", "_by_id")
+
+    item_type = None
+
+    def __init__(self, items: Iterable = (), rejected: int = 0):
+        self.items = list(items)
+        self.rejected = rejected
+        self._by_id = None
+
+    @classmethod
+    def from_list(cls, data: Optional[list], strict: bool = False) -> "ItemList":
+        """
+        Build from parsed JSON items
+
+        Args:
+            data: List of item dicts (None for an empty result)
+            strict: Drop items that fail schema validation (counted in
+                `rejected`) instead of coercing their fields
+
+        Raises:
+            ResultError: If data is not a list
+        """
+        if data is None:
+            return cls()
+        if not isinstance(data, list):
+            raise ResultError(f"Expected a list of items, got {type(data).__name__}")
+        items, rejected = [], 0
+        for entry in data:
+            if not isinstance(entry, dict):
+                rejected += 1
+                continue
+            try:
+                items.append(cls.item_type.from_dict(entry, strict))
+            except ResultError:
+                rejected += 1
+        return cls(items, rejected)
+
+    @classmethod
+    def parse(cls, text: str, strict: bool = False) -> "ItemList":
+        """
+        Parse a raw model answer (see parse_items)
+
+        Raises:
+            ResultError: If the answer holds no JSON array
+        """
+        return cls.from_list(parse_items(text), strict)
+
+    @classmethod
+    def coerce(cls, data) -> "ItemList":
+        """Accept a result, a JSON string or a list of dicts (stored records, job rows)"""
+        if isinstance(data, cls):
+            return data
+        if isinstance(data, str):
+            return cls.from_list(loads(data)) if data.strip() else cls()
+        return cls.from_list(data)
+
+    def __iter__(self) -> Iterator:
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __bool__(self) -> bool:
+        return bool(self.items)
+
+    def get(self, item_id: str):
+        """Item with this id, or None"""
+        if self._by_id is None:
+            self._by_id = {item.id: item for item in self.items}
+        return self._by_id.get(item_id)
+
+    def ids(self) -> List[str]:
+        return [item.id for item in self.items]
+
+    def to_list(self) -> List[dict]:
+        """Plain dicts, as stored in history records"""
+        return [item.to_dict() for item in self.items]
+
+    def to_json(self) -> str:
+        return dumps(self.to_list())
+
+
+class Transcription(ItemList):
+    """Agent 1 output"""
+
+    __slots__ = ()
+
+    item_type = TranscriptionItem
+
+
+class Corrections(ItemList):
+    """Agent 2 output"""
+
+    __slots__ = ()
+
+    item_type = CorrectionItem
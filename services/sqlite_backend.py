@@ -0,0 +1,374 @@
+"""
+SQLite Backend
+本地 SQLite 儲存（離線使用與壓力測試）
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from services.payload_codec import decode_corrections
+from services.storage import StorageBackend
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS correction_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    modified_at TEXT,
+    timestamp TEXT,
+    name TEXT,
+    corrections TEXT CHECK (corrections IS NULL OR json_valid(corrections)),
+    transcriptions TEXT CHECK (transcriptions IS NULL OR json_valid(transcriptions))
+);
+CREATE INDEX IF NOT EXISTS idx_correction_history_created_at
+    ON correction_history (created_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS answer_keys (
+    key TEXT PRIMARY KEY,
+    standards TEXT NOT NULL CHECK (json_valid(standards)),
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+CREATE TABLE IF NOT EXISTS correction_stats (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    label TEXT,
+    items INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    PRIMARY KEY (dimension, key)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Trigram tokenizer: substring matching that also works for Chinese feedback
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE correction_history_fts USING fts5(
+    name, user_text, correction_text, feedback_text,
+    tokenize = 'trigram'
+);
+"""
+
+JSON_COLUMNS = ("corrections", "transcriptions")
+STAT_ORDER_COLUMNS = ("items", "errors", "key")
+RECORD_COLUMNS = ("id", "created_at", "modified_at", "timestamp", "name", *JSON_COLUMNS)
+SEARCH_COLUMNS = ("name", "user_text", "correction_text", "feedback_text")
+
+# Trigram index only answers MATCH for terms of at least 3 characters
+MIN_MATCH_TERM_LENGTH = 3
+
+
+def utc_now() -> str:
+    """Current UTC time in the same ISO format as the created_at column default"""
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+
+def build_search_document(name: Optional[str], corrections: Optional[list]) -> tuple:
+    """
+    Flatten a record into the searchable text columns
+
+    Args:
+        name: Record display name
+        corrections: Agent 2 output list ({id, user, correction, feedback}), possibly compressed
+
+    Returns:
+        Tuple of (name, user_text, correction_text, feedback_text)
+    """
+    user_parts, correction_parts, feedback_parts = [], [], []
+    for item in decode_corrections(corrections) or []:
+        if not isinstance(item, dict):
+            continue
+        user_parts.append(str(item.get('user') or ''))
+        correction_parts.append(str(item.get('correction') or ''))
+        feedback = item.get('feedback') or []
+        feedback_parts.extend(str(point) for point in (feedback if isinstance(feedback, list) else [feedback]))
+    return (
+        name or '',
+        "\n".join(user_parts),
+        "\n".join(correction_parts),
+        "\n".join(feedback_parts)
+    )
+
+
+class SQLiteBackend(StorageBackend):
+    """`correction_history` table in a local SQLite file (WAL mode, JSON columns)"""
+
+    name = "SQLite"
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        # Streamlit reruns scripts on different threads; serialize access instead
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._ensure_modified_at()
+        self._ensure_search_index()
+
+    def _ensure_modified_at(self):
+        """Add the modified_at column to files created before it existed"""
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(correction_history)")}
+        if "modified_at" in columns:
+            return
+        with self.conn:
+            self.conn.execute("ALTER TABLE correction_history ADD COLUMN modified_at TEXT")
+
+    def _ensure_search_index(self):
+        """Create the FTS5 index on first use and backfill existing records"""
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'correction_history_fts'"
+        ).fetchone()
+        if exists:
+            return
+
+        with self.conn:
+            self.conn.execute(SEARCH_SCHEMA)
+            rows = self.conn.execute("SELECT id, name, corrections FROM correction_history").fetchall()
+            for row in rows:
+                corrections = json.loads(row["corrections"]) if row["corrections"] else []
+                self._index_record(row["id"], row["name"], corrections)
+
+    def _index_record(self, record_id: int, name: Optional[str], corrections: Optional[list]):
+        """Insert or replace the search document of a record (caller holds the transaction)"""
+        self.conn.execute("DELETE FROM correction_history_fts WHERE rowid = ?", (record_id,))
+        self.conn.execute(
+            f"INSERT INTO correction_history_fts (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+            (record_id, *build_search_document(name, corrections))
+        )
+
+    def _row_to_record(self, row: sqlite3.Row) -> dict:
+        record = dict(row)
+        for column in JSON_COLUMNS:
+            if record.get(column) is not None:
+                record[column] = json.loads(record[column])
+        return record
+
+    def _write_record(self, entry: dict, upsert: bool = False) -> int:
+        """Write one record and its search document (caller holds lock and transaction)"""
+        columns = [key for key in RECORD_COLUMNS if key in entry]
+        values = [
+            json.dumps(entry[key], ensure_ascii=False)
+            if key in JSON_COLUMNS and entry[key] is not None else entry[key]
+            for key in columns
+        ]
+        sql = (
+            f"INSERT INTO correction_history ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        if upsert:
+            updates = ", ".join(f"{key} = excluded.{key}" for key in columns if key != "id")
+            sql += f" ON CONFLICT(id) DO UPDATE SET {updates}"
+        cursor = self.conn.execute(sql, values)
+        record_id = entry.get("id", cursor.lastrowid)
+        self._index_record(record_id, entry.get("name"), entry.get("corrections"))
+        return record_id
+
+    def insert(self, entry: dict) -> Optional[int]:
+        with self._lock, self.conn:
+            return self._write_record(entry)
+
+    def upsert(self, records: list) -> None:
+        """Insert or overwrite records keeping their ids and timestamps (history mirror)"""
+        with self._lock, self.conn:
+            for record in records:
+                self._write_record({key: record.get(key) for key in RECORD_COLUMNS}, upsert=True)
+
+    def delete(self, record_ids: list) -> None:
+        """Remove records and their search documents (history mirror)"""
+        with self._lock, self.conn:
+            for record_id in record_ids:
+                self.conn.execute("DELETE FROM correction_history WHERE id = ?", (record_id,))
+                self.conn.execute("DELETE FROM correction_history_fts WHERE rowid = ?", (record_id,))
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM correction_history").fetchone()[0]
+
+    def list(self, limit: Optional[int] = None, offset: int = 0) -> list:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM correction_history ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset)
+            ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def get(self, record_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM correction_history WHERE id = ?", (record_id,)
+            ).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def rename(self, record_id: int, new_name: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE correction_history SET name = ?, modified_at = ? WHERE id = ?",
+                (new_name, utc_now(), record_id)
+            )
+            self.conn.execute(
+                "UPDATE correction_history_fts SET name = ? WHERE rowid = ?", (new_name, record_id)
+            )
+
+    def update_payload(self, record_id: int, payload: dict) -> None:
+        columns = [key for key in JSON_COLUMNS if key in payload]
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"UPDATE correction_history SET {', '.join(f'{key} = ?' for key in columns)}, modified_at = ? "
+                "WHERE id = ?",
+                (*(json.dumps(payload[key], ensure_ascii=False) for key in columns), utc_now(), record_id)
+            )
+            row = self.conn.execute(
+                "SELECT name, corrections FROM correction_history WHERE id = ?", (record_id,)
+            ).fetchone()
+            if row is not None:
+                corrections = json.loads(row["corrections"]) if row["corrections"] else []
+                self._index_record(record_id, row["name"], corrections)
+
+    def save_answer_key(self, key: str, standards: list) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO answer_keys (key, standards) VALUES (?, ?)",
+                (key, json.dumps(standards, ensure_ascii=False))
+            )
+
+    def get_answer_keys(self, keys: list) -> dict:
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT key, standards FROM answer_keys WHERE key IN ({', '.join('?' for _ in keys)})",
+                list(keys)
+            ).fetchall()
+        return {row["key"]: json.loads(row["standards"]) for row in rows}
+
+    def increment_stats(self, increments: list) -> None:
+        now = utc_now()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO correction_stats (dimension, key, label, items, errors, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(dimension, key) DO UPDATE SET
+                    items = items + excluded.items,
+                    errors = errors + excluded.errors,
+                    label = COALESCE(excluded.label, label),
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (row["dimension"], row["key"], row.get("label"), row["items"], row["errors"], now)
+                    for row in increments
+                ]
+            )
+
+    def get_stats(self, dimension: str, order_by: str = "items", limit: Optional[int] = None) -> list:
+        if order_by not in STAT_ORDER_COLUMNS:
+            raise ValueError(f"Unsupported stats order: {order_by}")
+        direction = "ASC" if order_by == "key" else "DESC"
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT dimension, key, label, items, errors FROM correction_stats "
+                f"WHERE dimension = ? ORDER BY {order_by} {direction}, key LIMIT ?",
+                (dimension, -1 if limit is None else limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def set_stat_label(self, dimension: str, key: str, label: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE correction_stats SET label = ? WHERE dimension = ? AND key = ?",
+                (label, dimension, key)
+            )
+
+    def reset_stats(self) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM correction_stats")
+
+    def list_since(self, after_id: int, limit: int = 500) -> list:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM correction_history WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)
+            ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def list_ids(self, after_id: int = 0, limit: int = 1000) -> list:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id FROM correction_history WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def list_modified_since(self, modified_at: str, after_id: int = 0, limit: int = 500) -> list:
+        with self._lock:
+            rows = self.conn.execute(
+                """
+                SELECT * FROM correction_history
+                WHERE modified_at > ? OR (modified_at = ? AND id > ?)
+                ORDER BY modified_at, id LIMIT ?
+                """,
+                (modified_at, modified_at, after_id, limit)
+            ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Read a value from the meta key/value table"""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, values: dict) -> None:
+        """Write several meta key/value pairs in one transaction"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [(key, None if value is None else str(value)) for key, value in values.items()]
+            )
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> tuple:
+        terms = query.split()
+        if not terms:
+            return [], 0
+
+        # Long terms go through the FTS index (ranked by bm25); short terms fall back to LIKE
+        match_terms = [t for t in terms if len(t) >= MIN_MATCH_TERM_LENGTH]
+        like_terms = [t for t in terms if len(t) < MIN_MATCH_TERM_LENGTH]
+
+        conditions, params = [], []
+        if match_terms:
+            conditions.append("f.correction_history_fts MATCH ?")
+            params.append(" AND ".join('"' + t.replace('"', '""') + '"' for t in match_terms))
+        for term in like_terms:
+            pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            conditions.append(
+                "(" + " OR ".join(f"f.{column} LIKE ? ESCAPE '\\'" for column in SEARCH_COLUMNS) + ")"
+            )
+            params.extend([pattern] * len(SEARCH_COLUMNS))
+        where = " AND ".join(conditions)
+        rank = "bm25(correction_history_fts)" if match_terms else "0"
+
+        with self._lock:
+            total = self.conn.execute(
+                f"SELECT COUNT(*) FROM correction_history_fts f WHERE {where}", params
+            ).fetchone()[0]
+            rows = self.conn.execute(
+                f"""
+                SELECT h.*, {rank} AS rank
+                FROM correction_history_fts AS f
+                JOIN correction_history h ON h.id = f.rowid
+                WHERE {where}
+                ORDER BY rank, h.created_at DESC, h.id DESC
+                LIMIT ? OFFSET ?
+                """,
+                (*params, limit, offset)
+            ).fetchall()
+        return [self._row_to_record(row) for row in rows], total
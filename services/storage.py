@@ -0,0 +1,121 @@
+"""
+Storage Backend
+歷史記錄儲存後端抽象層
+"""
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+class StorageBackend(ABC):
+    """
+    Storage interface used by DatabaseService
+
+    Records are plain dicts with the same keys as the `correction_history`
+    table: id, created_at, modified_at, timestamp, name, corrections,
+    transcriptions. modified_at stays NULL until a record is updated.
+    Backends raise on failure; DatabaseService decides how errors surface.
+    """
+
+    name = "storage"
+
+    @abstractmethod
+    def insert(self, entry: dict) -> Optional[int]:
+        """Insert a history entry and return its new record id"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Return total number of history records"""
+
+    @abstractmethod
+    def list(self, limit: Optional[int] = None, offset: int = 0) -> list:
+        """Return records ordered by created_at (newest first)"""
+
+    @abstractmethod
+    def get(self, record_id: int) -> Optional[dict]:
+        """Return a single record, or None if it does not exist"""
+
+    @abstractmethod
+    def rename(self, record_id: int, new_name: str) -> None:
+        """Update the display name of a record"""
+
+    @abstractmethod
+    def update_payload(self, record_id: int, payload: dict) -> None:
+        """Overwrite the `corrections` / `transcriptions` columns of a record in place"""
+
+    @abstractmethod
+    def save_answer_key(self, key: str, standards: list) -> None:
+        """Store an answer key (standard answers) under its content hash; no-op if present"""
+
+    @abstractmethod
+    def get_answer_keys(self, keys: list) -> dict:
+        """Return {key: standards list} for the answer keys that exist"""
+
+    @abstractmethod
+    def increment_stats(self, increments: list) -> None:
+        """Add {dimension, key, label, items, errors} increments to the aggregate counters"""
+
+    @abstractmethod
+    def get_stats(self, dimension: str, order_by: str = "items", limit: Optional[int] = None) -> list:
+        """Return aggregate rows of one dimension, largest `order_by` first ("key" sorts ascending)"""
+
+    @abstractmethod
+    def set_stat_label(self, dimension: str, key: str, label: str) -> None:
+        """Update the display label of one aggregate row"""
+
+    @abstractmethod
+    def reset_stats(self) -> None:
+        """Delete all aggregate rows (before a rebuild)"""
+
+    @abstractmethod
+    def list_since(self, after_id: int, limit: int = 500) -> list:
+        """Return records with id greater than `after_id`, oldest first"""
+
+    @abstractmethod
+    def list_ids(self, after_id: int = 0, limit: int = 1000) -> list:
+        """Return record ids greater than `after_id`, ascending (mirror reconciliation)"""
+
+    @abstractmethod
+    def list_modified_since(self, modified_at: str, after_id: int = 0, limit: int = 500) -> list:
+        """
+        Return records modified after the (modified_at, id) keyset position
+
+        Records are ordered by (modified_at, id) so callers can page through
+        rows that share the same modification time.
+        """
+
+    @abstractmethod
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> tuple:
+        """
+        Full-text search over names, user text, corrections and feedback
+
+        Returns:
+            Tuple of (ranked records for the requested page, total match count)
+        """
+
+
+def create_backend(kind: str) -> Optional[StorageBackend]:
+    """
+    Build the storage backend selected by Config.STORAGE_BACKEND
+
+    Args:
+        kind: "supabase" or "sqlite"
+
+    Returns:
+        Backend instance, or None if the backend is not configured
+
+    Raises:
+        ValueError: If the backend kind is unknown
+    """
+    from config.settings import Config
+
+    if kind == "sqlite":
+        from services.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(Config.SQLITE_PATH)
+
+    if kind == "supabase":
+        if not (Config.SUPABASE_URL and Config.SUPABASE_KEY):
+            return None
+        from services.supabase_backend import SupabaseBackend
+        return SupabaseBackend(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+
+    raise ValueError(f"Unknown storage backend: {kind}")
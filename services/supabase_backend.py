@@ -0,0 +1,149 @@
+"""
+Supabase Backend
+Supabase 雲端儲存
+"""
+from typing import Optional
+from supabase import create_client, Client
+
+from services.payload_codec import corrections_search_text
+from services.storage import StorageBackend
+
+
+TABLE = "correction_history"
+ANSWER_KEY_TABLE = "answer_keys"
+STATS_TABLE = "correction_stats"
+
+# Atomic counter upsert defined in SUPABASE_SETUP.md
+INCREMENT_STATS_FUNCTION = "increment_correction_stats"
+
+# Postgres function defined in SUPABASE_SETUP.md (tsvector + pg_trgm index)
+SEARCH_FUNCTION = "search_correction_history"
+
+
+def with_search_text(payload: dict) -> dict:
+    """
+    Add `corrections_text` for a compressed corrections payload
+
+    The search trigger can only flatten a JSON array; for the compressed
+    {"codec", "data"} object it indexes this column instead.
+    """
+    if isinstance(payload.get("corrections"), dict):
+        return {**payload, "corrections_text": corrections_search_text(payload["corrections"])}
+    return payload
+
+
+class SupabaseBackend(StorageBackend):
+    """`correction_history` table on Supabase (Postgres + JSONB)"""
+
+    name = "Supabase"
+
+    def __init__(self, url: str, key: str):
+        self.client: Client = create_client(url, key)
+
+    def insert(self, entry: dict) -> Optional[int]:
+        response = self.client.table(TABLE).insert(with_search_text(entry)).execute()
+        if response.data:
+            return response.data[0].get("id")
+        return None
+
+    def count(self) -> int:
+        response = self.client.table(TABLE).select("id", count="exact").limit(1).execute()
+        return response.count if hasattr(response, 'count') and response.count else 0
+
+    def list(self, limit: Optional[int] = None, offset: int = 0) -> list:
+        query = (
+            self.client.table(TABLE)
+            .select("*")
+            .order("created_at", desc=True)
+            .order("id", desc=True)
+        )
+        if limit is not None:
+            query = query.range(offset, offset + limit - 1)
+        elif offset:
+            query = query.range(offset, offset + 10**9)
+        response = query.execute()
+        return response.data if response.data else []
+
+    def get(self, record_id: int) -> Optional[dict]:
+        response = self.client.table(TABLE).select("*").eq("id", record_id).limit(1).execute()
+        return response.data[0] if response.data else None
+
+    def rename(self, record_id: int, new_name: str) -> None:
+        self.client.table(TABLE).update({"name": new_name}).eq("id", record_id).execute()
+
+    def update_payload(self, record_id: int, payload: dict) -> None:
+        self.client.table(TABLE).update(with_search_text(payload)).eq("id", record_id).execute()
+
+    def save_answer_key(self, key: str, standards: list) -> None:
+        self.client.table(ANSWER_KEY_TABLE).upsert(
+            {"key": key, "standards": standards},
+            on_conflict="key",
+            ignore_duplicates=True
+        ).execute()
+
+    def get_answer_keys(self, keys: list) -> dict:
+        if not keys:
+            return {}
+        response = self.client.table(ANSWER_KEY_TABLE).select("key, standards").in_("key", list(keys)).execute()
+        return {row["key"]: row["standards"] for row in response.data or []}
+
+    def increment_stats(self, increments: list) -> None:
+        if increments:
+            self.client.rpc(INCREMENT_STATS_FUNCTION, {"increments": increments}).execute()
+
+    def get_stats(self, dimension: str, order_by: str = "items", limit: Optional[int] = None) -> list:
+        query = (
+            self.client.table(STATS_TABLE)
+            .select("dimension, key, label, items, errors")
+            .eq("dimension", dimension)
+            .order(order_by, desc=order_by != "key")
+            .order("key")
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        response = query.execute()
+        return response.data if response.data else []
+
+    def set_stat_label(self, dimension: str, key: str, label: str) -> None:
+        self.client.table(STATS_TABLE).update({"label": label}).eq("dimension", dimension).eq("key", key).execute()
+
+    def reset_stats(self) -> None:
+        self.client.table(STATS_TABLE).delete().neq("dimension", "").execute()
+
+    def list_since(self, after_id: int, limit: int = 500) -> list:
+        response = (
+            self.client.table(TABLE)
+            .select("*")
+            .gt("id", after_id)
+            .order("id")
+            .limit(limit)
+            .execute()
+        )
+        return response.data if response.data else []
+
+    def list_ids(self, after_id: int = 0, limit: int = 1000) -> list:
+        response = self.client.table(TABLE).select("id").gt("id", after_id).order("id").limit(limit).execute()
+        return [row["id"] for row in response.data or []]
+
+    def list_modified_since(self, modified_at: str, after_id: int = 0, limit: int = 500) -> list:
+        response = (
+            self.client.table(TABLE)
+            .select("*")
+            .or_(f'modified_at.gt."{modified_at}",and(modified_at.eq."{modified_at}",id.gt.{after_id})')
+            .order("modified_at")
+            .order("id")
+            .limit(limit)
+            .execute()
+        )
+        return response.data if response.data else []
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> tuple:
+        response = self.client.rpc(
+            SEARCH_FUNCTION,
+            {"query": query, "page_limit": limit, "page_offset": offset}
+        ).execute()
+        rows = response.data or []
+        total = rows[0].get("total", len(rows)) if rows else 0
+        for row in rows:
+            row.pop("total", None)
+        return rows, total
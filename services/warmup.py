@@ -0,0 +1,102 @@
+"""
+Startup Warm-up
+背景預先載入 SDK 並建立連線（縮短冷啟動後第一次批改的等待）
+"""
+import hashlib
+import importlib
+import threading
+import time
+from typing import Optional
+
+from config.settings import Config
+
+
+# SDK modules deferred out of the first script run (import cost measured on Python 3.11)
+WARMUP_MODULES = (
+    "google.generativeai",  # ~0.6-0.8 s
+    "pdf2image",
+)
+
+_lock = threading.Lock()
+_started = set()
+_timings = {}
+_threads = []
+
+
+def _timed(task: str, func, *args):
+    start = time.perf_counter()
+    try:
+        func(*args)
+        _timings[task] = round(time.perf_counter() - start, 3)
+    except Exception as e:
+        # Warm-up is an optimization: the real call will surface the error
+        _timings[task] = f"failed: {type(e).__name__}"
+
+
+def _import_modules():
+    for module in WARMUP_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+
+def _connect_storage():
+    """Create the shared backend; for Supabase the first query opens the TLS connection"""
+    from services.database import _storage_location, get_storage_backend
+
+    kind = Config.STORAGE_BACKEND
+    backend = get_storage_backend(kind, _storage_location(kind))
+    if backend is not None and kind != "sqlite":
+        backend.count()
+
+
+def _connect_gemini(api_key: str):
+    """Open the generative client's channel of this API key (no process-wide key is set)"""
+    from services.model_provider import get_provider, using_api_key
+
+    with using_api_key(api_key):
+        get_provider().connect(Config.GEMINI_MODEL)
+
+
+def start_warmup(api_key: Optional[str] = None) -> None:
+    """
+    Run the warm-up tasks that have not run in this process yet, in a daemon thread
+
+    Call after the page has been painted: imports hold the GIL and would
+    otherwise compete with the script run.
+
+    Args:
+        api_key: Gemini API key (the Gemini connection is skipped without one)
+    """
+    tasks = [("imports", _import_modules, ()), ("storage", _connect_storage, ())]
+    key = api_key or Config.GOOGLE_API_KEY
+    if key and Config.MODEL_PROVIDER == "gemini":
+        fingerprint = hashlib.sha256(key.encode("utf-8")).hexdigest()[:8]
+        tasks.append((f"gemini:{fingerprint}", _connect_gemini, (key,)))
+
+    with _lock:
+        pending = [task for task in tasks if task[0] not in _started]
+        _started.update(task[0] for task in pending)
+
+    if not pending:
+        return
+
+    def run():
+        for task, func, args in pending:
+            _timed(task, func, *args)
+
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    _threads.append(thread)
+    thread.start()
+
+
+def wait_for_warmup(timeout: Optional[float] = None) -> None:
+    """Block until started warm-up tasks finish (benchmarks measure reruns, not warm-up)"""
+    for thread in list(_threads):
+        thread.join(timeout)
+
+
+def get_warmup_timings() -> dict:
+    """Seconds per finished warm-up task (Debug Mode)"""
+    return dict(_timings)
@@ -0,0 +1,36 @@
+"""
+Error Statistics Tests
+批改錯誤統計增量的測試
+"""
+from services.error_stats import build_stat_increments, diff_stat_increments, record_day
+
+
+CORRECTIONS = [
+    {"id": "1", "user": "I has a apple", "correction": "I have an apple", "feedback": ["冠詞錯誤"]},
+    {"id": "2", "user": "Good morning", "correction": "Good morning", "feedback": []},
+]
+
+
+def test_an_unknown_record_id_adds_no_record_counters():
+    increments = build_stat_increments(None, CORRECTIONS, "2026-10-19")
+    assert "record" not in {row["dimension"] for row in increments}
+    assert {"dimension": "day", "key": "2026-10-19", "label": None, "items": 2, "errors": 1} in increments
+
+
+def test_saving_and_regrading_count_the_same_day():
+    # Saved just before midnight UTC, committed (created_at) just after
+    saved = {"timestamp": "2026-10-19T23:59:59.900000+00:00", "corrections": CORRECTIONS}
+    stored = {**saved, "id": 5, "created_at": "2026-10-20T00:00:00.100+00:00"}
+    assert record_day(saved) == record_day(stored) == "2026-10-19"
+
+    regraded = [{**item, "correction": item["user"]} for item in CORRECTIONS]
+    day = record_day(stored)
+    diff = diff_stat_increments(
+        build_stat_increments(5, stored["corrections"], day),
+        build_stat_increments(5, regraded, day)
+    )
+    assert {row["key"] for row in diff if row["dimension"] == "day"} == {"2026-10-19"}
+
+
+def test_records_without_a_timestamp_fall_back_to_created_at():
+    assert record_day({"created_at": "2026-10-18T08:00:00+00:00"}) == "2026-10-18"
@@ -0,0 +1,38 @@
+"""
+File Index Tests
+模型端檔案索引依 API 金鑰分開的測試
+"""
+import time
+
+from services.file_handles import FileIndex, get_file_index
+from services.model_provider import FileHandle, StubProvider, set_provider, using_api_key
+
+
+def _handle(content_hash: str) -> FileHandle:
+    return FileHandle("files/1", "stub://files/1", "image/png", content_hash, time.time() + 86400)
+
+
+def test_persisted_handles_are_only_loaded_for_the_same_key(tmp_path):
+    path = str(tmp_path / "file_index.json")
+    provider = StubProvider()
+    index = FileIndex(provider, path, scope="key-a")
+    index._handles["hash"] = _handle("hash")
+    index._save()
+
+    assert "hash" in FileIndex(provider, path, scope="key-a")._handles
+    assert FileIndex(provider, path, scope="key-b")._handles == {}
+
+
+def test_each_api_key_gets_its_own_index():
+    set_provider(StubProvider())
+    try:
+        with using_api_key("key-a"):
+            first = get_file_index()
+            with using_api_key("key-b"):
+                second = get_file_index()
+            assert get_file_index() is first
+    finally:
+        set_provider(None)
+
+    assert second is not first
+    assert first.scope != second.scope
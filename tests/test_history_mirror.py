@@ -0,0 +1,70 @@
+"""
+History Mirror Tests
+本地歷史鏡像同步的測試
+"""
+from datetime import datetime, timedelta, timezone
+
+from services.history_mirror import HistoryMirror
+from services.sqlite_backend import SQLiteBackend, utc_now
+
+
+def _record(record_id: int, name: str) -> dict:
+    return {"id": record_id, "created_at": utc_now(), "name": name, "corrections": [], "transcriptions": []}
+
+
+def _names(mirror: HistoryMirror) -> dict:
+    return {record["id"]: record["name"] for record in mirror.store.list()}
+
+
+def test_a_lower_id_committed_late_is_picked_up_on_reconcile(tmp_path):
+    remote = SQLiteBackend(str(tmp_path / "remote.db"))
+    remote.upsert([_record(1, "first"), _record(3, "third")])
+    mirror = HistoryMirror(remote, str(tmp_path / "mirror.db"), reconcile_interval=3600)
+    mirror.sync(force=True)
+
+    remote.upsert([_record(2, "second")])
+    mirror.sync(force=True)
+    assert 2 not in _names(mirror)
+
+    mirror.reconcile_interval = 0
+    mirror.sync(force=True)
+    assert _names(mirror) == {1: "first", 2: "second", 3: "third"}
+
+
+def test_rows_deleted_remotely_are_removed(tmp_path):
+    remote = SQLiteBackend(str(tmp_path / "remote.db"))
+    remote.upsert([_record(1, "first"), _record(2, "second")])
+    mirror = HistoryMirror(remote, str(tmp_path / "mirror.db"), reconcile_interval=0)
+    mirror.sync(force=True)
+
+    remote.delete([1])
+    mirror.sync(force=True)
+    assert _names(mirror) == {2: "second"}
+    assert mirror.store.search("first")[1] == 0
+
+
+def test_an_update_committed_behind_the_watermark_is_pulled(tmp_path):
+    remote = SQLiteBackend(str(tmp_path / "remote.db"))
+    remote.upsert([_record(1, "first"), _record(2, "second")])
+    mirror = HistoryMirror(remote, str(tmp_path / "mirror.db"), reconcile_interval=3600)
+    remote.rename(2, "second renamed")
+    mirror.sync(force=True)
+
+    # Update whose transaction started before the one already mirrored
+    earlier = (datetime.now(timezone.utc) - timedelta(seconds=5)).isoformat(timespec='milliseconds')
+    remote.upsert([{**remote.get(1), "name": "first renamed", "modified_at": earlier}])
+    mirror.sync(force=True)
+    assert _names(mirror) == {1: "first renamed", 2: "second renamed"}
+
+
+def test_a_mirror_of_another_remote_starts_over(tmp_path):
+    path = str(tmp_path / "mirror.db")
+    old_remote = SQLiteBackend(str(tmp_path / "old.db"))
+    old_remote.upsert([_record(1, "old project")])
+    HistoryMirror(old_remote, path, location="https://old.supabase.co").sync(force=True)
+
+    new_remote = SQLiteBackend(str(tmp_path / "new.db"))
+    new_remote.upsert([_record(7, "new project")])
+    mirror = HistoryMirror(new_remote, path, location="https://new.supabase.co")
+    mirror.sync(force=True)
+    assert _names(mirror) == {7: "new project"}
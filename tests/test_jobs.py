@@ -0,0 +1,77 @@
+"""
+Job Runner Tests
+背景批改工作的測試
+"""
+import time
+
+import pytest
+from PIL import Image
+
+from services.jobs import DONE, FAILED, JobRunner, JobStore
+from services.model_provider import current_api_key
+from services.result_model import Corrections, Transcription
+from utils.page_cache import Page
+
+
+def _pipeline(user_images, answer_image, progress, token):
+    return {"transcription": Transcription.from_list([]), "correction": Corrections.from_list([]), "record_id": None}
+
+
+@pytest.fixture
+def runner(tmp_path):
+    return JobRunner(JobStore(str(tmp_path / "jobs.db")), str(tmp_path / "work"), 1, _pipeline, version="test")
+
+
+def _page(width: int = 10) -> Page:
+    return Page.from_image(Image.new("RGB", (width, 10), "white"))
+
+
+def _wait(runner, job_id: str, timeout: float = 5.0) -> dict:
+    deadline = time.time() + timeout
+    while runner.store.get(job_id)["status"] != DONE and time.time() < deadline:
+        time.sleep(0.05)
+    return runner.store.get(job_id)
+
+
+def test_failed_page_copy_fails_the_job_and_releases_the_flight(runner, monkeypatch):
+    page = _page()
+
+    def broken_copy(self, path):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(Page, "copy_to", broken_copy)
+    with pytest.raises(OSError):
+        runner.submit("owner", [page], page)
+
+    assert runner._in_flight == {}
+    jobs = runner.store.list_for_owner("owner")
+    assert [job["status"] for job in jobs] == [FAILED]
+    assert "No space left on device" in jobs[0]["error"]
+
+    # The same pages start a new run instead of joining the failed one
+    monkeypatch.undo()
+    job_id = runner.submit("owner", [page], page)
+    assert job_id != jobs[0]["id"]
+    assert _wait(runner, job_id)["status"] == DONE
+
+
+def test_the_pipeline_runs_with_the_submitters_api_key(tmp_path):
+    keys = []
+
+    def pipeline(user_images, answer_image, progress, token):
+        keys.append(current_api_key())
+        return _pipeline(user_images, answer_image, progress, token)
+
+    runner = JobRunner(JobStore(str(tmp_path / "jobs.db")), str(tmp_path / "work"), 2, pipeline, version="test")
+    first = runner.submit("owner-a", [_page(10)], _page(10), api_key="key-a")
+    second = runner.submit("owner-b", [_page(12)], _page(12), api_key="key-b")
+
+    assert _wait(runner, first)["status"] == DONE
+    assert _wait(runner, second)["status"] == DONE
+    assert sorted(keys) == ["key-a", "key-b"]
+
+
+def test_identical_pages_only_coalesce_under_the_same_api_key(runner):
+    page = _page()
+    assert runner.input_key([page], page, "key-a") == runner.input_key([page], page, "key-a")
+    assert runner.input_key([page], page, "key-a") != runner.input_key([page], page, "key-b")
@@ -0,0 +1,59 @@
+"""
+Payload Codec Tests
+批改記錄儲存格式的測試
+"""
+from services.payload_codec import (
+    COMPRESSION_CODEC,
+    build_answer_key,
+    corrections_search_text,
+    decode_transcriptions,
+    encode_corrections,
+    encode_transcriptions
+)
+from services.supabase_backend import with_search_text
+
+
+CORRECTIONS = [
+    {"id": str(idx), "user": f"I has {idx} apple", "correction": f"I have {idx} apples", "feedback": ["subject-verb"]}
+    for idx in range(200)
+]
+
+
+def test_compressed_corrections_are_an_object():
+    stored = encode_corrections(CORRECTIONS, compress=True, min_bytes=1)
+    assert isinstance(stored, dict)
+    assert stored["codec"] == COMPRESSION_CODEC
+    assert set(stored) == {"codec", "data"}
+
+
+def test_compressed_payload_carries_search_text():
+    stored = encode_corrections(CORRECTIONS, compress=True, min_bytes=1)
+    payload = with_search_text({"name": "Unit 3", "corrections": stored})
+    assert payload["corrections_text"] == corrections_search_text(CORRECTIONS)
+    assert "I have 199 apples" in payload["corrections_text"]
+    assert "subject-verb" in payload["corrections_text"]
+
+
+def test_plain_payload_is_indexed_by_the_trigger():
+    payload = {"name": "Unit 3", "corrections": CORRECTIONS}
+    assert with_search_text(payload) is payload
+
+
+TRANSCRIPTION = [
+    {"id": str(idx), "user": f"I has {idx} apple", "standard": f"I have {idx} apples"}
+    for idx in range(3)
+]
+
+
+def test_standards_are_restored_by_id_not_position():
+    answer_key, standards = build_answer_key(TRANSCRIPTION)
+    stored = encode_transcriptions(TRANSCRIPTION, CORRECTIONS, answer_key)
+    reordered = [standards[2], standards[0], standards[1]]
+    assert decode_transcriptions(stored, CORRECTIONS, reordered) == TRANSCRIPTION
+
+
+def test_a_missing_standard_is_left_empty():
+    answer_key, standards = build_answer_key(TRANSCRIPTION)
+    stored = encode_transcriptions(TRANSCRIPTION, CORRECTIONS, answer_key)
+    decoded = decode_transcriptions(stored, CORRECTIONS, [standards[0], standards[2]])
+    assert [item["standard"] for item in decoded] == ["I have 0 apples", "", "I have 2 apples"]
@@ -0,0 +1,39 @@
+"""
+Prompt Cache Tests
+模型端提示詞快取依 API 金鑰分開的測試
+"""
+from services.model_provider import StubProvider, set_provider, using_api_key
+from services.prompt_cache import get_prompt_cache
+
+
+def test_a_cached_prefix_is_not_reused_with_another_key():
+    provider = StubProvider()
+    set_provider(provider)
+    prefix = ["Grade the answers against the standard. " * 200]
+    try:
+        with using_api_key("key-a"):
+            get_prompt_cache().generate("model", prefix, ["first"])
+            get_prompt_cache().generate("model", prefix, ["second"])
+        with using_api_key("key-b"):
+            get_prompt_cache().generate("model", prefix, ["third"])
+    finally:
+        set_provider(None)
+
+    first, second, third = [call["cache"] for call in provider.calls]
+    assert first is not None and second == first
+    assert third is not None and third != first
+
+
+def test_the_cache_follows_the_key_of_the_calling_context():
+    set_provider(StubProvider())
+    try:
+        with using_api_key("key-a"):
+            first = get_prompt_cache()
+            with using_api_key("key-b"):
+                second = get_prompt_cache()
+            assert get_prompt_cache() is first
+    finally:
+        set_provider(None)
+
+    assert second is not first
+    assert first.scope != second.scope
@@ -0,0 +1,22 @@
+"""
+Result Model Tests
+模型回覆 JSON 解析與修復的測試
+"""
+import pytest
+
+from services.result_model import ResultError, parse_items
+
+
+def test_an_empty_array_parses():
+    assert parse_items("[]") == []
+    assert parse_items("```json\n[ ]\n```") == []
+
+
+@pytest.mark.parametrize("text", ["[", "[   \n", '[{"id": 1, "text": "unfinished'])
+def test_a_truncated_answer_with_nothing_salvaged_is_an_error(text):
+    with pytest.raises(ResultError):
+        parse_items(text)
+
+
+def test_complete_items_are_salvaged_from_a_truncated_answer():
+    assert parse_items('[{"id": 1}, {"id": 2}, {"id": 3, "te') == [{"id": 1}, {"id": 2}]
@@ -0,0 +1,252 @@
+"""
+Theme Asset Builder
+編譯主題樣式表並自架字型（static/ 由 Streamlit 靜態服務提供）
+
+Usage:
+    python -m ui.build_theme            # minify ui/theme.css into static/theme.min.css
+    python -m ui.build_theme --fonts    # also download and subset the web fonts (needs network)
+    python -m ui.build_theme --fonts-from DIR [DIR ...]   # or subset local TTF/OTF files (e.g. OFL font packages)
+"""
+import argparse
+import json
+import re
+import shutil
+import sys
+import urllib.request
+from pathlib import Path
+
+from ui.theme import GOOGLE_FONTS_CSS, STATIC_DIR, THEME_SOURCE, THEME_STYLESHEET
+
+try:
+    from fontTools import subset as font_subset
+    from fontTools.ttLib import TTFont
+    from fontTools.varLib import instancer
+    SUBSET_SUPPORT = True
+except ImportError:
+    SUBSET_SUPPORT = False
+
+
+FONTS_DIR = STATIC_DIR / "fonts"
+FONT_MANIFEST = FONTS_DIR / "fonts.json"
+
+# Google Fonts only returns woff2 with unicode-range subsets to modern browsers
+BROWSER_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36"
+
+# Latin text only: Chinese feedback falls back to system fonts
+FONT_SUBSET = "latin"
+SUBSET_UNICODES = "U+0000-00FF,U+0131,U+0152-0153,U+02C6,U+02DA,U+02DC,U+2000-206F,U+20AC,U+2122,U+2190-2193"
+
+# Faces the theme uses (as requested from Google Fonts): family -> style -> (min, max) weight
+THEME_FACES = {
+    "Cormorant Garamond": {"normal": (300, 600), "italic": (400, 400)},
+    "Space Mono": {"normal": (400, 700), "italic": (400, 400)},
+    "Tangerine": {"normal": (400, 700)},
+    "Inter": {"normal": (300, 600)},
+}
+
+_FONT_FACE = re.compile(r"/\*\s*([\w-]+)\s*\*/\s*@font-face\s*\{([^}]*)\}")
+_DECLARATION = re.compile(r"([\w-]+)\s*:\s*([^;]+);")
+_SOURCE_URL = re.compile(r"url\(([^)]+)\)")
+
+
+def minify_css(css: str) -> str:
+    """
+    Strip comments and insignificant whitespace
+
+    Spaces inside selectors (descendant combinators) and values such as
+    `calc(a + b)` are kept; only whitespace around punctuation is removed.
+    """
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    css = css.replace(";}", "}")
+    return css.strip()
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def download_fonts() -> list:
+    """
+    Fetch the latin subset of the theme fonts, subset them further and write the manifest
+
+    Returns:
+        Manifest entries ({family, style, weight, file})
+
+    Raises:
+        OSError: If Google Fonts cannot be reached
+    """
+    request = urllib.request.Request(GOOGLE_FONTS_CSS, headers={"User-Agent": BROWSER_USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        stylesheet = response.read().decode("utf-8")
+
+    FONTS_DIR.mkdir(parents=True, exist_ok=True)
+    files_by_url = {}
+    manifest = []
+
+    for subset_name, body in _FONT_FACE.findall(stylesheet):
+        if subset_name != FONT_SUBSET:
+            continue
+        declarations = dict(_DECLARATION.findall(body))
+        family = declarations["font-family"].strip("'\" ")
+        style = declarations.get("font-style", "normal").strip()
+        weight = declarations.get("font-weight", "400").strip()
+        url = _SOURCE_URL.search(declarations["src"]).group(1).strip("'\"")
+
+        # Variable fonts: several weights share one file
+        if url not in files_by_url:
+            filename = f"{_slug(family)}-{style}-{_slug(weight)}.woff2"
+            with urllib.request.urlopen(url, timeout=30) as response:
+                (FONTS_DIR / filename).write_bytes(response.read())
+            if SUBSET_SUPPORT:
+                _subset_font(FONTS_DIR / filename)
+            files_by_url[url] = filename
+
+        manifest.append({"family": family, "style": style, "weight": weight, "file": files_by_url[url]})
+
+    FONT_MANIFEST.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    return manifest
+
+
+def import_fonts(directories: list) -> list:
+    """
+    Subset local font files into static/fonts/ and write the manifest
+
+    Only the families, styles and weights in THEME_FACES are kept; variable
+    fonts are limited to the weight range the theme uses. License files
+    (OFL.txt / LICENSE) next to a font, or one level up, are copied along.
+
+    Args:
+        directories: Directories searched recursively for .ttf / .otf files
+
+    Returns:
+        Manifest entries ({family, style, weight, file})
+
+    Raises:
+        RuntimeError: If fonttools is not installed
+    """
+    if not SUBSET_SUPPORT:
+        raise RuntimeError("fonttools is not installed")
+
+    FONTS_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = []
+    paths = sorted(path for directory in directories for pattern in ("*.ttf", "*.otf")
+                   for path in Path(directory).rglob(pattern))
+    for path in paths:
+        font = TTFont(path)
+        family = font["name"].getDebugName(16) or font["name"].getDebugName(1)
+        style = "italic" if font["post"].italicAngle else "normal"
+        weights = THEME_FACES.get(family, {}).get(style)
+        if weights is None:
+            continue
+
+        if "fvar" not in font:
+            weight = str(font["OS/2"].usWeightClass)
+            if not weights[0] <= int(weight) <= weights[1]:
+                continue
+
+        options = font_subset.Options()
+        options.layout_features = ["*"]
+        subsetter = font_subset.Subsetter(options)
+        subsetter.populate(unicodes=font_subset.parse_unicodes(SUBSET_UNICODES))
+        subsetter.subset(font)
+
+        if "fvar" in font:
+            # Keep only the theme's weight range; other axes (e.g. optical size) at their default
+            limits = {
+                axis.axisTag: (weights if weights[0] != weights[1] else weights[0]) if axis.axisTag == "wght" else None
+                for axis in font["fvar"].axes
+            }
+            font = instancer.instantiateVariableFont(font, limits)
+            weight = f"{weights[0]} {weights[1]}" if weights[0] != weights[1] else str(weights[0])
+
+        filename = f"{_slug(family)}-{style}-{_slug(weight)}.woff2"
+        font.flavor = "woff2"
+        font.save(FONTS_DIR / filename)
+        manifest.append({"family": family, "style": style, "weight": weight, "file": filename})
+
+        for folder in (path.parent, path.parent.parent):
+            license_file = next((folder / name for name in ("OFL.txt", "LICENSE") if (folder / name).exists()), None)
+            if license_file is not None:
+                shutil.copyfile(license_file, FONTS_DIR / f"{_slug(family)}-OFL.txt")
+                break
+
+    FONT_MANIFEST.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    return manifest
+
+
+def _subset_font(path: Path) -> None:
+    """Drop glyphs outside SUBSET_UNICODES (keeps layout features and variations)"""
+    font_subset.main([
+        str(path),
+        f"--unicodes={SUBSET_UNICODES}",
+        "--flavor=woff2",
+        "--layout-features=*",
+        f"--output-file={path}",
+    ])
+
+
+def font_face_rules(manifest: list) -> str:
+    """@font-face rules for the self-hosted fonts (URLs relative to the stylesheet)"""
+    return "".join(
+        "@font-face{"
+        f"font-family:'{entry['family']}';font-style:{entry['style']};font-weight:{entry['weight']};"
+        f"font-display:swap;src:url(fonts/{entry['file']}) format('woff2')"
+        "}"
+        for entry in manifest
+    )
+
+
+def build_stylesheet() -> Path:
+    """
+    Compile ui/theme.css into the served stylesheet
+
+    Uses the self-hosted fonts when their manifest exists, otherwise keeps
+    the Google Fonts import so the theme still renders correctly.
+
+    Returns:
+        Path of the written stylesheet
+    """
+    if FONT_MANIFEST.exists():
+        fonts = font_face_rules(json.loads(FONT_MANIFEST.read_text(encoding="utf-8")))
+    else:
+        print("No self-hosted fonts (run with --fonts); keeping the Google Fonts import", file=sys.stderr)
+        fonts = f"@import url('{GOOGLE_FONTS_CSS}');"
+
+    output = STATIC_DIR / THEME_STYLESHEET
+    STATIC_DIR.mkdir(parents=True, exist_ok=True)
+    output.write_text(fonts + minify_css(THEME_SOURCE.read_text(encoding="utf-8")) + "\n", encoding="utf-8")
+    return output
+
+
+def main(argv=None) -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Build the static theme assets")
+    parser.add_argument("--fonts", action="store_true", help="Download and subset the web fonts first")
+    parser.add_argument("--fonts-from", nargs="+", metavar="DIR", help="Subset local font files instead")
+    args = parser.parse_args(argv)
+
+    if args.fonts_from:
+        try:
+            manifest = import_fonts(args.fonts_from)
+        except (OSError, RuntimeError) as e:
+            print(f"Font import failed: {e}", file=sys.stderr)
+            return 1
+        print(f"Wrote {len(manifest)} font faces to {FONTS_DIR}", file=sys.stderr)
+    elif args.fonts:
+        try:
+            manifest = download_fonts()
+        except OSError as e:
+            print(f"Font download failed: {e}", file=sys.stderr)
+            return 1
+        print(f"Wrote {len(manifest)} font faces to {FONTS_DIR}", file=sys.stderr)
+
+    output = build_stylesheet()
+    print(f"Wrote {output} ({output.stat().st_size} bytes)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,14 +5,15 @@ UI Components
 import streamlit as st
 import streamlit.components.v1 as components
 import json
-import csv
-import io
-import textwrap
+import hashlib
+import html
+import os
+import tempfile
 from typing import Optional, List
-from uuid import uuid4
-from PIL import Image
 
 from config.settings import Config
+from services.result_model import CorrectionItem, Corrections, Transcription
+from utils.page_cache import Page
 
 
 
@@ -20,90 +21,69 @@ def clean_html(html: str) -> str:
     """Clean HTML string by removing all indentation line by line."""
     return "\n".join(line.strip() for line in html.split("\n") if line.strip())
 
-def render_copy_json_button(json_text: str, label: str = "COPY 批改 JSON") -> None:
-    """Render a clipboard button for copying formatted JSON."""
-    if not json_text:
+# Registered once per process; the iframe's HTML/CSS/JS is a static, browser-cached file
+_copy_button_component = components.declare_component(
+    "copy_button",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "copy_button")
+)
+
+
+def render_copy_json_button(data, label: str = "COPY 批改 JSON", key: str = "copy_json") -> None:
+    """
+    Render a clipboard button for copying JSON
+
+    The payload is sent once as compact UTF-8 JSON bytes (a binary argument,
+    so Chinese text is not escaped) and pretty-printed in the browser. A
+    stable key keeps the same iframe mounted across reruns.
+
+    Args:
+        data: JSON-serializable data, or an already serialized JSON string
+        label: Button label
+        key: Widget key (must be unique on the page)
+    """
+    if not data:
         return
 
-    button_id = f"copy-json-btn-{uuid4().hex}"
-    safe_json_payload = json.dumps(json_text).replace("</", "<\\/")
-    components.html(
-        f"""
-        <style>
-            body {{
-                margin: 0;
-                background: transparent;
-                font-family: 'Space Mono', monospace;
-            }}
-            #{button_id} {{
-                background: rgba(255,255,255,0.02);
-                border: 1px solid #333;
-                color: #f5f5f5;
-                font-size: 0.72rem;
-                letter-spacing: 0.18em;
-                text-transform: uppercase;
-                padding: 0.65rem 1.75rem;
-                cursor: pointer;
-                transition: all 0.2s ease;
-            }}
-            #{button_id}:hover {{
-                border-color: #666;
-                color: #ffffff;
-            }}
-            #{button_id}.copied {{
-                border-color: #2ecc71;
-                color: #2ecc71;
-            }}
-            #{button_id}.error {{
-                border-color: #ff6b6b;
-                color: #ff6b6b;
-            }}
-        </style>
-        <div style="display:flex; justify-content:flex-end; margin:-12px 0 20px 0;">
-            <button id="{button_id}">{label}</button>
-        </div>
-        <script>
-            (function() {{
-                const copyBtn = document.getElementById('{button_id}');
-                const payload = {safe_json_payload};
-                if (!copyBtn || !payload) return;
-                const defaultText = copyBtn.textContent;
-
-                copyBtn.addEventListener('click', async () => {{
-                    try {{
-                        await navigator.clipboard.writeText(payload);
-                        copyBtn.textContent = 'COPIED!';
-                        copyBtn.classList.remove('error');
-                        copyBtn.classList.add('copied');
-                    }} catch (err) {{
-                        copyBtn.textContent = 'COPY FAILED';
-                        copyBtn.classList.remove('copied');
-                        copyBtn.classList.add('error');
-                    }} finally {{
-                        setTimeout(() => {{
-                            copyBtn.textContent = defaultText;
-                            copyBtn.classList.remove('copied');
-                            copyBtn.classList.remove('error');
-                        }}, 1800);
-                    }}
-                }});
-            }})();
-        </script>
-        """,
-        height=70,
-    )
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    _copy_button_component(payload=payload.encode("utf-8"), label=label, key=key, default=None)
+
+
+def get_page_cache():
+    """The session's page cache (created on first use)"""
+    from utils.page_cache import SessionPageCache
+
+    if 'page_cache' not in st.session_state:
+        st.session_state.page_cache = SessionPageCache(
+            Config.SESSION_MEMORY_BUDGET_MB * 1024 * 1024, raw=Config.PAGE_STORE_RAW
+        )
+    return st.session_state.page_cache
 
 
-def render_file_upload_section() -> tuple[Optional[List[Image.Image]], Optional[Image.Image]]:
+def release_uploads():
+    """
+    Free the session's pages and uploaded files after a finished analysis
+
+    The uploaders get new keys on the next run, so Streamlit drops the
+    files they were holding.
+    """
+    get_page_cache().clear()
+    st.session_state.pop('page_selection', None)
+    st.session_state.upload_generation = st.session_state.get('upload_generation', 0) + 1
+
+
+def render_file_upload_section() -> tuple[Optional[List[Page]], Optional[Page]]:
     """
     Render file upload section for user handwriting and standard answer
     Supports images (PNG, JPG, JPEG) and PDF files
     Standard answer: If multiple files uploaded, they will be stitched vertically
 
+    Files are converted once per session and kept as encoded pages
+    (utils.page_cache.Page); call page.open() to decode.
+
     Returns:
-        Tuple of (user_images, answer_image) or (None, None) if not uploaded
+        Tuple of (user_pages, answer_page) or (None, None) if not uploaded
     """
-    from utils.file_converter import convert_files_to_images, is_pdf_supported, stitch_images_vertically
+    from utils.file_converter import AdaptiveDpi, convert_files_to_pages, is_pdf_supported, stitch_pages_vertically
 
     st.markdown('<div class="minimal-container">', unsafe_allow_html=True)
 
@@ -115,6 +95,7 @@ def render_file_upload_section() -> tuple[Optional[List[Image.Image]], Optional[
         st.info("PDF support not enabled. Install: pip install pdf2image && brew install poppler")
 
     col1, col2 = st.columns(2)
+    generation = st.session_state.get('upload_generation', 0)
 
     user_files = None
     answer_files = None
@@ -125,7 +106,8 @@ def render_file_upload_section() -> tuple[Optional[List[Image.Image]], Optional[
             "Upload images or PDF",
             type=supported_types,
             accept_multiple_files=True,
-            label_visibility="collapsed"
+            label_visibility="collapsed",
+            key=f"user_uploader_{generation}"
         )
 
     with col2:
@@ -135,24 +117,38 @@ def render_file_upload_section() -> tuple[Optional[List[Image.Image]], Optional[
             type=supported_types,
             accept_multiple_files=True,
             label_visibility="collapsed",
-            key="answer_uploader"
+            key=f"answer_uploader_{generation}"
         )
 
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown("<br>", unsafe_allow_html=True)
 
-    # Convert files to PIL Images
+    cache = get_page_cache()
+    uploaded = list(user_files or []) + list(answer_files or [])
+    stitch_key = "stitched:" + "|".join(f.file_id for f in answer_files or [])
+    cache.retain({f.file_id for f in uploaded} | {stitch_key})
+    st.session_state.upload_bytes = sum(f.size for f in uploaded)
+    st.session_state.upload_label = ", ".join(f.name for f in user_files or [])
+
+    # Convert files to pages
     if user_files and answer_files:
         try:
-            user_images = convert_files_to_images(user_files)
-            answer_images = convert_files_to_images(answer_files)
-
-            # Stitch answer images if multiple
-            if len(answer_images) > 1:
-                answer_image = stitch_images_vertically(answer_images)
-                st.info(f"✓ Stitched {len(answer_images)} answer images vertically")
-            else:
-                answer_image = answer_images[0]
+            adaptive = AdaptiveDpi(
+                Config.PDF_PREVIEW_DPI, Config.PDF_MIN_DPI, Config.PDF_MAX_DPI, Config.PDF_TEXT_LINE_PX
+            ) if Config.PDF_ADAPTIVE_DPI else None
+            user_groups = [(f.name, convert_files_to_pages([f], cache, Config.PDF_DPI, adaptive)) for f in user_files]
+            answer_groups = [
+                (f.name, convert_files_to_pages([f], cache, Config.PDF_DPI, adaptive)) for f in answer_files
+            ]
+            user_pages = [page for _, pages in user_groups for page in pages]
+            answer_pages = [page for _, pages in answer_groups for page in pages]
+            if Config.PAGE_ANALYSIS:
+                user_pages = _select_user_pages(user_groups, tuple(f.file_id for f in user_files), generation)
+
+            # Stitch answer pages if multiple
+            answer_page = stitch_pages_vertically(answer_pages, cache, stitch_key)
+            if len(answer_pages) > 1:
+                st.info(f"✓ Stitched {len(answer_pages)} answer images vertically")
 
             # Show PDF conversion info if needed
             pdf_count = sum(1 for f in user_files if f.type == 'application/pdf')
@@ -160,11 +156,12 @@ def render_file_upload_section() -> tuple[Optional[List[Image.Image]], Optional[
 
             if pdf_count > 0 or answer_pdf_count > 0:
                 st.info(
-                    f"✓ PDF converted: {len(user_images)} user images, "
-                    f"{len(answer_images)} answer images"
+                    f"✓ PDF converted: {len(user_pages)} user images, "
+                    f"{len(answer_pages)} answer images"
                 )
+                _render_pdf_resolution(user_groups + answer_groups)
 
-            return user_images, answer_image
+            return user_pages, answer_page
 
         except Exception as e:
             st.error(f"File conversion failed: {str(e)}")
@@ -173,6 +170,233 @@ def render_file_upload_section() -> tuple[Optional[List[Image.Image]], Optional[
     return None, None
 
 
+def _render_pdf_resolution(groups: list):
+    """List the DPI each adaptively rasterized PDF page got, and what it saved"""
+    rows = [
+        (f"{name} p{number}" if len(pages) > 1 else name, page.render)
+        for name, pages in groups
+        for number, page in enumerate(pages, 1)
+        if page.render is not None
+    ]
+    if not rows:
+        return
+
+    def saving(seconds: float, nbytes: int) -> str:
+        return (
+            f"~{abs(seconds):.2f} s {'saved' if seconds >= 0 else 'extra'}, "
+            f"~{abs(nbytes) / 1024:,.0f} KB {'saved' if nbytes >= 0 else 'extra'}"
+        )
+
+    dpis = [info.dpi for _, info in rows]
+    with st.expander(
+        f"Page resolution: {min(dpis)}-{max(dpis)} DPI "
+        f"({saving(sum(info.saved_seconds for _, info in rows), sum(info.saved_bytes for _, info in rows))} "
+        f"vs {rows[0][1].fixed_dpi} DPI)"
+    ):
+        st.markdown("\n".join(
+            f"- {label}: {info.dpi} DPI, {info.nbytes / 1024:,.0f} KB ({saving(info.saved_seconds, info.saved_bytes)})"
+            for label, info in rows
+        ))
+
+
+def _select_user_pages(groups: list, files_key: tuple, generation: int) -> List[Page]:
+    """
+    Leave blank pages and duplicate rescans out of the handwriting pages
+
+    The selection is kept in the session for the current set of files, and
+    the skipped pages are listed with a checkbox to send them anyway.
+
+    Args:
+        groups: (file name, pages) per uploaded file
+        files_key: File ids of the upload (keys the stored selection)
+        generation: Upload generation (keys the override checkbox)
+
+    Returns:
+        Pages to send to the model
+    """
+    from utils.page_analysis import select_pages
+
+    all_pages = [page for _, pages in groups for page in pages]
+    selection = st.session_state.get('page_selection')
+    if selection is None or selection[0] != files_key:
+        kept, skipped = select_pages(groups, Config.PAGE_BLANK_INK_RATIO, Config.PAGE_DUPLICATE_CANDIDATE_BITS)
+        selection = (files_key, kept, skipped)
+        st.session_state.page_selection = selection
+    _, kept, skipped = selection
+
+    if not skipped:
+        return kept
+    st.warning(
+        f"Skipped {len(skipped)} of {len(all_pages)} pages: "
+        + ", ".join(page.describe() for page in skipped)
+    )
+    if st.checkbox("Keep skipped pages", key=f"keep_skipped_{generation}"):
+        return all_pages
+    return kept
+
+
+def render_memory_usage():
+    """Debug Mode: memory held by this session's pages and uploaded files"""
+    usage = get_page_cache().usage()
+    mb = 1024 * 1024
+    st.sidebar.caption(
+        f"Session memory: {usage['pages']} pages, "
+        f"{usage['memory'] / mb:.1f} MB in memory (budget {Config.SESSION_MEMORY_BUDGET_MB} MB), "
+        f"{usage['spilled'] / mb:.1f} MB on disk, "
+        f"{st.session_state.get('upload_bytes', 0) / mb:.1f} MB upload buffers"
+    )
+
+
+def render_coalescing_stats(runner):
+    """Debug Mode: identical submissions that shared an in-flight pipeline"""
+    stats = runner.coalescing_stats()
+    st.sidebar.caption(
+        f"Coalescing: {stats['submitted']} submitted, {stats['started']} pipelines run, "
+        f"{stats['joined']} joined, {stats['repeated']} repeated, {stats['cancelled']} cancelled, "
+        f"{stats['in_flight']} in flight"
+    )
+
+
+def render_tier_stats():
+    """Debug Mode: correction calls per model tier (latency, estimated cost, escalations)"""
+    from services.model_router import get_tier_stats
+
+    for tier, stats in get_tier_stats().items():
+        if not stats['calls']:
+            continue
+        line = (
+            f"{tier.capitalize()} tier: {stats['items']} items in {stats['calls']} calls "
+            f"({stats['failures']} failed), {stats['avg_seconds']:.1f}s per call, ${stats['cost']:.4f}"
+        )
+        if stats['escalated']:
+            line += f", {stats['escalated']} escalated ({stats['escalation_rate']:.0%})"
+        st.sidebar.caption(line)
+
+
+def render_prompt_cache_stats():
+    """Debug Mode: input served from cached prompt prefixes and the latency of cached vs inline calls"""
+    from services.prompt_cache import get_prompt_cache
+
+    stats = get_prompt_cache().stats()
+    if not stats['calls']:
+        return
+    st.sidebar.caption(
+        f"Prompt cache: {stats['cached_calls']}/{stats['calls']} calls cached, "
+        f"{stats['cached_tokens']:,}/{stats['input_tokens']:,} input tokens ({stats['token_savings']:.0%}) from cache, "
+        f"{stats['cached_avg_seconds']:.1f}s vs {stats['inline_avg_seconds']:.1f}s inline, "
+        f"{stats['live']} live ({stats['created']} created, {stats['refreshed']} refreshed, "
+        f"{stats['recreated']} expired, {stats['refused']} refused)"
+    )
+
+
+def render_file_handle_stats():
+    """Debug Mode: page images uploaded once and referenced by later calls"""
+    from services.file_handles import get_file_index
+
+    stats = get_file_index().stats()
+    if not (stats['uploads'] or stats['reused'] or stats['inline']):
+        return
+    mb = 1024 * 1024
+    st.sidebar.caption(
+        f"Files: {stats['uploads']} uploaded ({stats['uploaded_bytes'] / mb:.1f} MB), "
+        f"{stats['reused']} reused ({stats['reused_bytes'] / mb:.1f} MB not resent), "
+        f"{stats['expired'] + stats['missing']} re-uploaded, {stats['inline']} sent inline"
+    )
+
+
+def render_repair_stats():
+    """Debug Mode: malformed model answers repaired locally instead of failing the run"""
+    from services.result_model import get_repair_stats
+
+    stats = get_repair_stats()
+    if not (stats['repaired'] or stats['salvaged'] or stats['regenerated_items']):
+        return
+    st.sidebar.caption(
+        f"JSON repair: {stats['parsed']} clean, {stats['repaired']} repaired, "
+        f"{stats['salvaged']} salvaged ({stats['salvaged_items']} items kept, {stats['dropped_items']} dropped), "
+        f"{stats['recovered_items']}/{stats['regenerated_items']} missing items regenerated"
+    )
+
+
+def _open_job_report(job_id: str):
+    """Button callback: show a finished job's report"""
+    st.session_state.job_report_id = job_id
+
+
+def _cancel_job(runner, job_id: str):
+    """Button callback: cancel a queued or running job"""
+    runner.cancel(job_id, "Cancelled by user")
+
+
+def _render_job_rows(runner, owner: str, debug_mode: bool = False, polling: bool = False):
+    """Job list body; when polling, a full rerun is triggered once every job has ended"""
+    from services.jobs import ACTIVE_STATUSES, CANCELLED, DONE, FAILED, JOINED_MESSAGE
+
+    jobs = runner.store.list_for_owner(owner, Config.JOB_LIST_LIMIT)
+
+    st.markdown("### Jobs")
+    for job in jobs:
+        col_info, col_action = st.columns([4, 1])
+        with col_info:
+            # The label comes from the upload: escaped before it goes into HTML
+            label = html.escape(job['label'] or "Worksheet")
+            st.markdown(f"**{label}** &nbsp; <span style='font-family:Space Mono; font-size:0.75rem'>{job['created_at'][:16].replace('T', ' ')} UTC</span>", unsafe_allow_html=True)
+            if job['status'] in ACTIVE_STATUSES:
+                st.progress(job['progress'] or 0.0, text=job['message'] or "Queued")
+            elif job['leader_id'] and job['status'] == DONE:
+                st.caption(f"{JOINED_MESSAGE} {job['leader_id']}: shared result")
+            elif job['status'] == FAILED:
+                st.error(job['error'] or "Job failed")
+                if debug_mode and job['error_detail']:
+                    st.code(job['error_detail'], language='python')
+            elif job['status'] == CANCELLED:
+                st.caption(job['message'] or "Cancelled")
+        with col_action:
+            if job['status'] in ACTIVE_STATUSES:
+                st.button(
+                    "CANCEL",
+                    key=f"job_cancel_{job['id']}",
+                    use_container_width=True,
+                    on_click=_cancel_job,
+                    args=(runner, job['id'])
+                )
+            elif job['status'] == DONE:
+                st.button(
+                    "VIEW REPORT",
+                    key=f"job_view_{job['id']}",
+                    use_container_width=True,
+                    on_click=_open_job_report,
+                    args=(job['id'],)
+                )
+
+    if polling and not any(job['status'] in ACTIVE_STATUSES for job in jobs):
+        st.rerun()
+
+
+def render_job_list(runner, owner: str, debug_mode: bool = False):
+    """
+    Render this client's recent correction jobs
+
+    While a job is queued or running the list is a fragment that refreshes
+    itself every Config.JOB_POLL_SECONDS, without rerunning the page.
+
+    Args:
+        runner: services.jobs.JobRunner
+        owner: Client id (services.jobs.get_client_id)
+        debug_mode: Show error tracebacks
+    """
+    from services.jobs import ACTIVE_STATUSES
+
+    jobs = runner.store.list_for_owner(owner, Config.JOB_LIST_LIMIT)
+    if not jobs:
+        return
+
+    if any(job['status'] in ACTIVE_STATUSES for job in jobs):
+        st.fragment(_render_job_rows, run_every=Config.JOB_POLL_SECONDS)(runner, owner, debug_mode, polling=True)
+    else:
+        _render_job_rows(runner, owner, debug_mode)
+
+
 def render_sidebar_settings() -> tuple[Optional[str], bool]:
     """
     Render sidebar settings (API key input, debug mode)
@@ -192,14 +416,53 @@ def render_sidebar_settings() -> tuple[Optional[str], bool]:
     return api_key, debug_mode
 
 
-def render_correction_results(transcription_data=None, correction_data=None, show_title: bool = True):
+def render_correction_card(item: CorrectionItem, question_id: str, standard_text: str) -> str:
+    """
+    Build the compact, class-based HTML of one correction card
+
+    Args:
+        item: Agent 2 item
+        question_id: Displayed question id
+        standard_text: Standard answer for this item
+
+    Returns:
+        HTML string (styles come from the .cc-* rules in ui/theme.py)
+    """
+    points = "".join(
+        f'<div class="cc-point"><span class="cc-mark">›</span><span class="cc-note">{point}</span></div>'
+        for point in item.feedback
+    )
+
+    return (
+        f'<div class="correction-card-sharp">'
+        f'<div class="cc-head"><h3>ANALYSIS {question_id}</h3><div class="cc-badge">AUTO-CORRECTED</div></div>'
+        f'<div class="cc-body">'
+        f'<div class="cc-grid">'
+        f'<div><div class="cc-label">Original Input</div><div class="cc-text">{item.user}</div></div>'
+        f'<div><div class="cc-label">Standard Reference</div><div class="cc-text">{standard_text}</div></div>'
+        f'</div>'
+        f'<div class="cc-hero"><div class="cc-hero-label">OPTIMIZED CORRECTION</div>'
+        f'<div class="cc-hero-text">{item.correction}</div></div>'
+        f'<div class="cc-label">Key Insights</div>'
+        f'<div class="cc-points">{points}</div>'
+        f'</div></div>'
+    )
+
+
+def render_correction_results(
+    transcription_data=None,
+    correction_data=None,
+    show_title: bool = True,
+    key: str = "report"
+):
     """
     Render correction results in 3-column stacked layout
 
     Args:
-        transcription_data: JSON string or list/dict with {id, user, standard} from Agent 1
-        correction_data: JSON string or list/dict with {id, user, correction, feedback} from Agent 2
+        transcription_data: Transcription, or a JSON string / list of {id, user, standard} from Agent 1
+        correction_data: Corrections, or a JSON string / list of {id, user, correction, feedback} from Agent 2
         show_title: Whether to show the title (default: True)
+        key: Unique key prefix when several reports are on the same page
 
     Note: For backward compatibility, if only one argument is passed, it's treated as correction_data
     """
@@ -213,397 +476,445 @@ def render_correction_results(transcription_data=None, correction_data=None, sho
         st.markdown("<br>", unsafe_allow_html=True)
 
     try:
-        # Parse transcription data (Agent 1: {id, user, standard})
-        transcription_dict = {}
-        if transcription_data:
-            if isinstance(transcription_data, str):
-                trans_list = json.loads(transcription_data)
-            else:
-                trans_list = transcription_data
-            # Build lookup dict by id
-            transcription_dict = {item.get('id'): item for item in trans_list}
-
-        # Parse correction data (Agent 2: {id, user, correction, feedback})
-        formatted_json = ""
-        if isinstance(correction_data, str):
-            data = json.loads(correction_data)
-        else:
-            data = correction_data
-
-        if data is None:
-            data = []
+        # Typed results pass straight through; stored lists and strings are parsed once here
+        transcription = Transcription.coerce(transcription_data) if transcription_data else None
+        corrections = Corrections.coerce(correction_data)
 
-        if data:
-            formatted_json = json.dumps(data, ensure_ascii=False, indent=2)
-            render_copy_json_button(formatted_json)
+        if corrections:
+            render_copy_json_button(corrections.to_json(), key=f"{key}_copy_json")
 
-        for idx, item in enumerate(data, 1):
-            question_id = item.get('id', f'{idx:02d}')
-            user_text = item.get('user', '')
-            correction_text = item.get('correction', '')
-            feedback = item.get('feedback', '')
+        # All cards go out in a single st.markdown call; styling lives in ui/theme.py
+        cards = []
+        for idx, item in enumerate(corrections, 1):
+            question_id = item.id or f'{idx:02d}'
 
             # Get standard from transcription data
-            standard_text = ''
-            if question_id in transcription_dict:
-                standard_text = transcription_dict[question_id].get('standard', '')
-            elif not transcription_data:
+            if transcription is None:
                 # Old records without transcription data
                 standard_text = '(資料不可用)'
+            else:
+                source = transcription.get(item.id)
+                standard_text = source.standard if source is not None else ''
+
+            cards.append(render_correction_card(item, question_id, standard_text))
 
-            # Card wrapper - Premium Sharp Look
-            # Build the complete HTML string first to avoid Streamlit/Browser auto-closing tags between st.markdown calls
-            html_content = f"""
-            <div class="correction-card-sharp" style="
-                background: #0f0f0f;
-                border: 1px solid #2a2a2a;
-                border-left: 3px solid #e0e0e0;
-                padding: 0;
-                margin-bottom: 40px;
-                position: relative;
-            ">
-                <!-- Header Section -->
-                <div style="
-                    padding: 20px 30px;
-                    border-bottom: 1px solid #1f1f1f;
-                    display: flex;
-                    justify-content: space-between;
-                    align-items: center;
-                    background: rgba(255,255,255,0.01);
-                ">
-                    <h3 style="
-                        color: #666;
-                        font-family: 'Space Mono', monospace;
-                        font-size: 0.9rem;
-                        letter-spacing: 0.2em;
-                        margin: 0;
-                    ">ANALYSIS {question_id}</h3>
-                    <div style="
-                        font-family: 'Space Mono', monospace;
-                        font-size: 0.7rem;
-                        color: #4a8;
-                        border: 1px solid #2a4a3a;
-                        background: rgba(46, 204, 113, 0.05);
-                        padding: 4px 8px;
-                    ">AUTO-CORRECTED</div>
-                </div>
-
-                <!-- Content Section -->
-                <div style="padding: 30px;">
-                    <!-- Comparison Grid -->
-                    <div style="
-                        display: grid;
-                        grid-template-columns: 1fr 1fr;
-                        gap: 40px;
-                        margin-bottom: 30px;
-                    ">
-                        <!-- User Input -->
-                        <div>
-                            <div style="
-                                font-family: 'Space Mono', monospace;
-                                font-size: 0.7rem;
-                                color: #555;
-                                letter-spacing: 0.1em;
-                                margin-bottom: 12px;
-                                text-transform: uppercase;
-                            ">Original Input</div>
-                            <div style="
-                                font-family: 'Inter', sans-serif;
-                                font-size: 1rem;
-                                color: #888;
-                                line-height: 1.6;
-                                padding-left: 15px;
-                                border-left: 1px solid #333;
-                            ">{user_text}</div>
-                        </div>
-
-                        <!-- Standard Answer -->
-                        <div>
-                            <div style="
-                                font-family: 'Space Mono', monospace;
-                                font-size: 0.7rem;
-                                color: #555;
-                                letter-spacing: 0.1em;
-                                margin-bottom: 12px;
-                                text-transform: uppercase;
-                            ">Standard Reference</div>
-                            <div style="
-                                font-family: 'Inter', sans-serif;
-                                font-size: 1rem;
-                                color: #888;
-                                line-height: 1.6;
-                                padding-left: 15px;
-                                border-left: 1px solid #333;
-                            ">{standard_text}</div>
-                        </div>
-                    </div>
-
-                    <!-- Correction Hero Section -->
-                    <div style="
-                        background: rgba(255,255,255,0.03);
-                        border: 1px solid #222;
-                        padding: 25px;
-                        margin-bottom: 30px;
-                        position: relative;
-                    ">
-                        <div style="
-                            position: absolute;
-                            top: -10px;
-                            left: 20px;
-                            background: #0f0f0f;
-                            padding: 0 10px;
-                            font-family: 'Space Mono', monospace;
-                            font-size: 0.7rem;
-                            color: #e0e0e0;
-                            letter-spacing: 0.1em;
-                        ">OPTIMIZED CORRECTION</div>
-                        <div style="
-                            font-family: 'Cormorant Garamond', serif;
-                            font-size: 1.6rem;
-                            color: #fff;
-                            line-height: 1.4;
-                            font-style: italic;
-                        ">{correction_text}</div>
-                    </div>
-
-                    <!-- Feedback/Notes -->
-                    <div>
-                        <div style="
-                            font-family: 'Space Mono', monospace;
-                            font-size: 0.7rem;
-                            color: #555;
-                            letter-spacing: 0.1em;
-                            margin-bottom: 15px;
-                            text-transform: uppercase;
-                        ">Key Insights</div>
-                        <div style="display: flex; flex-direction: column; gap: 10px;">
-            """
-
-            # Handle feedback items
-            feedback_items = feedback if isinstance(feedback, list) else [feedback]
-            for point in feedback_items:
-                html_content += f"""
-                    <div style="
-                        display: flex;
-                        align-items: flex-start;
-                        gap: 12px;
-                    ">
-                        <span style="
-                            color: #4a8;
-                            font-size: 1.2rem;
-                            line-height: 1;
-                            margin-top: -2px;
-                        ">›</span>
-                        <span style="
-                            font-family: 'Inter', sans-serif;
-                            font-size: 0.95rem;
-                            color: #bbb;
-                            line-height: 1.5;
-                        ">{point}</span>
-                    </div>
-                """
-
-            html_content += """
-                        </div>
-                    </div>
-                </div>
-            </div>
-            """
-
-            st.markdown(clean_html(html_content), unsafe_allow_html=True)
+        if cards:
+            st.markdown(clean_html("".join(cards)), unsafe_allow_html=True)
 
     except Exception as e:
         st.error(f"Parsing Error: {e}")
 
 
-def render_history_page(history_records: list):
+def render_transcription_editor(transcription_data, key: str = "report") -> Optional[list]:
+    """
+    Editable user / standard text of each transcribed item
+
+    Args:
+        transcription_data: Transcription, or a JSON string / list of {id, user, standard}
+        key: Unique key prefix when several reports are on the same page
+
+    Returns:
+        The edited Transcription when the user asks for a re-grade, None otherwise
+    """
+    try:
+        transcription = Transcription.coerce(transcription_data)
+    except ValueError:
+        return None
+    if not transcription:
+        return None
+
+    # The editor is only sent to the browser once opened
+    editing_key = f"{key}_editing"
+    editing = st.session_state.get(editing_key, False)
+    st.button(
+        "CLOSE EDITOR" if editing else "EDIT TRANSCRIPTION",
+        key=f"{key}_edit_btn",
+        on_click=_set_session_flag,
+        args=(editing_key, not editing)
+    )
+    if editing:
+        rows = [{"id": item.id, "user": item.user, "standard": item.standard} for item in transcription]
+        # The editor keeps its edits per key: a new transcription starts a fresh one
+        version = hashlib.sha256(transcription.to_json().encode("utf-8")).hexdigest()[:12]
+
+        st.caption("Fix misread text, then re-grade: only the changed items are corrected again.")
+        edited = st.data_editor(
+            rows,
+            key=f"{key}_editor_{version}",
+            num_rows="fixed",
+            hide_index=True,
+            use_container_width=True,
+            disabled=["id"],
+            column_config={
+                "id": st.column_config.TextColumn("ID", width="small"),
+                "user": st.column_config.TextColumn("User", width="large"),
+                "standard": st.column_config.TextColumn("Standard", width="large")
+            }
+        )
+        if st.button("RE-GRADE CHANGED ITEMS", key=f"{key}_regrade", use_container_width=True):
+            return Transcription.from_list(edited)
+    return None
+
+
+def _reset_history_search_page():
+    """Jump back to the first result page when the search query changes"""
+    st.session_state.history_search_page = 0
+
+
+def render_history_search(db) -> bool:
+    """
+    Render the archive search box and, if a query is entered, its ranked results
+
+    Results come from the storage backend's full-text index one page at a time,
+    so the full history is never downloaded for a search.
+
+    Args:
+        db: Database service instance
+
+    Returns:
+        True if search results were rendered (timeline should be skipped)
+    """
+    query = st.text_input(
+        "Search",
+        key="history_search",
+        placeholder="Search names, answers, corrections, feedback...",
+        label_visibility="collapsed",
+        on_change=_reset_history_search_page
+    ).strip()
+    if not query:
+        return False
+
+    page_size = Config.HISTORY_PAGE_SIZE
+    page = st.session_state.get('history_search_page', 0)
+    results, total = db.search_history(query, limit=page_size, offset=page * page_size)
+
+    if not results:
+        st.info(f"No records match \"{query}\".")
+        return True
+
+    page_count = (total + page_size - 1) // page_size
+    st.markdown(
+        f"<p style='font-family:Space Mono; font-size:0.8rem; color:#666'>"
+        f"{total} MATCHES · PAGE {page + 1} / {page_count}</p>",
+        unsafe_allow_html=True
+    )
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    for idx, record in enumerate(results, 1):
+        render_timeline_entry(db, record, page * page_size + idx)
+
+    _render_pager('history_search_page', page, page_count)
+    return True
+
+
+def _render_pager(state_key: str, page: int, page_count: int):
+    """
+    Render PREV / NEXT buttons that move a page index kept in the session
+
+    Args:
+        state_key: Session state key of the 0-based page index
+        page: Current page index
+        page_count: Number of pages
+    """
+    col_prev, _, col_next = st.columns([1, 4, 1])
+    with col_prev:
+        if page > 0 and st.button("← PREV", key=f"{state_key}_prev", use_container_width=True):
+            st.session_state[state_key] = page - 1
+            st.rerun()
+    with col_next:
+        if page + 1 < page_count and st.button("NEXT →", key=f"{state_key}_next", use_container_width=True):
+            st.session_state[state_key] = page + 1
+            st.rerun()
+
+
+def render_history_export(db):
+    """
+    Render the history export controls
+
+    The file is generated only when the button is clicked: records are
+    streamed chunk by chunk into a temporary file, then handed to the browser.
+    st.download_button cannot stream, so the finished file is held in server
+    memory until it is downloaded; for histories too large for that, use the
+    command line exporter (python -m services.exporter), which never holds
+    more than one chunk.
+
+    Args:
+        db: Database service instance
+    """
+    from services.exporter import EXPORT_FORMATS, export_history, is_parquet_supported
+
+    formats = [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or is_parquet_supported()]
+
+    col_format, col_download = st.columns([1, 1])
+    with col_format:
+        fmt = st.selectbox(
+            "Export Format",
+            formats,
+            format_func=str.upper,
+            key="history_export_format",
+            label_visibility="collapsed"
+        )
+
+    def build_export() -> bytes:
+        with tempfile.TemporaryFile() as output:
+            export_history(db, output, fmt)
+            output.seek(0)
+            return output.read()
+
+    mime, extension = EXPORT_FORMATS[fmt]
+    with col_download:
+        st.download_button(
+            "EXPORT",
+            data=build_export,
+            file_name=f"correction_history.{extension}",
+            mime=mime,
+            on_click="ignore",
+            use_container_width=True
+        )
+
+
+def render_history_page(history_records: list, db=None):
     """
     Render history archive page with Timeline Style (Plan A)
+
+    The timeline shows one page of Config.HISTORY_PAGE_SIZE records; the
+    page index is kept in st.session_state.history_page.
+
+    Args:
+        history_records: Records of the current timeline page (unused while a search query is active)
+        db: Database service instance (created if not provided)
     """
-    from services.database import DatabaseService
-    db = DatabaseService()
+    if db is None:
+        from services.database import DatabaseService
+        db = DatabaseService()
 
     st.markdown('<h2 style="text-align: center; border: none; margin-bottom: 40px;">Correction Archive</h2>', unsafe_allow_html=True)
 
-    if not history_records:
-        st.info("No history records found.")
-        return
-
     # Back button
-    col_back, _ = st.columns([1, 5])
+    col_back, _, col_export = st.columns([1, 3, 2])
     with col_back:
         if st.button("← BACK", use_container_width=True):
             st.session_state.show_history = False
             st.rerun()
+    with col_export:
+        render_history_export(db)
 
     st.markdown("<br>", unsafe_allow_html=True)
 
+    if render_history_search(db):
+        return
+
+    page_size = Config.HISTORY_PAGE_SIZE
+    page = st.session_state.get('history_page', 0)
+    if not history_records:
+        if page > 0:
+            # Records were deleted since the page was opened: start over
+            st.session_state.history_page = 0
+            st.rerun()
+        st.info("No history records found.")
+        return
+
     # Timeline Loop
     for idx, record in enumerate(history_records, 1):
-        timestamp = record.get('timestamp', 'Unknown')
-        transcriptions = record.get('transcriptions', [])
-        corrections = record.get('corrections', [])
-        record_id = record.get('id', idx)
-        record_name = record.get('name') 
-        
-        # Default name logic
-        display_name = record_name if record_name else f"Record #{record_id}"
+        render_timeline_entry(db, record, page * page_size + idx)
 
-        # Format timestamp
-        try:
-            from datetime import datetime
-            dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            # Convert UTC to local time for display
-            if dt.tzinfo is not None:
-                dt_local = dt.astimezone()
+    total = db.get_history_count()
+    _render_pager('history_page', page, (total + page_size - 1) // page_size)
+
+
+def _set_session_flag(key: str, value: bool):
+    """Widget callback: set a session flag before the (fragment) rerun renders"""
+    st.session_state[key] = value
+
+
+@st.fragment
+def render_timeline_entry(db, record: dict, idx: int):
+    """
+    Render one archive record: timeline dot, editable name, stats and actions
+
+    Runs as a fragment: renaming, toggling edit mode or opening details
+    reruns only this entry, without refetching or re-rendering the archive.
+
+    Args:
+        db: Database service instance (for renaming)
+        record: History record dict
+        idx: 1-based position, used as fallback id
+    """
+    timestamp = record.get('timestamp', 'Unknown')
+    transcriptions = record.get('transcriptions', [])
+    corrections = record.get('corrections', [])
+    record_id = record.get('id', idx)
+    record_name = record.get('name') 
+    
+    # Default name logic
+    display_name = record_name if record_name else f"Record #{record_id}"
+
+    # Format timestamp
+    try:
+        from datetime import datetime
+        dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        # Convert UTC to local time for display
+        if dt.tzinfo is not None:
+            dt_local = dt.astimezone()
+        else:
+            dt_local = dt
+        date_str = dt_local.strftime('%Y-%m-%d')
+        time_str = dt_local.strftime('%H:%M')
+    except:
+        date_str = timestamp
+        time_str = ""
+
+    # Calculate stats
+    correction_count = len(corrections) if corrections else 0
+
+    # Timeline Layout: Col1 (Line) | Col2 (Content)
+    col1, col2 = st.columns([0.8, 11])
+
+    with col1:
+        # Visual Timeline Line & Glowing Dot
+        st.markdown('<div class="tl-line"><div class="tl-dot"></div></div>', unsafe_allow_html=True)
+
+    with col2:
+        # Content Container: Date & Time
+        st.markdown(
+            f'<div class="tl-meta"><div class="tl-date"><span>{date_str}</span>'
+            f'<span class="tl-time">{time_str}</span></div></div>',
+            unsafe_allow_html=True
+        )
+
+        # Editable Title Section
+        # We use a unique key for each record's edit state
+        edit_key = f"edit_mode_{record_id}"
+        
+        # Header Row
+        h_col1, h_col2 = st.columns([8, 1])
+        with h_col1:
+            if st.session_state.get(edit_key, False):
+                # Edit Mode
+                def on_save_name():
+                    new_val = st.session_state[f"input_{record_id}"]
+                    if db.update_record_name(record_id, new_val):
+                        st.session_state[edit_key] = False
+                        # Update the local record so the fragment rerun shows the new name
+                        record['name'] = new_val
+
+                st.text_input(
+                    "Name", 
+                    value=display_name, 
+                    key=f"input_{record_id}", 
+                    label_visibility="collapsed",
+                    on_change=on_save_name
+                )
             else:
-                dt_local = dt
-            date_str = dt_local.strftime('%Y-%m-%d')
-            time_str = dt_local.strftime('%H:%M')
-        except:
-            date_str = timestamp
-            time_str = ""
-
-        # Calculate stats
-        correction_count = len(corrections) if corrections else 0
-
-        # Timeline Layout: Col1 (Line) | Col2 (Content)
-        col1, col2 = st.columns([0.8, 11])
-
-        with col1:
-            # Visual Timeline Line & Dot
-            is_last = idx == len(history_records)
-            line_height = "100%" 
-            
-            st.markdown(clean_html(f"""
-                <div style="
-                    height: {line_height};
-                    min-height: 140px;
-                    border-left: 1px solid rgba(255, 255, 255, 0.1);
-                    position: relative;
-                    margin-left: 50%;
-                ">
-                    <!-- Glowing Dot -->
-                    <div style="
-                        position: absolute;
-                        left: -4px;
-                        top: 8px;
-                        width: 7px;
-                        height: 7px;
-                        background: #000;
-                        border: 1px solid #e0e0e0;
-                        border-radius: 50%;
-                        box-shadow: 0 0 10px rgba(255, 255, 255, 0.4);
-                        z-index: 2;
-                    "></div>
-                </div>
-            """), unsafe_allow_html=True)
-
-        with col2:
-            # Content Container
-            st.markdown(clean_html(f"""
-                <div style="margin-bottom: 40px; padding-left: 15px;">
-                    <!-- Date & Time -->
-                    <div style="
-                        font-family: 'Space Mono', monospace;
-                        color: #666;
-                        font-size: 0.85rem;
-                        letter-spacing: 0.05em;
-                        display: flex;
-                        align-items: baseline;
-                        gap: 15px;
-                        margin-bottom: 4px;
-                    ">
-                        <span>{date_str}</span>
-                        <span style="
-                            border-left: 1px solid #333; 
-                            padding-left: 15px;
-                        ">{time_str}</span>
-                    </div>
-            """), unsafe_allow_html=True)
-
-            # Editable Title Section
-            # We use a unique key for each record's edit state
-            edit_key = f"edit_mode_{record_id}"
-            
-            # Header Row
-            h_col1, h_col2 = st.columns([8, 1])
-            with h_col1:
-                if st.session_state.get(edit_key, False):
-                    # Edit Mode
-                    def on_save_name():
-                        new_val = st.session_state[f"input_{record_id}"]
-                        if db.update_record_name(record_id, new_val):
-                            st.session_state[edit_key] = False
-                            # We might need to reload history, but for now let's just rerun
-                            # Ideally we should update the local record list too or force a reload
-                            # Since we can't easily force a reload of the parent's data fetch from here without a callback,
-                            # we rely on st.rerun() which re-runs the whole app and fetches fresh data.
-                        
-                    st.text_input(
-                        "Name", 
-                        value=display_name, 
-                        key=f"input_{record_id}", 
-                        label_visibility="collapsed",
-                        on_change=on_save_name
-                    )
-                else:
-                    # View Mode
-                    st.markdown(f"""
-                        <h3 style="
-                            font-family: 'Cormorant Garamond', serif;
-                            font-size: 1.6rem;
-                            color: #e0e0e0;
-                            margin: 0;
-                            font-weight: 400;
-                            letter-spacing: 0.02em;
-                        ">{display_name}</h3>
-                    """, unsafe_allow_html=True)
-            
-            with h_col2:
-                # Edit Button
-                if not st.session_state.get(edit_key, False):
-                    if st.button("✎", key=f"edit_btn_{record_id}"):
-                        st.session_state[edit_key] = True
-                        st.rerun()
-
-            # Stats
-            st.markdown(clean_html(f"""
-                    <!-- Stats / Summary -->
-                    <div style="
-                        font-family: 'Inter', sans-serif;
-                        color: #888;
-                        font-size: 0.9rem;
-                        margin-top: 8px;
-                        margin-bottom: 20px;
-                        display: flex;
-                        gap: 25px;
-                    ">
-                        <span style="display: flex; align-items: center; gap: 8px;">
-                            <span style="
-                                display: inline-block; width: 6px; height: 6px; 
-                                background: #4a8; border-radius: 50%; opacity: 0.7;
-                            "></span>
-                            <span style="color: #ccc;">{correction_count}</span> Corrections
-                        </span>
-                    </div>
-                </div>
-            """), unsafe_allow_html=True)
-
-            # Action Buttons - Nested inside the content column to align with text
-            c1, c2 = st.columns([2.5, 8])
-            with c1:
-                st.markdown('<div class="restore-button-wrapper">', unsafe_allow_html=True)
-                if st.button("RESTORE", key=f"restore_{record_id}", use_container_width=True):
-                    st.session_state.restored_transcriptions = transcriptions
-                    st.session_state.restored_corrections = corrections
-                    st.session_state.show_history = False
-                    st.rerun()
-                st.markdown('</div>', unsafe_allow_html=True)
-            
-            with c2:
-                with st.expander("VIEW DETAILS"):
-                    if corrections:
-                        render_correction_results(transcriptions, corrections, show_title=False)
+                # View Mode
+                st.markdown(f'<h3 class="tl-title">{display_name}</h3>', unsafe_allow_html=True)
+        
+        with h_col2:
+            # Edit Button
+            if not st.session_state.get(edit_key, False):
+                st.button("✎", key=f"edit_btn_{record_id}", on_click=_set_session_flag, args=(edit_key, True))
+
+        # Stats
+        st.markdown(
+            f'<div class="tl-stats"><span class="tl-stat"><span class="tl-stat-dot"></span>'
+            f'<span class="tl-stat-value">{correction_count}</span> Corrections</span></div>',
+            unsafe_allow_html=True
+        )
+
+        # Action Buttons - Nested inside the content column to align with text
+        c1, c2 = st.columns([2.5, 8])
+        with c1:
+            st.markdown('<div class="restore-button-wrapper">', unsafe_allow_html=True)
+            if st.button("RESTORE", key=f"restore_{record_id}", use_container_width=True):
+                # Only the id is kept in the session; the record is re-read when shown
+                st.session_state.restored_record_id = record_id
+                st.session_state.show_history = False
+                st.rerun()
+            st.markdown('</div>', unsafe_allow_html=True)
+        
+        # Details are rendered only while open (not hidden in an expander on every run)
+        details_key = f"details_open_{record_id}"
+        details_open = st.session_state.get(details_key, False)
+        with c2:
+            st.button(
+                "HIDE DETAILS" if details_open else "VIEW DETAILS",
+                key=f"details_btn_{record_id}",
+                on_click=_set_session_flag,
+                args=(details_key, not details_open)
+            )
+
+        if details_open and corrections:
+            render_correction_results(transcriptions, corrections, show_title=False, key=f"record_{record_id}")
+
+
+def render_stats_dashboard(db):
+    """
+    Render the error statistics dashboard
+
+    Reads only the incrementally maintained aggregates, so it costs a few
+    small queries regardless of how large the history grows.
+
+    Args:
+        db: Database service instance
+    """
+    import pandas as pd
+
+    st.markdown('<h2 style="text-align: center; border: none; margin-bottom: 40px;">Error Dashboard</h2>', unsafe_allow_html=True)
+
+    col_back, _ = st.columns([1, 5])
+    with col_back:
+        if st.button("← BACK", use_container_width=True, key="dashboard_back"):
+            st.session_state.show_dashboard = False
+            st.rerun()
+
+    days = db.get_stats("day", order_by="key")
+    if not days:
+        st.info("No statistics yet. Run an analysis, or backfill with: python -m services.error_stats --rebuild")
+        return
 
+    def to_frame(rows: list) -> "pd.DataFrame":
+        frame = pd.DataFrame(rows)
+        frame["name"] = frame["label"].fillna(frame["key"]) if "label" in frame else frame["key"]
+        frame["error_rate"] = (frame["errors"] / frame["items"].clip(lower=1)).round(3)
+        return frame
+
+    day_frame = to_frame(days)
+    total_items = int(day_frame["items"].sum())
+    total_errors = int(day_frame["errors"].sum())
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Graded Items", total_items)
+    m2.metric("Items With Errors", total_errors)
+    m3.metric("Error Rate", f"{total_errors / max(total_items, 1):.0%}")
+
+    st.markdown("### Most Frequent Error Types")
+    categories = db.get_stats("category", order_by="items")
+    if categories:
+        category_frame = to_frame(categories)
+        st.bar_chart(category_frame.set_index("name")["items"], horizontal=True)
+
+    col_questions, col_records = st.columns(2)
+    with col_questions:
+        st.markdown("### Weakest Questions")
+        questions = db.get_stats("question", order_by="errors", limit=15)
+        if questions:
+            st.dataframe(
+                to_frame(questions)[["key", "items", "errors", "error_rate"]].rename(columns={"key": "question"}),
+                hide_index=True,
+                use_container_width=True
+            )
+    with col_records:
+        st.markdown("### Records With Most Errors")
+        records = db.get_stats("record", order_by="errors", limit=15)
+        if records:
+            record_frame = to_frame(records)
+            record_frame["name"] = record_frame["label"].fillna("Record #" + record_frame["key"])
+            st.dataframe(
+                record_frame[["name", "items", "errors", "error_rate"]],
+                hide_index=True,
+                use_container_width=True
+            )
+
+    st.markdown("### Trend")
+    st.line_chart(day_frame.set_index("key")[["items", "errors"]])
 
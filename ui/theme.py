@@ -2,327 +2,60 @@
 UI Theme Management
 極簡主義設計系統：Cormorant Garamond + Space Mono + Tangerine
 """
-import streamlit as st
-
-
-def apply_custom_theme():
-    """
-    Apply custom CSS theme to Streamlit app
-    Minimalist design with Google Fonts integration
-    """
-    st.markdown("""
-<style>
-    /* Import Google Fonts */
-    @import url('https://fonts.googleapis.com/css2?family=Cormorant+Garamond:ital,wght@0,300;0,400;0,600;1,400&family=Space+Mono:ital,wght@0,400;0,700;1,400&family=Tangerine:wght@400;700&family=Inter:wght@300;400;600&display=swap');
-
-    /* Global Variables */
-    :root {
-        --bg-color: #0a0a0a;
-        --card-bg: #121212;
-        --text-primary: #e0e0e0;
-        --text-secondary: #a0a0a0;
-        --accent-color: #ffffff;
-        --border-color: #333333;
-
-        /* Extended color variables */
-        --border-light: #444444;
-        --border-lighter: #555555;
-        --border-dark: #222222;
-        --glow-subtle: rgba(255, 255, 255, 0.02);
-        --glow-medium: rgba(255, 255, 255, 0.05);
-        --glow-strong: rgba(255, 255, 255, 0.1);
-        --shadow-light: rgba(0, 0, 0, 0.2);
-        --shadow-medium: rgba(0, 0, 0, 0.3);
-        --shadow-strong: rgba(0, 0, 0, 0.5);
-
-        /* Easing functions */
-        --ease-smooth: cubic-bezier(0.4, 0, 0.2, 1);
-        --ease-bounce: cubic-bezier(0.34, 1.56, 0.64, 1);
-        --ease-elastic: cubic-bezier(0.68, -0.55, 0.265, 1.55);
-    }
-
-    /* Global Styles */
-    html, body, [class*="css"] {
-        font-family: 'Space Mono', monospace;
-        background-color: var(--bg-color);
-        color: var(--text-primary);
-        font-weight: 400;
-    }
-
-    /* Headings */
-    h1, h2, h3 {
-        font-family: 'Cormorant Garamond', serif !important;
-        font-weight: 400 !important;
-        letter-spacing: -0.02em;
-        color: var(--text-primary) !important;
-    }
-
-    h1 {
-        font-size: 3.5rem !important;
-        font-style: italic;
-        margin-bottom: 0 !important;
-    }
-
-    h2 {
-        font-size: 2.2rem !important;
-        margin-top: 1.5rem !important;
-        border-bottom: 1px solid var(--border-color);
-        padding-bottom: 0.5rem;
-    }
-
-    h3 {
-        font-size: 1.5rem !important;
-        font-family: 'Space Mono', monospace !important;
-        text-transform: uppercase;
-        letter-spacing: 0.05em;
-        font-size: 0.9rem !important;
-        color: var(--text-secondary) !important;
-    }
-
-    /* Code & Monospace */
-    code, .stCode, .stJson {
-        font-family: 'Space Mono', monospace !important;
-        font-size: 0.85rem !important;
-    }
-
-    /* Accent Text (Tangerine) */
-    .accent-text {
-        font-family: 'Tangerine', cursive;
-        font-size: 2.5rem;
-        color: var(--text-secondary);
-        margin-bottom: -1rem;
-        display: block;
-    }
-
-    /* Minimalist Containers */
-    .minimal-container {
-        border-top: 1px solid var(--border-color);
-        padding-top: 1.5rem;
-        margin-top: 1rem;
-    }
-
-    /* Custom Button Styling - Sharp Corners */
-    .stButton > button {
-        background: rgba(30, 30, 30, 0.8);
-        color: var(--text-primary);
-        border: 1px solid var(--border-color);
-        border-radius: 0;
-        padding: 0.7rem 1.8rem;
-        font-family: 'Space Mono', monospace;
-        font-size: 0.8rem;
-        text-transform: uppercase;
-        letter-spacing: 0.12em;
-        transition: all 0.25s cubic-bezier(0.4, 0, 0.2, 1);
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.2);
-        position: relative;
-        overflow: hidden;
-    }
-
-    .stButton > button::before {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: -100%;
-        width: 100%;
-        height: 100%;
-        background: linear-gradient(90deg, transparent, rgba(255,255,255,0.1), transparent);
-        transition: left 0.5s;
-    }
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
 
-    .stButton > button:hover::before {
-        left: 100%;
-    }
-
-    .stButton > button:hover {
-        background: rgba(50, 50, 50, 0.9);
-        border-color: #555;
-        box-shadow: 0 4px 8px rgba(0, 0, 0, 0.3);
-        transform: translateY(-2px);
-    }
-
-    .stButton > button:active {
-        transform: translateY(0px);
-        box-shadow: 0 1px 2px rgba(0, 0, 0, 0.2);
-    }
-
-    /* Restore button special styling */
-    .restore-button-wrapper .stButton > button {
-        background: linear-gradient(135deg, rgba(35,35,35,0.9) 0%, rgba(25,25,25,0.8) 100%);
-        border: 1px solid #3a3a3a;
-        position: relative;
-        overflow: hidden;
-    }
-
-    /* Ripple effect */
-    .restore-button-wrapper .stButton > button::before {
-        content: '';
-        position: absolute;
-        top: 50%;
-        left: 50%;
-        width: 0;
-        height: 0;
-        border-radius: 50%;
-        background: rgba(255,255,255,0.1);
-        transform: translate(-50%, -50%);
-        transition: width 0.5s ease, height 0.5s ease;
-    }
-
-    .restore-button-wrapper .stButton > button:hover::before {
-        width: 300px;
-        height: 300px;
-    }
-
-    .restore-button-wrapper .stButton > button:hover {
-        border-color: #4a4a4a;
-        box-shadow:
-            0 4px 12px rgba(0,0,0,0.4),
-            inset 0 0 0 1px rgba(255,255,255,0.05),
-            0 0 15px rgba(255,255,255,0.02);
-    }
-
-    /* File Uploader Styling - Sharp Corners */
-    [data-testid="stFileUploader"] {
-        border: 1px solid var(--border-color);
-        border-radius: 0;
-        padding: 30px;
-        background: transparent;
-        transition: border-color 0.3s;
-    }
-    [data-testid="stFileUploader"]:hover {
-        border-color: var(--text-secondary);
-    }
-
-    /* Input Fields */
-    .stTextInput > div > div > input {
-        background-color: transparent;
-        border: none;
-        border-bottom: 1px solid var(--border-color);
-        border-radius: 0;
-        color: var(--text-primary);
-        font-family: 'Space Mono', monospace;
-    }
-    .stTextInput > div > div > input:focus {
-        border-bottom-color: var(--text-primary);
-        box-shadow: none;
-    }
-
-    /* Sharp correction card - Minimalist style */
-    .correction-card-sharp {
-        border-radius: 0;
-        transition: all 0.3s ease;
-    }
-
-    .correction-card-sharp:hover {
-        border-color: #444;
-        box-shadow: 0 4px 8px rgba(0, 0, 0, 0.4);
-    }
-
-    /* Text size classes */
-    .text-small {
-        font-size: 0.85rem;
-        line-height: 1.5;
-    }
-
-    .text-large {
-        font-size: 1.1rem;
-        line-height: 1.7;
-        font-weight: 500;
-    }
-
-    .text-secondary {
-        color: #999;
-    }
-
-    .text-primary {
-        color: #e0e0e0;
-    }
-
-    /* Divider line */
-    .divider {
-        height: 1px;
-        background: linear-gradient(90deg, transparent 0%, #444 10%, #444 90%, transparent 100%);
-        margin: 1.5rem 0;
-    }
+import streamlit as st
 
-    /* Card header */
-    .card-header {
-        padding-bottom: 1rem;
-        margin-bottom: 1.5rem;
-        border-bottom: 1px solid #333;
-    }
 
-    .card-header h3 {
-        font-family: 'Space Mono', monospace;
-        font-size: 0.85rem;
-        letter-spacing: 0.15em;
-        text-transform: uppercase;
-        color: #888;
-        margin: 0;
-    }
+UI_DIR = Path(__file__).resolve().parent
 
-    /* Note items */
-    .note-item {
-        font-family: 'Cormorant Garamond', serif;
-        font-style: italic;
-        color: #aaa;
-        margin-bottom: 0.5rem;
-        padding-left: 0.5rem;
-        border-left: 2px solid #333;
-    }
+# Served by Streamlit at app/static/ (server.enableStaticServing)
+STATIC_DIR = UI_DIR.parent / "static"
+THEME_SOURCE = UI_DIR / "theme.css"
+THEME_STYLESHEET = "theme.min.css"
 
-    /* Status Container - Sharp Corners */
-    .stStatus {
-        background: rgba(18, 18, 18, 0.5) !important;
-        border: 1px solid var(--border-color) !important;
-        border-radius: 0 !important;
-        font-family: 'Space Mono', monospace !important;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.2);
-    }
+GOOGLE_FONTS_CSS = (
+    "https://fonts.googleapis.com/css2?family=Cormorant+Garamond:ital,wght@0,300;0,400;0,600;1,400"
+    "&family=Space+Mono:ital,wght@0,400;0,700;1,400&family=Tangerine:wght@400;700"
+    "&family=Inter:wght@300;400;600&display=swap"
+)
 
-    /* Expander Header - Sharp Corners */
-    .streamlit-expanderHeader {
-        background: rgba(28, 28, 28, 0.9);
-        border: 1px solid var(--border-color);
-        border-radius: 0;
-        padding: 12px 16px;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.3);
-        transition: all 0.3s ease;
-    }
 
-    .streamlit-expanderHeader:hover {
-        background: rgba(35, 35, 35, 0.95);
-        border-color: #444;
-        box-shadow: 0 4px 8px rgba(0, 0, 0, 0.4);
-    }
+@lru_cache(maxsize=1)
+def _stylesheet_version() -> Optional[str]:
+    """Content hash of the compiled stylesheet (cache-busting query), None if not built"""
+    path = STATIC_DIR / THEME_STYLESHEET
+    if not path.exists():
+        return None
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:12]
 
-    /* Expander Content - Sharp Corners */
-    .streamlit-expanderContent {
-        background: rgba(15, 15, 15, 0.7);
-        border: 1px solid var(--border-color);
-        border-top: none;
-        border-radius: 0;
-        padding: 20px;
-        margin-top: -1px;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.2);
-    }
 
-    /* Container Borders - Sharp Corners */
-    .stContainer {
-        border-radius: 0;
-    }
+@lru_cache(maxsize=1)
+def _inline_css() -> str:
+    """Source stylesheet with the Google Fonts import (static serving unavailable)"""
+    return f"@import url('{GOOGLE_FONTS_CSS}');\n" + THEME_SOURCE.read_text(encoding="utf-8")
 
-    /* Sidebar Styling */
-    [data-testid="stSidebar"] {
-        background-color: #050505;
-        border-right: 1px solid var(--border-color);
-    }
 
-    /* Hide Streamlit Branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
+def apply_custom_theme():
+    """
+    Apply custom CSS theme to Streamlit app
 
-</style>
-""", unsafe_allow_html=True)
+    Each rerun only emits a <link> to the compiled, self-hosted stylesheet;
+    the browser fetches it (and the subsetted fonts) once per version.
+    Falls back to inlining the source CSS when static serving is off or the
+    assets have not been built.
+    """
+    version = _stylesheet_version()
+    if version and st.get_option("server.enableStaticServing"):
+        st.markdown(
+            f'<link rel="stylesheet" href="app/static/{THEME_STYLESHEET}?v={version}">',
+            unsafe_allow_html=True
+        )
+    else:
+        st.markdown(f"<style>{_inline_css()}</style>", unsafe_allow_html=True)
 
 
 def render_header():
@@ -0,0 +1,74 @@
+"""
+Cooperative Cancellation
+可取消的模型呼叫（使用者放棄的工作儘早停止並釋出名額）
+"""
+import threading
+from typing import Optional
+
+
+class Cancelled(Exception):
+    """Raised at a checkpoint once the work has been cancelled"""
+
+
+class CancelToken:
+    """
+    Cancellation flag shared by a job and every model call it makes
+
+    Cancelling never interrupts a thread: the work stops at its next
+    checkpoint (before a model call, between streamed chunks, before saving).
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = "Cancelled") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        """
+        Checkpoint
+
+        Raises:
+            Cancelled: If cancel() was called
+        """
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+
+def checkpoint(token: Optional[CancelToken]) -> None:
+    """Checkpoint that accepts a missing token (uncancellable callers)"""
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def stream_text(response, token: Optional[CancelToken]) -> str:
+    """
+    Read a streamed generate_content response, checking the token between chunks
+
+    On cancellation the underlying stream is closed where the transport
+    allows it, so the server stops generating as well.
+
+    Args:
+        response: Response of generate_content(..., stream=True)
+        token: Cancellation token of the job (None: read to the end)
+
+    Returns:
+        The full response text
+
+    Raises:
+        Cancelled: If the token is cancelled before the stream ends
+    """
+    for _ in response:
+        if token is not None and token.cancelled:
+            close = getattr(getattr(response, "_iterator", None), "cancel", None)
+            if close is not None:
+                close()  # gRPC stream
+            token.raise_if_cancelled()
+    return response.text
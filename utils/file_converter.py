@@ -2,14 +2,17 @@
 File Converter Utilities
 PDF to Image conversion
 """
-from typing import List
+import importlib.util
+import itertools
+import tempfile
+import time
+from typing import List, Optional, Tuple, Union
 from PIL import Image
 
-try:
-    from pdf2image import convert_from_bytes
-    PDF_SUPPORT = True
-except ImportError:
-    PDF_SUPPORT = False
+from utils.page_cache import Page, SessionPageCache
+
+# pdf2image is imported on first conversion; only its presence is checked here
+PDF_SUPPORT = importlib.util.find_spec("pdf2image") is not None
 
 
 def is_pdf_supported() -> bool:
@@ -17,16 +20,31 @@ def is_pdf_supported() -> bool:
     return PDF_SUPPORT
 
 
-def convert_pdf_to_images(pdf_bytes: bytes, dpi: int = 200) -> List[Image.Image]:
+def convert_pdf_to_images(
+    pdf_bytes: bytes,
+    dpi: int = 200,
+    directory: Optional[str] = None,
+    raw: bool = False,
+    first_page: Optional[int] = None,
+    last_page: Optional[int] = None
+) -> List[Union[Image.Image, str]]:
     """
     Convert PDF to list of images
 
+    With a directory, pdftoppm writes the pages there (PNG, or uncompressed
+    PPM with raw) and only their paths are returned: no page is decoded, so
+    a long PDF never holds all its bitmaps in memory.
+
     Args:
         pdf_bytes: PDF file content as bytes
         dpi: Resolution for conversion (default: 200 for balanced speed/quality)
+        directory: Write page files here instead of returning images
+        raw: Write uncompressed pixels (with a directory)
+        first_page: First page to convert (1-based, default: the first)
+        last_page: Last page to convert (default: the last)
 
     Returns:
-        List of PIL Images (one per page)
+        List of PIL Images, or of file paths with a directory (one per page)
 
     Raises:
         RuntimeError: If pdf2image is not installed
@@ -35,17 +53,146 @@ def convert_pdf_to_images(pdf_bytes: bytes, dpi: int = 200) -> List[Image.Image]
     if not PDF_SUPPORT:
         raise RuntimeError("pdf2image is not installed")
 
+    from pdf2image import convert_from_bytes
+
     try:
-        images = convert_from_bytes(
+        if directory is None:
+            return convert_from_bytes(pdf_bytes, dpi=dpi, fmt='png', first_page=first_page, last_page=last_page)
+        return convert_from_bytes(
             pdf_bytes,
             dpi=dpi,
-            fmt='png'
+            fmt='ppm' if raw else 'png',
+            first_page=first_page,
+            last_page=last_page,
+            output_folder=directory,
+            paths_only=True
         )
-        return images
     except Exception as e:
         raise Exception(f"PDF conversion failed: {str(e)}")
 
 
+class AdaptiveDpi:
+    """
+    Per-page resolution: the lowest DPI at which a line of text is line_px tall
+
+    Measured on a preview rendered at preview_dpi (utils.page_analysis),
+    clamped to min_dpi..max_dpi and rounded up to a multiple of step. A page
+    without ink is rendered at min_dpi; one with ink but no text lines
+    (a photo or drawing) at the fixed DPI.
+    """
+
+    __slots__ = ("preview_dpi", "min_dpi", "max_dpi", "line_px", "step")
+
+    def __init__(self, preview_dpi: int = 72, min_dpi: int = 100, max_dpi: int = 300,
+                 line_px: int = 24, step: int = 25):
+        self.preview_dpi = preview_dpi
+        self.min_dpi = min_dpi
+        self.max_dpi = max_dpi
+        self.line_px = line_px
+        self.step = step
+
+    def choose(self, preview: Image.Image, fixed_dpi: int) -> int:
+        """DPI to render the page of this preview at"""
+        from utils.page_analysis import PREVIEW_INK_LEVEL, text_line_height
+
+        line_height = text_line_height(preview)
+        if line_height is None:
+            histogram = preview.convert("L").histogram()
+            has_ink = sum(histogram[:PREVIEW_INK_LEVEL]) > 0.001 * preview.width * preview.height
+            return fixed_dpi if has_ink else self.min_dpi
+        dpi = self.line_px * self.preview_dpi / line_height
+        dpi = -(-dpi // self.step) * self.step
+        return int(min(self.max_dpi, max(self.min_dpi, dpi)))
+
+
+class RenderInfo:
+    """How a PDF page was rasterized, and the estimated savings over the fixed DPI"""
+
+    __slots__ = ("dpi", "fixed_dpi", "seconds", "preview_seconds", "nbytes")
+
+    def __init__(self, dpi: int, fixed_dpi: int, seconds: float, preview_seconds: float, nbytes: int = 0):
+        self.dpi = dpi
+        self.fixed_dpi = fixed_dpi
+        self.seconds = seconds
+        self.preview_seconds = preview_seconds
+        self.nbytes = nbytes
+
+    @property
+    def _scale(self) -> float:
+        # Rendering time and encoded size grow with the pixel count
+        return (self.fixed_dpi / self.dpi) ** 2
+
+    @property
+    def saved_seconds(self) -> float:
+        """Estimated rasterization time saved (negative when the page needed more DPI)"""
+        return self.seconds * self._scale - self.seconds - self.preview_seconds
+
+    @property
+    def saved_bytes(self) -> int:
+        """Estimated encoded bytes saved (negative when the page needed more DPI)"""
+        return int(self.nbytes * self._scale) - self.nbytes
+
+
+def convert_pdf_adaptive(
+    pdf_bytes: bytes,
+    adaptive: AdaptiveDpi,
+    fixed_dpi: int = 200,
+    directory: Optional[str] = None,
+    raw: bool = False
+) -> List[Tuple[Union[Image.Image, str], RenderInfo]]:
+    """
+    Convert PDF to images, each page at the DPI its text needs
+
+    All pages are previewed in one pass (written to a temporary directory
+    and read one at a time); runs of consecutive pages with the same DPI are
+    then rendered together.
+
+    Args:
+        pdf_bytes: PDF file content as bytes
+        adaptive: Resolution policy
+        fixed_dpi: DPI the savings are measured against
+        directory: Write page files here instead of returning images
+        raw: Write uncompressed pixels (with a directory)
+
+    Returns:
+        (image or file path, render info) per page; the info's nbytes is
+        filled in by the caller
+
+    Raises:
+        RuntimeError: If pdf2image is not installed
+        Exception: If PDF conversion fails
+    """
+    if not PDF_SUPPORT:
+        raise RuntimeError("pdf2image is not installed")
+
+    from pdf2image import convert_from_bytes
+
+    try:
+        started = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="correction-preview-") as preview_dir:
+            preview_paths = convert_from_bytes(
+                pdf_bytes, dpi=adaptive.preview_dpi, grayscale=True, output_folder=preview_dir, paths_only=True
+            )
+            dpis = []
+            for path in preview_paths:
+                with Image.open(path) as preview:
+                    dpis.append(adaptive.choose(preview, fixed_dpi))
+        preview_seconds = (time.perf_counter() - started) / max(len(dpis), 1)
+    except Exception as e:
+        raise Exception(f"PDF conversion failed: {str(e)}")
+
+    results = []
+    first_page = 1
+    for dpi, run in itertools.groupby(dpis):
+        count = len(list(run))
+        started = time.perf_counter()
+        images = convert_pdf_to_images(pdf_bytes, dpi, directory, raw, first_page, first_page + count - 1)
+        seconds = (time.perf_counter() - started) / max(len(images), 1)
+        results.extend((image, RenderInfo(dpi, fixed_dpi, seconds, preview_seconds)) for image in images)
+        first_page += count
+    return results
+
+
 def convert_file_to_images(uploaded_file) -> List[Image.Image]:
     """
     Convert uploaded file (PDF or image) to list of images
@@ -91,6 +238,123 @@ def convert_files_to_images(uploaded_files) -> List[Image.Image]:
     return all_images
 
 
+def convert_file_to_pages(
+    uploaded_file,
+    dpi: int = 200,
+    adaptive: Optional[AdaptiveDpi] = None,
+    directory: Optional[str] = None,
+    raw: bool = False
+) -> List[Page]:
+    """
+    Convert uploaded file (PDF or image) to encoded pages
+
+    Image uploads keep the uploaded bytes as they are. PDF pages are
+    rasterized as PNG; with a directory they are written there (raw:
+    uncompressed) and never decoded here, otherwise they are kept in memory
+    with their page signature computed while the pixels are at hand
+    (utils.page_analysis). With `adaptive`, each PDF page gets its own DPI
+    and page.render records it.
+
+    Args:
+        uploaded_file: Streamlit uploaded file object
+        dpi: PDF resolution (the reference for savings when adaptive)
+        adaptive: Per-page resolution policy, or None for the fixed DPI
+        directory: Write PDF pages to files here
+        raw: Store PDF pages uncompressed (with a directory)
+
+    Returns:
+        List of Pages
+
+    Raises:
+        ValueError: If file type is not supported or PDF support is missing
+    """
+    file_type = uploaded_file.type.split('/')[-1].lower()
+
+    if file_type == 'pdf':
+        if not PDF_SUPPORT:
+            raise ValueError("PDF not supported. Please install pdf2image")
+        from utils.page_analysis import page_signature
+
+        if adaptive is not None:
+            rendered = convert_pdf_adaptive(uploaded_file.getvalue(), adaptive, dpi, directory, raw)
+        else:
+            rendered = [(image, None) for image in convert_pdf_to_images(uploaded_file.getvalue(), dpi, directory, raw)]
+
+        pages = []
+        for image, info in rendered:
+            if directory is not None:
+                page = Page(path=image)
+            else:
+                page = Page.from_image(image)
+                page.signature = page_signature(image)
+            if info is not None:
+                info.nbytes = page.nbytes
+                page.render = info
+            pages.append(page)
+        return pages
+
+    elif file_type in ['png', 'jpg', 'jpeg']:
+        return [Page(uploaded_file.getvalue(), shared=True)]
+
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def convert_files_to_pages(
+    uploaded_files,
+    cache: SessionPageCache,
+    dpi: int = 200,
+    adaptive: Optional[AdaptiveDpi] = None
+) -> List[Page]:
+    """
+    Convert multiple files to pages, once per uploaded file per session
+
+    PDF pages are written straight to the cache's directory, in its format
+    (SessionPageCache.raw).
+
+    Args:
+        uploaded_files: List of Streamlit uploaded file objects
+        cache: The session's page cache
+        dpi: PDF resolution
+        adaptive: Per-page PDF resolution policy, or None for the fixed DPI
+
+    Returns:
+        Flattened list of Pages (all pages from all files)
+    """
+    all_pages = []
+    for uploaded_file in uploaded_files:
+        pages = cache.get(uploaded_file.file_id)
+        if pages is None:
+            pages = cache.put(
+                uploaded_file.file_id,
+                convert_file_to_pages(uploaded_file, dpi, adaptive, cache.directory(), cache.raw)
+            )
+        all_pages.extend(pages)
+    return all_pages
+
+
+def stitch_pages_vertically(pages: List[Page], cache: SessionPageCache, key: str) -> Page:
+    """
+    Stitch pages vertically into one cached page
+
+    Args:
+        pages: Pages to stitch
+        cache: The session's page cache
+        key: Cache key of the stitched result (derived from the source files)
+
+    Returns:
+        Single stitched Page
+    """
+    if len(pages) == 1:
+        return pages[0]
+
+    cached = cache.get(key)
+    if cached is None:
+        stitched = stitch_images_vertically([page.open() for page in pages])
+        cached = cache.put(key, [Page.from_image(stitched, cache.directory(), cache.raw)])
+    return cached[0]
+
+
 def stitch_images_vertically(images: List[Image.Image]) -> Image.Image:
     """
     Stitch multiple images vertically into one image
@@ -0,0 +1,263 @@
+"""
+Page Analysis
+頁面分析：墨跡覆蓋率找出空白頁、感知雜湊（dHash）合併重複掃描的頁面、估計文字行高
+"""
+import operator
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+from utils.page_cache import Page
+
+
+# dHash grid: HASH_SIZE x HASH_SIZE horizontal gradients (256 bits)
+HASH_SIZE = 16
+
+# Pages are analyzed at about this long side (strokes stay a few pixels wide)
+ANALYSIS_SIDE = 1000
+
+# Gray level below which a pixel counts as ink
+INK_LEVEL = 128
+
+# Ink density difference (0-255) a hash bit needs, so specks do not flip bits
+DENSITY_MARGIN = 2
+
+# Largest rescan offset that is aligned before comparing (analysis pixels, ~1 cm on A4)
+MAX_SHIFT = 24
+
+# Comparison grid: a cell with more unmatched ink than CELL_LEVEL (0-255) is a real difference
+COMPARE_GRID = 32
+CELL_LEVEL = 8
+
+# Pages are only compared when the lighter one has at least this share of the
+# darker one's ink (a brighter rescan loses some faint strokes)
+INK_SIMILARITY = 0.5
+
+
+# Previews are low resolution and antialiased: strokes are lighter than at full DPI
+PREVIEW_INK_LEVEL = 170
+
+# Rows or columns inked over more than this share are ruling or frame lines, not text
+RULE_SHARE = 0.5
+
+
+class PageSignature:
+    """Perceptual hash and ink coverage of one page"""
+
+    __slots__ = ("dhash", "ink")
+
+    def __init__(self, dhash: int, ink: float):
+        self.dhash = dhash
+        self.ink = ink
+
+
+def _analysis_gray(image: Image.Image) -> Image.Image:
+    gray = image.convert("L")
+    factor = max(1, max(gray.size) // ANALYSIS_SIDE)
+    return gray.reduce(factor) if factor > 1 else gray
+
+
+def _ink_mask(gray: Image.Image) -> Image.Image:
+    return gray.point(lambda level: 255 if level < INK_LEVEL else 0)
+
+
+def page_signature(image: Image.Image) -> PageSignature:
+    """
+    Compute the signature of a decoded page
+
+    Args:
+        image: Page image
+
+    Returns:
+        PageSignature with a 256-bit difference hash of the ink density and
+        the share of ink pixels
+    """
+    gray = _analysis_gray(image)
+    histogram = gray.histogram()
+    ink = sum(histogram[:INK_LEVEL]) / (gray.width * gray.height)
+
+    # Hash the ink density, not the gray levels: paper tone and scanner
+    # noise in empty regions would otherwise flip bits between rescans
+    cells = _ink_mask(gray).resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX).tobytes()
+    dhash = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = cells[row * (HASH_SIZE + 1) + col]
+            dhash = (dhash << 1) | (left > cells[row * (HASH_SIZE + 1) + col + 1] + DENSITY_MARGIN)
+    return PageSignature(dhash, ink)
+
+
+def signature_of(page: Page) -> PageSignature:
+    """Signature of a page, computed on first use and kept on the page"""
+    if page.signature is None:
+        page.signature = page_signature(page.open())
+    return page.signature
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing hash bits"""
+    return bin(a ^ b).count("1")
+
+
+class _Layout:
+    """Ink mask of a page for the exact comparison (built only for similar pages)"""
+
+    __slots__ = ("mask", "dilated", "rows", "cols")
+
+    def __init__(self, image: Image.Image):
+        mask = _ink_mask(_analysis_gray(image))
+        self.mask = mask
+        # One pixel of tolerance for resampling differences between scans
+        self.dilated = mask.filter(ImageFilter.MaxFilter(3))
+        self.rows = mask.resize((1, mask.height), Image.BOX).tobytes()
+        self.cols = mask.resize((mask.width, 1), Image.BOX).tobytes()
+
+
+def _best_shift(a: bytes, b: bytes) -> int:
+    """Offset of b that best lines up its ink profile with a's"""
+    n = min(len(a), len(b))
+    scores = {
+        shift: sum(map(operator.mul, a[max(0, shift):n], b[max(0, -shift):n - shift if shift > 0 else n]))
+        for shift in range(-MAX_SHIFT, MAX_SHIFT + 1)
+    }
+    return max(scores, key=lambda shift: (scores[shift], -abs(shift)))
+
+
+def _shifted(image: Image.Image, dx: int, dy: int) -> Image.Image:
+    canvas = Image.new("L", image.size, 0)
+    canvas.paste(image, (dx, dy))
+    return canvas
+
+
+def same_content(a: _Layout, b: _Layout) -> bool:
+    """
+    Whether two pages carry the same ink, up to a scan offset
+
+    The pages are aligned on their ink profiles, then every region is checked
+    for ink present on one page only. A single added word is enough to keep
+    both pages; a rotated rescan is conservatively treated as different.
+    """
+    if a.mask.size != b.mask.size:
+        return False
+    dx, dy = _best_shift(a.cols, b.cols), _best_shift(a.rows, b.rows)
+    unmatched = ImageChops.lighter(
+        ImageChops.subtract(a.mask, _shifted(b.dilated, dx, dy)),
+        ImageChops.subtract(_shifted(b.mask, dx, dy), a.dilated)
+    )
+    return max(unmatched.resize((COMPARE_GRID, COMPARE_GRID), Image.BOX).tobytes()) <= CELL_LEVEL
+
+
+def text_line_height(preview: Image.Image) -> Optional[float]:
+    """
+    Typical height of a line of text on a page preview
+
+    Rows with ink form bands, one per line of text; ruling lines and frames
+    are ignored. The lower quartile is used so the smallest writing on the
+    page decides.
+
+    Args:
+        preview: Low-resolution page image
+
+    Returns:
+        Line height in preview pixels, or None if no text line is found
+    """
+    mask = preview.convert("L").point(lambda level: 255 if level < PREVIEW_INK_LEVEL else 0)
+    width, height = mask.size
+
+    # Blank out vertical rules so they do not join every line into one band
+    columns = mask.transpose(Image.Transpose.ROTATE_90).tobytes()
+    draw = ImageDraw.Draw(mask)
+    for x in range(width):
+        row = width - 1 - x  # Column x is this row of the rotated mask
+        if columns[row * height:(row + 1) * height].count(255) > RULE_SHARE * height:
+            draw.line((x, 0, x, height), fill=0)
+
+    data = mask.tobytes()
+    bands: List[int] = []
+    run = 0
+    for y in range(height + 1):
+        count = data[y * width:(y + 1) * width].count(255) if y < height else 0
+        if 2 <= count <= RULE_SHARE * width:
+            run += 1
+            continue
+        if run >= 2:
+            bands.append(run)
+        run = 0
+
+    if not bands:
+        return None
+    return float(sorted(bands)[len(bands) // 4])
+
+
+class SkippedPage:
+    """A page left out of the request, and why"""
+
+    __slots__ = ("label", "reason", "duplicate_of", "ink")
+
+    def __init__(self, label: str, reason: str, duplicate_of: Optional[str] = None, ink: float = 0.0):
+        self.label = label
+        self.reason = reason
+        self.duplicate_of = duplicate_of
+        self.ink = ink
+
+    def describe(self) -> str:
+        if self.reason == "duplicate":
+            return f"{self.label} (duplicate of {self.duplicate_of})"
+        return f"{self.label} ({self.reason})"
+
+
+def select_pages(
+    files: List[Tuple[str, List[Page]]],
+    blank_ink: float,
+    candidate_bits: int
+) -> Tuple[List[Page], List[SkippedPage]]:
+    """
+    Drop blank pages and collapse duplicate scans, within and across files
+
+    A page is blank when less than `blank_ink` of it is ink. Pages whose
+    hashes differ in at most `candidate_bits` bits and whose ink coverage is
+    similar are compared region by region (same_content); a page with the
+    same content as an earlier kept page is a duplicate.
+
+    Args:
+        files: (file name, pages) per uploaded file, in upload order
+        blank_ink: Ink share below which a page is blank
+        candidate_bits: Hash distance below which pages are compared
+
+    Returns:
+        (pages to send, skipped pages); if every page would be skipped, all are kept
+    """
+    kept: List[Tuple[str, Page]] = []
+    skipped: List[SkippedPage] = []
+    layouts: Dict[int, _Layout] = {}
+
+    def layout(page: Page) -> _Layout:
+        if id(page) not in layouts:
+            layouts[id(page)] = _Layout(page.open())
+        return layouts[id(page)]
+
+    for name, pages in files:
+        for number, page in enumerate(pages, 1):
+            label = f"{name} p{number}" if len(pages) > 1 else name
+            signature = signature_of(page)
+            if signature.ink < blank_ink:
+                skipped.append(SkippedPage(label, "blank", ink=signature.ink))
+                continue
+            original = next(
+                (
+                    kept_label for kept_label, kept_page in kept
+                    if hamming(signature.dhash, kept_page.signature.dhash) <= candidate_bits
+                    and min(signature.ink, kept_page.signature.ink)
+                    >= INK_SIMILARITY * max(signature.ink, kept_page.signature.ink)
+                    and same_content(layout(kept_page), layout(page))
+                ),
+                None
+            )
+            if original is not None:
+                skipped.append(SkippedPage(label, "duplicate", duplicate_of=original, ink=signature.ink))
+                continue
+            kept.append((label, page))
+
+    if not kept:
+        return [page for _, pages in files for page in pages], []
+    return [page for _, page in kept], skipped
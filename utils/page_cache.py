@@ -0,0 +1,236 @@
+"""
+Session Page Cache
+上傳頁面的壓縮快取與每個 session 的記憶體預算（頁面檔案可不壓縮，以 mmap 讀取）
+"""
+import hashlib
+import io
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+
+# Set on decoded pages: identifies the image for provider-side caches without hashing pixels
+CONTENT_HASH = "content_hash"
+
+# Binary PGM / PPM header as written by Pillow and pdftoppm (8-bit, no comments)
+_NETPBM_HEADER = re.compile(rb"P([56])\s(\d+)\s(\d+)\s255\s")
+
+
+def decode_image(data: bytes, content_hash: Optional[str] = None) -> Image.Image:
+    """Decode encoded page bytes, tagging the image with the bytes' SHA-256 (info[CONTENT_HASH])"""
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    image.info[CONTENT_HASH] = content_hash or hashlib.sha256(data).hexdigest()
+    return image
+
+
+def _raw_layout(path: str) -> Optional[Tuple[str, Tuple[int, int], int]]:
+    """(mode, size, pixel offset) of an uncompressed page file, or None for encoded images"""
+    with open(path, "rb") as f:
+        match = _NETPBM_HEADER.match(f.read(32))
+    if match is None:
+        return None
+    mode = "L" if match.group(1) == b"5" else "RGB"
+    return mode, (int(match.group(2)), int(match.group(3))), match.end()
+
+
+class Page:
+    """
+    One page kept as encoded image bytes, in memory or in a file
+
+    A decoded A4 page at 200 DPI is ~11 MB of RGB pixels; its PNG is a
+    fraction of that. Pixels are only materialized by open(), right before
+    the page is analyzed or sent to the model. Page files can also hold
+    uncompressed pixels (PGM / PPM), which open() memory-maps instead of
+    decoding.
+    """
+
+    __slots__ = ("data", "path", "nbytes", "shared", "digest", "signature", "render")
+
+    def __init__(self, data: Optional[bytes] = None, shared: bool = False, path: Optional[str] = None):
+        self.data: Optional[bytes] = data
+        self.path: Optional[str] = path
+        self.nbytes = len(data) if data is not None else os.path.getsize(path)
+        # Bytes owned by the uploader widget: not counted, spilling frees nothing
+        self.shared = shared
+        # SHA-256 of the page bytes, computed once (content_hash)
+        self.digest: Optional[str] = None
+        # utils.page_analysis.PageSignature, computed once per page
+        self.signature = None
+        # utils.file_converter.RenderInfo of an adaptively rasterized PDF page
+        self.render = None
+
+    @classmethod
+    def from_image(cls, image: Image.Image, directory: Optional[str] = None, raw: bool = False) -> "Page":
+        """
+        Encode a decoded image as PNG (fast compression level)
+
+        Args:
+            image: Page image
+            directory: Write the page to a file here instead of keeping it in memory
+            raw: Store uncompressed pixels (L and RGB images, with a directory)
+        """
+        raw = raw and directory is not None and image.mode in ("L", "RGB")
+        buffer = io.BytesIO()
+        if raw:
+            image.save(buffer, format="PPM")
+        else:
+            image.save(buffer, format="PNG", compress_level=1)
+        if directory is None:
+            return cls(buffer.getvalue())
+        fd, path = tempfile.mkstemp(suffix=".page", dir=directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(buffer.getbuffer())
+        return cls(path=path)
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
+
+    def read(self) -> bytes:
+        """Encoded bytes of the page"""
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def content_hash(self) -> str:
+        """SHA-256 of the page bytes (files are hashed without loading them)"""
+        if self.digest is None:
+            if self.data is not None:
+                self.digest = hashlib.sha256(self.data).hexdigest()
+            else:
+                with open(self.path, "rb") as f:
+                    self.digest = hashlib.file_digest(f, "sha256").hexdigest()
+        return self.digest
+
+    def open(self) -> Image.Image:
+        """Decode the page into a PIL image (uncompressed page files are memory-mapped)"""
+        layout = _raw_layout(self.path) if self.data is None else None
+        if layout is None:
+            return decode_image(self.read(), self.digest)
+
+        mode, size, offset = layout
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Grayscale pixels are used in place; RGB is copied once (Pillow stores it padded)
+        image = Image.frombuffer(mode, size, memoryview(mapped)[offset:], "raw", mode, 0, 1)
+        image.info[CONTENT_HASH] = self.content_hash()
+        return image
+
+    def copy_to(self, path: str) -> None:
+        """Write the page bytes to a file without loading a page file into memory"""
+        if self.data is not None:
+            with open(path, "wb") as f:
+                f.write(self.data)
+        else:
+            shutil.copyfile(self.path, path)
+
+    def spill(self, directory: str) -> int:
+        """
+        Move the encoded bytes to a file
+
+        Returns:
+            Bytes of memory released
+        """
+        if self.data is None or self.shared:
+            return 0
+        fd, self.path = tempfile.mkstemp(suffix=".page", dir=directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.data)
+        self.data = None
+        return self.nbytes
+
+
+class SessionPageCache:
+    """
+    Uploaded files converted to pages once per session, within a memory budget
+
+    Entries are keyed by the uploader's file_id, so reruns reuse the pages
+    instead of re-rasterizing PDFs. When the encoded pages held in memory
+    exceed the budget, the least recently used entries are spilled to a
+    session temp directory (removed when the cache is cleared or collected).
+    Rasterized pages are written to that directory directly, as PNG or, with
+    raw, as uncompressed PGM / PPM that is memory-mapped on open.
+    """
+
+    def __init__(self, budget_bytes: int, raw: bool = False):
+        self.budget_bytes = budget_bytes
+        self.raw = raw
+        self._entries: "OrderedDict[str, List[Page]]" = OrderedDict()
+        self._spill_dir: Optional[str] = None
+        self._finalizer = None
+
+    def directory(self) -> str:
+        """The session's page directory (created on first use)"""
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="correction-pages-")
+            self._finalizer = weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+        return self._spill_dir
+
+    def _memory_bytes(self) -> int:
+        return sum(
+            page.nbytes
+            for pages in self._entries.values() for page in pages
+            if page.in_memory and not page.shared
+        )
+
+    def _enforce_budget(self) -> None:
+        excess = self._memory_bytes() - self.budget_bytes
+        for page in (page for pages in list(self._entries.values()) for page in pages):
+            if excess <= 0:
+                break
+            excess -= page.spill(self.directory())
+
+    def get(self, key: str) -> Optional[List[Page]]:
+        """Cached pages for a key (marks them recently used)"""
+        pages = self._entries.get(key)
+        if pages is not None:
+            self._entries.move_to_end(key)
+        return pages
+
+    def put(self, key: str, pages: List[Page]) -> List[Page]:
+        """Store pages under a key, spilling older entries if over budget"""
+        self._entries[key] = pages
+        self._entries.move_to_end(key)
+        self._enforce_budget()
+        return pages
+
+    def retain(self, keys: set) -> None:
+        """Drop entries whose files are no longer uploaded"""
+        for key in [key for key in self._entries if key not in keys]:
+            self._drop(key)
+
+    def _drop(self, key: str) -> None:
+        for page in self._entries.pop(key):
+            if page.path:
+                try:
+                    os.remove(page.path)
+                except OSError:
+                    pass
+
+    def clear(self) -> None:
+        """Release every page and the spill directory"""
+        for key in list(self._entries):
+            self._drop(key)
+        if self._finalizer is not None:
+            self._finalizer()
+            self._spill_dir = None
+            self._finalizer = None
+
+    def usage(self) -> dict:
+        """Bytes held by this session: pages in memory, on disk (spilled or rasterized there), and shared with uploaders"""
+        pages = [page for entry in self._entries.values() for page in entry]
+        return {
+            "pages": len(pages),
+            "memory": sum(page.nbytes for page in pages if page.in_memory and not page.shared),
+            "spilled": sum(page.nbytes for page in pages if not page.in_memory),
+            "shared": sum(page.nbytes for page in pages if page.shared),
+        }